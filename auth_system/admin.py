@@ -1,11 +1,18 @@
 from django.contrib import admin
 from .models import Role, Permission, RolePermission
+from utils.pagination import EstimatedCountPaginator
 
 
 class PermissionInline(admin.TabularInline):
     """Разрешения прямо в роли"""
     model = RolePermission
     extra = 1  # количество пустых форм
+    # Поиск разрешения вместо выпадающего списка из всех разрешений в каждой строке
+    autocomplete_fields = ('permission',)
+
+    def get_queryset(self, request):
+        # __str__ связи читает роль и разрешение
+        return super().get_queryset(request).select_related('role', 'permission')
 
 
 @admin.register(Role)
@@ -13,14 +20,16 @@ class RoleAdmin(admin.ModelAdmin):
     list_display = ('name', 'user_count', 'permission_count', 'created_at')
     search_fields = ('name', 'description')
     inlines = [PermissionInline]
-    
-    def user_count(self, obj):
-        return obj.users.count()
-    user_count.short_description = 'Кол-во пользователей'
-    
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # без лишнего COUNT(*) по всей таблице при поиске
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_permission_count()
+
     def permission_count(self, obj):
-        return obj.permissions.count()
+        return obj.permission_count
     permission_count.short_description = 'Кол-во разрешений'
+    permission_count.admin_order_field = 'permission_count'
 
 
 @admin.register(Permission)
@@ -28,14 +37,15 @@ class PermissionAdmin(admin.ModelAdmin):
     list_display = ('codename', 'resource', 'action', 'description', 'role_count', 'created_at')
     list_filter = ('resource', 'action')
     search_fields = ('codename', 'description')
-    
-    def role_count(self, obj):
-        return obj.roles.count()
-    role_count.short_description = 'Назначено ролям'
 
 
 @admin.register(RolePermission)
 class RolePermissionAdmin(admin.ModelAdmin):
     list_display = ('role', 'permission', 'created_at')
-    list_filter = ('role', 'permission__resource')
-    search_fields = ('role__name', 'permission__codename')
\ No newline at end of file
+    # Без фильтра по роли: он выводит в боковую панель все роли
+    list_filter = ('permission__resource',)
+    list_select_related = ('role', 'permission')
+    search_fields = ('role__name', 'permission__codename')
+    autocomplete_fields = ('role', 'permission')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AuthSystemConfig(AppConfig):
     name = "auth_system"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,21 @@
+# Маршруты async-вьюх (подключены под /api/async/ в config/urls.py)
+from django.urls import path
+from . import async_views as views
+
+urlpatterns = [
+    # Роли
+    path('roles/', views.role_list, name='async-admin-role-list'),
+    path('roles/<int:pk>/', views.role_detail, name='async-admin-role-detail'),
+    
+    # Разрешения
+    path('permissions/', views.permission_list, name='async-admin-permission-list'),
+    
+    # Управление разрешениями ролей
+    path('roles/<int:pk>/permissions/', views.add_permission_to_role, name='async-add-permission-to-role'),
+    path('roles/<int:pk>/permissions/bulk/', views.bulk_update_role_permissions, name='async-bulk-update-role-permissions'),
+    path('roles/<int:pk>/permissions/<int:permission_pk>/', views.remove_permission_from_role, name='async-remove-permission-from-role'),
+    
+    # Управление ролями пользователей
+    path('users/<int:pk>/role/', views.update_user_role, name='async-update-user-role'),
+    path('users/role/', views.bulk_update_user_role, name='async-bulk-update-user-role'),
+]
\ No newline at end of file
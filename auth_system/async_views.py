@@ -0,0 +1,221 @@
+# Async-варианты вьюх auth_system.views для запуска под ASGI (config.asgi).
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+
+from utils.async_views import async_api_view, json_response
+from utils.instrumentation import count_chunk, timed
+from utils.permissions import HasPermission
+from .authz import CheckRequestError, adecide, parse_checks
+from .models import Role, Permission, RolePermission
+from .signals import role_permissions_changed
+from users.models import User
+from .serializers import (
+    RoleSerializer,
+    RoleDetailSerializer,
+    UserRoleSerializer,
+    AddPermissionToRoleSerializer,
+    BulkRolePermissionsSerializer,
+    BulkUserRoleSerializer,
+    PermissionSerializer
+)
+
+
+async def _aget_or_404(queryset, **kwargs):
+    obj = await queryset.filter(**kwargs).afirst()
+    if obj is None:
+        raise Http404
+    return obj
+
+
+@async_api_view(['GET'], [HasPermission('permission.manage')])
+async def role_list(request):
+    """
+    Получить список всех ролей
+    ?expand=permissions - с разрешениями и числом пользователей
+    Требуется: permission.manage
+    """
+    if request.GET.get('expand') == 'permissions':
+        roles = [role async for role in Role.objects.with_details()]
+        return json_response(RoleDetailSerializer(roles, many=True).data)
+
+    roles = [role async for role in Role.objects.all()]
+    return json_response(RoleSerializer(roles, many=True).data)
+
+
+@async_api_view(['GET'], [HasPermission('permission.manage')])
+async def role_detail(request, pk):
+    """
+    Получить детали роли с разрешениями
+    Требуется: permission.manage
+    """
+    # Разрешения и число пользователей загружаются вместе с ролью
+    role = await _aget_or_404(Role.objects.with_details(), pk=pk)
+    return json_response(RoleDetailSerializer(role).data)
+
+
+@async_api_view(['GET'], [HasPermission('permission.manage')])
+async def permission_list(request):
+    """
+    Получить список всех разрешений
+    Требуется: permission.manage
+    """
+    permissions = [permission async for permission in Permission.objects.all()]
+    return json_response(PermissionSerializer(permissions, many=True).data)
+
+
+@async_api_view(['POST'], [HasPermission('permission.manage')])
+async def add_permission_to_role(request, pk):
+    """
+    Добавить разрешение роли
+    Требуется: permission.manage
+    """
+    role = await _aget_or_404(Role.objects, pk=pk)
+
+    serializer = AddPermissionToRoleSerializer(data=request.data)
+    if not await sync_to_async(serializer.is_valid)():
+        return json_response(serializer.errors, status=400)
+
+    permission_id = serializer.validated_data['permission_id']
+    permission = await _aget_or_404(Permission.objects, pk=permission_id)
+
+    if await RolePermission.objects.filter(role=role, permission=permission).aexists():
+        return json_response(
+            {"detail": "Это разрешение уже назначено данной роли"},
+            status=400
+        )
+
+    role_permission = await RolePermission.objects.acreate(
+        role=role,
+        permission=permission
+    )
+
+    return json_response({
+        "message": f"Разрешение '{permission.codename}' добавлено роли '{role.name}'",
+        "role_permission_id": role_permission.id
+    }, status=201)
+
+
+@async_api_view(['DELETE'], [HasPermission('permission.manage')])
+async def remove_permission_from_role(request, pk, permission_pk):
+    """
+    Удалить разрешение у роли
+    Требуется: permission.manage
+    """
+    role = await _aget_or_404(Role.objects, pk=pk)
+    permission = await _aget_or_404(Permission.objects, pk=permission_pk)
+
+    role_permission = await _aget_or_404(
+        RolePermission.objects,
+        role=role,
+        permission=permission
+    )
+
+    await role_permission.adelete()
+
+    return json_response({
+        "message": f"Разрешение '{permission.codename}' удалено у роли '{role.name}'"
+    })
+
+
+@async_api_view(['POST'], [HasPermission('permission.manage')])
+async def bulk_update_role_permissions(request, pk):
+    """
+    Назначить и снять несколько разрешений роли за один запрос:
+    {"add": [id, ...], "remove": [id, ...]}
+    Требуется: permission.manage
+    """
+    role = await _aget_or_404(Role.objects, pk=pk)
+
+    serializer = BulkRolePermissionsSerializer(data=request.data)
+    if not await sync_to_async(serializer.is_valid)():
+        return json_response(serializer.errors, status=400)
+
+    add = serializer.validated_data['add']
+    remove = serializer.validated_data['remove']
+
+    # Транзакция целиком в одном потоке
+    def apply():
+        with transaction.atomic():
+            added, removed = Role.objects.change_permissions(role.pk, add, remove)
+            if added or removed:
+                role_permissions_changed(role.pk)
+        return added, removed
+
+    added, removed = await sync_to_async(apply)()
+
+    return json_response({
+        "role_id": role.pk,
+        "added": added,
+        "removed": removed,
+        "already_assigned": [pk for pk in add if pk not in added],
+        "not_assigned": [pk for pk in remove if pk not in removed],
+    })
+
+
+@async_api_view(['PATCH'], [HasPermission('permission.manage')])
+async def update_user_role(request, pk):
+    """
+    Изменить роль пользователя
+    Требуется: permission.manage
+    """
+    user = await _aget_or_404(User.objects, pk=pk)
+
+    serializer = UserRoleSerializer(user, data=request.data, partial=True)
+    if not await sync_to_async(serializer.is_valid)():
+        return json_response(serializer.errors, status=400)
+
+    def save():
+        # Роль не меняется - сохранять нечего, сессии и токены остаются
+        # (при смене user_role_changed отправляет post_save пользователя)
+        if serializer.validated_data['role_id'] != user.role_id:
+            serializer.save()
+        return serializer.data
+
+    data = await sync_to_async(save)()
+
+    return json_response({
+        "message": f"Роль пользователя {user.email} обновлена",
+        "user": data
+    })
+
+
+@async_api_view(['POST'], [HasPermission('permission.manage')])
+async def bulk_update_user_role(request):
+    """
+    Назначить роль многим пользователям (user_ids или filter)
+    Требуется: permission.manage
+    """
+    serializer = BulkUserRoleSerializer(data=request.data)
+    if not await sync_to_async(serializer.is_valid)():
+        return json_response(serializer.errors, status=400)
+
+    role = serializer.validated_data['role']
+    # Транзакции пачек - в потоке, как и у остальных изменений
+    updated = await sync_to_async(Role.objects.assign_users)(
+        role.pk, serializer.get_users(),
+        chunk_size=getattr(settings, 'RBAC_BULK_ASSIGN_CHUNK_SIZE', 1000),
+        progress=lambda done: count_chunk()
+    )
+
+    return json_response({
+        "message": f"Роль '{role.name}' назначена пользователям: {updated}",
+        "role_id": role.pk,
+        "updated": updated
+    })
+
+
+@async_api_view(['POST'], [HasPermission('permission.manage')])
+async def authz_check(request):
+    """
+    Решения о доступе для других сервисов, пачкой (см. views.authz_check)
+    Требуется: permission.manage
+    """
+    try:
+        checks = parse_checks(request.data, getattr(settings, 'AUTHZ_CHECK_MAX_BATCH', 1000))
+    except CheckRequestError as exc:
+        return json_response({"detail": str(exc)}, status=400)
+
+    with timed('permission'):
+        return json_response(await adecide(checks))
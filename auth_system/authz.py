@@ -0,0 +1,177 @@
+# Решения о доступе для других сервисов (POST /api/authz/check):
+# "может ли пользователь X выполнить article.update?" пачкой за один запрос
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from users.revocation import revoked_tokens
+from users.tokens import RevocableAccessToken, RevokedTokenError
+from utils.metrics import permission_checks
+from .cache import StalePermissions, permission_bits, permission_cache
+
+
+class CheckRequestError(ValueError):
+    """Некорректный формат пачки проверок"""
+
+
+class Subject:
+    """Кто запрашивает доступ: роль, активность и маска из токена (если есть)"""
+    __slots__ = ('role_id', 'is_active', 'claims', 'error')
+
+    def __init__(self, role_id=None, is_active=True, claims=None, error=None):
+        self.role_id = role_id
+        self.is_active = is_active
+        self.claims = claims  # (маска, версия) из access-токена
+        self.error = error
+
+
+def parse_checks(data, max_checks):
+    """
+    Проверяет тело запроса {"checks": [{"user_id" | "token", "permission"}, ...]}
+    и возвращает список проверок. Без сериализаторов DRF: пачка может
+    содержать тысячи элементов, и разбор не должен стоить больше решений
+    """
+    checks = data.get('checks') if isinstance(data, dict) else None
+    if not isinstance(checks, list) or not checks:
+        raise CheckRequestError('checks: нужен непустой список проверок')
+    if len(checks) > max_checks:
+        raise CheckRequestError(f'checks: не больше {max_checks} проверок за запрос')
+
+    for i, check in enumerate(checks):
+        if not isinstance(check, dict) or not isinstance(check.get('permission'), str):
+            raise CheckRequestError(f'checks[{i}]: нужно поле permission')
+        user_id, token = check.get('user_id'), check.get('token')
+        if (user_id is None) == (token is None):
+            raise CheckRequestError(f'checks[{i}]: нужно либо user_id, либо token')
+        if user_id is not None and (not isinstance(user_id, int) or isinstance(user_id, bool)):
+            raise CheckRequestError(f'checks[{i}]: user_id должен быть целым числом')
+        if token is not None and not isinstance(token, str):
+            raise CheckRequestError(f'checks[{i}]: token должен быть строкой')
+    return checks
+
+
+def _users_query(checks):
+    from users.models import User
+
+    user_ids = {check['user_id'] for check in checks if check.get('user_id') is not None}
+    return User.objects.filter(pk__in=user_ids).values_list('pk', 'role_id', 'is_active')
+
+
+def _token_subject(raw):
+    try:
+        token = RevocableAccessToken(raw)
+    except RevokedTokenError:
+        return Subject(error='revoked_token')
+    except TokenError:
+        return Subject(error='invalid_token')
+    if api_settings.USER_ID_CLAIM not in token:
+        return Subject(error='invalid_token')
+    claims = None
+    if 'perm_ver' in token:
+        claims = (int(token['perm_mask'], 16), token['perm_ver'])
+    return Subject(role_id=token.get('role_id'), claims=claims)
+
+
+def _subjects(checks, users):
+    """Субъект каждой проверки: пользователи из БД (users) или токены"""
+    users = {pk: Subject(role_id, is_active) for pk, role_id, is_active in users}
+    tokens = {}
+    subjects = []
+    for check in checks:
+        if check.get('user_id') is not None:
+            subjects.append(users.get(check['user_id']) or Subject(error='unknown_user'))
+        else:
+            raw = check['token']
+            if raw not in tokens:
+                tokens[raw] = _token_subject(raw)
+            subjects.append(tokens[raw])
+    return subjects
+
+
+def _claims_masks(subjects):
+    """Маски из токенов, версия которых совпадает с известной версией роли"""
+    masks = {}
+    for subject in subjects:
+        if subject.error is None and subject.role_id is not None:
+            mask = permission_cache.claims_mask(subject.role_id, subject.claims)
+            if mask is not None:
+                masks[subject] = mask
+    return masks
+
+
+def _role_ids(subjects, claims_masks):
+    """Роли, разрешения которых нужны из кэша (решение не по маске из токена)"""
+    return {
+        s.role_id for s in subjects
+        if s.error is None and s.role_id is not None and s not in claims_masks
+    }
+
+
+def _decisions(checks, subjects, claims_masks, roles, flags):
+    """
+    Решения в порядке проверок. Та же логика, что у HasPermission:
+    маска из токена используется, только если её версия актуальна
+    """
+    results = []
+    degraded = False
+    for check, subject in zip(checks, subjects):
+        codename = check['permission']
+        if subject.error is not None:
+            reason = subject.error
+        elif not subject.is_active:
+            reason = 'inactive'
+        elif subject.role_id is None:
+            reason = 'no_role'
+        elif not flags[codename]:
+            reason = 'unknown_permission'
+        else:
+            mask = claims_masks.get(subject)
+            if mask is None:
+                role_permissions = roles[subject.role_id]
+                degraded = degraded or isinstance(role_permissions, StalePermissions)
+                mask = role_permissions.mask
+            reason = 'granted' if mask & flags[codename] else 'missing_permission'
+
+        allowed = reason == 'granted'
+        permission_checks.inc(codename=codename, decision='allow' if allowed else 'deny')
+        results.append({'allowed': allowed, 'reason': reason})
+    return {'results': results, 'degraded': degraded}
+
+
+def decide(checks):
+    """
+    Решения по пачке проверок: пользователи загружаются одним запросом,
+    разрешения ролей и биты разрешений берутся из процессных кэшей
+    """
+    if _has_tokens(checks):
+        revoked_tokens.refresh_if_needed()
+    subjects = _subjects(checks, _users_query(checks) if _has_user_ids(checks) else ())
+    claims_masks = _claims_masks(subjects)
+    roles = {role_id: permission_cache.get(role_id) for role_id in _role_ids(subjects, claims_masks)}
+    flags = {codename: permission_bits.flag_for(codename) for codename in _codenames(checks)}
+    return _decisions(checks, subjects, claims_masks, roles, flags)
+
+
+async def adecide(checks):
+    if _has_tokens(checks):
+        await revoked_tokens.arefresh_if_needed()
+    users = [row async for row in _users_query(checks)] if _has_user_ids(checks) else ()
+    subjects = _subjects(checks, users)
+    claims_masks = _claims_masks(subjects)
+    roles = {
+        role_id: await permission_cache.aget(role_id)
+        for role_id in _role_ids(subjects, claims_masks)
+    }
+    flags = {codename: await permission_bits.aflag_for(codename) for codename in _codenames(checks)}
+    return _decisions(checks, subjects, claims_masks, roles, flags)
+
+
+def _codenames(checks):
+    return {check['permission'] for check in checks}
+
+
+def _has_user_ids(checks):
+    return any(check.get('user_id') is not None for check in checks)
+
+
+def _has_tokens(checks):
+    return any(check.get('token') is not None for check in checks)
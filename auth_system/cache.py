@@ -0,0 +1,447 @@
+import asyncio
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+
+from utils.instrumentation import count_cache_load
+from utils.metrics import cache_requests, rbac_refresh_failures, rbac_stale_decisions
+from utils.shared_generation import SharedGeneration
+
+
+# Разрешения роли: битовая маска и её версия (Role.permission_version)
+RolePermissions = namedtuple('RolePermissions', ['mask', 'version'])
+
+
+class StalePermissions(RolePermissions):
+    """Последние известные разрешения, отданные без обновления из БД"""
+    __slots__ = ()
+
+
+class RolePermissionCache:
+    """
+    Процессный кэш разрешений ролей: id роли → RolePermissions.
+    Записи живут RBAC_PERMISSION_CACHE_TTL секунд и сбрасываются явно
+    при любом изменении связей роли и разрешений (см. auth_system.signals).
+    Изменения, сделанные в других процессах, видны по общему поколению
+    rbac_generation: если оно сменилось, кэш и реестр битов сбрасываются.
+
+    Промахи по одной роли объединяются: запрос к БД делает только первый
+    (ведущий) запрос, остальные ждут его результат не дольше
+    RBAC_CACHE_LOAD_WAIT секунд. Если запись просто устарела по TTL
+    и включён RBAC_CACHE_SERVE_STALE, ожидающие сразу получают старое
+    значение. Явно сброшенные записи старыми значениями не отдаются.
+
+    Деградированный режим: если загрузка из БД упала (DatabaseError) или
+    не уложилась в RBAC_CACHE_REFRESH_TIMEOUT, отдаются последние
+    успешно прочитанные разрешения роли не старше RBAC_CACHE_MAX_STALENESS
+    секунд (StalePermissions), и следующие RBAC_CACHE_DEGRADED_RETRY секунд
+    БД для этой роли не опрашивается.
+
+    Кроме записей кэш помнит версии разрешений ролей, прочитанные из БД
+    (RBAC_CLAIMS_VERSION_TTL секунд, сбрасываются вместе с записями):
+    по ним claims_mask() принимает маску из access-токена без запросов к БД,
+    даже когда сама запись уже устарела по TTL.
+    """
+
+    def __init__(self):
+        self._entries = {}  # role_id -> (expires_at, RolePermissions)
+        self._loading = {}  # role_id -> Future загрузки ведущего запроса
+        self._known_good = {}  # role_id -> (loaded_at, RolePermissions)
+        self._versions = {}  # role_id -> (expires_at, версия разрешений)
+        self._degraded_until = {}  # role_id -> когда снова пробовать БД
+        self._executor = None
+        self._lock = threading.Lock()
+        # Номер поколения растёт при каждой инвалидации: загрузка,
+        # начатая до инвалидации, не должна попасть в кэш
+        self._generation = 0
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'RBAC_PERMISSION_CACHE_TTL', 60)
+
+    @property
+    def version_ttl(self):
+        return getattr(settings, 'RBAC_CLAIMS_VERSION_TTL', 300)
+
+    @property
+    def load_wait(self):
+        return getattr(settings, 'RBAC_CACHE_LOAD_WAIT', 5)
+
+    @property
+    def serve_stale(self):
+        return getattr(settings, 'RBAC_CACHE_SERVE_STALE', True)
+
+    @property
+    def max_staleness(self):
+        return getattr(settings, 'RBAC_CACHE_MAX_STALENESS', 0)
+
+    @property
+    def refresh_timeout(self):
+        return getattr(settings, 'RBAC_CACHE_REFRESH_TIMEOUT', None)
+
+    def get(self, role_id):
+        """Возвращает битовую маску разрешений роли и её версию"""
+        entry = self._lookup(role_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        flight, generation = self._join(role_id, is_async=False)
+        if generation is not None:
+            return self._served(self._lead(flight, generation, role_id))
+
+        stale = self._stale(entry)
+        if stale is not None:
+            return stale
+        try:
+            if flight.is_async:
+                # Под ASGI async ORM ведущего выполняется в том же общем
+                # потоке, что и эта синхронная проверка: ждать нельзя
+                raise FutureTimeoutError
+            return self._served(flight.result(timeout=self.load_wait))
+        except FutureTimeoutError:
+            # Ведущий запрос завис (или его нельзя ждать) - читаем сами
+            generation = self._generation
+            permissions = self._refresh(role_id)
+            self._store(generation, role_id, permissions)
+            return self._served(permissions)
+
+    async def aget(self, role_id):
+        """Асинхронный get: холодная запись читается через async ORM"""
+        entry = self._lookup(role_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        flight, generation = self._join(role_id, is_async=True)
+        if generation is not None:
+            return self._served(await self._alead(flight, generation, role_id))
+
+        stale = self._stale(entry)
+        if stale is not None:
+            return stale
+        try:
+            # shield: таймаут ожидающего не должен отменять загрузку ведущего
+            return self._served(await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(flight)), self.load_wait
+            ))
+        except asyncio.TimeoutError:
+            generation = self._generation
+            permissions = await self._arefresh(role_id)
+            self._store(generation, role_id, permissions)
+            return self._served(permissions)
+
+    def claims_mask(self, role_id, claims):
+        """
+        Маска разрешений из claims access-токена ((маска, версия)), если
+        версия совпадает с известной процессу версией роли, иначе None -
+        тогда права проверяются по маске роли из get()
+        """
+        if claims is None:
+            return None
+        if rbac_generation.changed():
+            self._reset_all()
+        known = self._versions.get(role_id)
+        if known is None or known[0] <= time.monotonic() or known[1] != claims[1]:
+            return None
+        cache_requests.inc(cache='rbac_role_permissions', result='claims')
+        return claims[0]
+
+    def invalidate(self, role_id=None):
+        """Сбрасывает запись одной роли или весь кэш (role_id=None)"""
+        with self._lock:
+            self._generation += 1
+            # Идущие загрузки могли прочитать старые данные: новые
+            # промахи к ним не присоединяются, а начинают свою
+            # Данные поменялись - значит, БД доступна, и пора снова её читать
+            if role_id is None:
+                self._entries.clear()
+                self._versions.clear()
+                self._loading.clear()
+                self._degraded_until.clear()
+            else:
+                self._entries.pop(role_id, None)
+                self._versions.pop(role_id, None)
+                self._loading.pop(role_id, None)
+                self._degraded_until.pop(role_id, None)
+
+    def _lookup(self, role_id):
+        if rbac_generation.changed():
+            self._reset_all()
+
+        entry = self._entries.get(role_id)
+        if entry is not None and entry[0] > time.monotonic():
+            cache_requests.inc(cache='rbac_role_permissions', result='hit')
+        else:
+            cache_requests.inc(cache='rbac_role_permissions', result='miss')
+        return entry
+
+    def _join(self, role_id, is_async):
+        """
+        Загрузка роли, к которой стоит присоединиться, и поколение кэша.
+        Поколение возвращается только ведущему (тому, кто начал загрузку),
+        остальным - None.
+        """
+        with self._lock:
+            flight = self._loading.get(role_id)
+            if flight is not None:
+                cache_requests.inc(cache='rbac_role_permissions', result='coalesced')
+                return flight, None
+            flight = self._loading[role_id] = Future()
+            flight.is_async = is_async
+            return flight, self._generation
+
+    def _lead(self, flight, generation, role_id):
+        try:
+            permissions = self._refresh(role_id)
+        except BaseException as exc:
+            self._land(flight, role_id, exception=exc)
+            raise
+        self._store(generation, role_id, permissions)
+        self._land(flight, role_id, result=permissions)
+        return permissions
+
+    async def _alead(self, flight, generation, role_id):
+        try:
+            permissions = await self._arefresh(role_id)
+        except BaseException as exc:
+            self._land(flight, role_id, exception=exc)
+            raise
+        self._store(generation, role_id, permissions)
+        self._land(flight, role_id, result=permissions)
+        return permissions
+
+    def _refresh(self, role_id):
+        """Читает разрешения роли из БД, при сбое - последние известные"""
+        fallback = self._degraded(role_id)
+        if fallback is not None:
+            return fallback
+
+        count_cache_load()
+        try:
+            timeout = self.refresh_timeout
+            if timeout is None:
+                permissions = self._load(role_id)
+            else:
+                future = self._refresh_executor().submit(self._load_in_thread, role_id)
+                try:
+                    permissions = future.result(timeout=timeout)
+                except FutureTimeoutError:
+                    future.add_done_callback(partial(self._late_result, role_id))
+                    fallback = self._degrade(role_id, 'timeout')
+                    if fallback is not None:
+                        return fallback
+                    # Подменить нечем - дожидаемся БД
+                    permissions = future.result()
+        except DatabaseError:
+            fallback = self._degrade(role_id, 'db_error')
+            if fallback is None:
+                raise
+            return fallback
+
+        self._remember(role_id, permissions)
+        return permissions
+
+    async def _arefresh(self, role_id):
+        fallback = self._degraded(role_id)
+        if fallback is not None:
+            return fallback
+
+        count_cache_load()
+        try:
+            timeout = self.refresh_timeout
+            if timeout is None:
+                permissions = await self._aload(role_id)
+            else:
+                task = asyncio.ensure_future(self._aload(role_id))
+                try:
+                    permissions = await asyncio.wait_for(asyncio.shield(task), timeout)
+                except asyncio.TimeoutError:
+                    task.add_done_callback(partial(self._late_result, role_id))
+                    fallback = self._degrade(role_id, 'timeout')
+                    if fallback is not None:
+                        return fallback
+                    permissions = await task
+        except DatabaseError:
+            fallback = self._degrade(role_id, 'db_error')
+            if fallback is None:
+                raise
+            return fallback
+
+        self._remember(role_id, permissions)
+        return permissions
+
+    def _refresh_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=2, thread_name_prefix='rbac-refresh'
+                    )
+        return self._executor
+
+    def _load_in_thread(self, role_id):
+        # Запросов в этом потоке нет, и сломанное соединение
+        # некому закрыть, кроме нас
+        close_old_connections()
+        return self._load(role_id)
+
+    def _late_result(self, role_id, future):
+        """Загрузка, не уложившаяся в таймаут, всё же завершилась"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._remember(role_id, future.result())
+        self._degraded_until.pop(role_id, None)
+
+    def _remember(self, role_id, permissions):
+        self._known_good[role_id] = (time.monotonic(), permissions)
+
+    def _degrade(self, role_id, reason):
+        """
+        Загрузка не удалась: включает деградированный режим для роли
+        и возвращает последние известные разрешения (или None)
+        """
+        rbac_refresh_failures.inc(reason=reason)
+        fallback = self._known_good_permissions(role_id)
+        if fallback is not None:
+            self._degraded_until[role_id] = (
+                time.monotonic() + getattr(settings, 'RBAC_CACHE_DEGRADED_RETRY', 5)
+            )
+        return fallback
+
+    def _degraded(self, role_id):
+        """Последние известные разрешения, если роль в деградированном режиме"""
+        until = self._degraded_until.get(role_id)
+        if until is None or until <= time.monotonic():
+            return None
+        return self._known_good_permissions(role_id)
+
+    def _known_good_permissions(self, role_id):
+        known = self._known_good.get(role_id)
+        max_staleness = self.max_staleness
+        if not max_staleness or known is None:
+            return None
+        if time.monotonic() - known[0] > max_staleness:
+            return None
+        return StalePermissions(*known[1])
+
+    @staticmethod
+    def _served(permissions):
+        if isinstance(permissions, StalePermissions):
+            rbac_stale_decisions.inc()
+        return permissions
+
+    def _land(self, flight, role_id, result=None, exception=None):
+        """Завершает загрузку и будит ожидающих"""
+        with self._lock:
+            if self._loading.get(role_id) is flight:
+                del self._loading[role_id]
+        if exception is not None:
+            flight.set_exception(exception)
+        else:
+            flight.set_result(result)
+
+    def _stale(self, entry):
+        """Устаревшее по TTL значение, если его разрешено отдавать"""
+        if entry is not None and self.serve_stale:
+            cache_requests.inc(cache='rbac_role_permissions', result='stale')
+            return entry[1]
+        return None
+
+    def _reset_all(self):
+        self.invalidate()
+        permission_bits.invalidate()
+
+    def _store(self, generation, role_id, permissions):
+        # Подменённые разрешения не кэшируем: по окончании паузы
+        # RBAC_CACHE_DEGRADED_RETRY следующий запрос снова пойдёт в БД
+        if isinstance(permissions, StalePermissions):
+            return
+        with self._lock:
+            if generation == self._generation:
+                now = time.monotonic()
+                self._entries[role_id] = (now + self.ttl, permissions)
+                self._versions[role_id] = (now + self.version_ttl, permissions.version)
+
+    def _query(self, role_id):
+        from .models import Role
+
+        return Role.objects.filter(pk=role_id).values_list(
+            'permission_mask', 'permission_version'
+        )
+
+    def _load(self, role_id):
+        return self._to_permissions(self._query(role_id).first())
+
+    async def _aload(self, role_id):
+        return self._to_permissions(await self._query(role_id).afirst())
+
+    @staticmethod
+    def _to_permissions(row):
+        from .models import decode_mask
+
+        if row is None:
+            return RolePermissions(0, 0)
+        return RolePermissions(decode_mask(row[0]), row[1])
+
+
+class PermissionBitRegistry:
+    """
+    Соответствие кодовых имён разрешений номерам их битов.
+    Загружается одним запросом и сбрасывается при изменении разрешений.
+    """
+
+    def __init__(self):
+        self._bits = None
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    def flag_for(self, codename):
+        """Возвращает 1 << bit для разрешения или 0, если его нет"""
+        bits = self._bits
+        if bits is None:
+            count_cache_load()
+            generation = self.generation
+            bits = dict(self._query())
+            self._store(generation, bits)
+        return self._flag(bits, codename)
+
+    async def aflag_for(self, codename):
+        bits = self._bits
+        if bits is None:
+            count_cache_load()
+            generation = self.generation
+            bits = {name: bit async for name, bit in self._query()}
+            self._store(generation, bits)
+        return self._flag(bits, codename)
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._bits = None
+
+    def _store(self, generation, bits):
+        with self._lock:
+            if generation == self.generation:
+                self._bits = bits
+
+    @staticmethod
+    def _flag(bits, codename):
+        bit = bits.get(codename)
+        return 0 if bit is None else 1 << bit
+
+    def _query(self):
+        from .models import Permission
+
+        return Permission.objects.filter(bit__isnull=False).values_list('codename', 'bit')
+
+
+permission_cache = RolePermissionCache()
+permission_bits = PermissionBitRegistry()
+
+# Общее для процессов поколение данных RBAC, увеличивается после коммита
+# изменения ролей и разрешений (роли пользователей кэша не касаются)
+rbac_generation = SharedGeneration('rbac', 'RBAC_GENERATION_CHECK_INTERVAL')
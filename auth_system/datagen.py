@@ -0,0 +1,128 @@
+import random
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Role, Permission, RolePermission
+from users.models import User
+
+
+# Вес действия при случайном назначении разрешений ролям:
+# чтение есть почти у всех ролей, управляющие права - у немногих
+ACTION_WEIGHTS = {
+    'read': 10,
+    'create': 4,
+    'update': 4,
+    'publish': 2,
+    'approve': 1,
+    'delete': 1,
+    'manage': 0.2,
+}
+
+
+def ensure_permissions():
+    """
+    Создаёт все разрешения ресурс.действие из choices и permission.manage.
+    Существующие не трогает; bulk_create не вызывает save(), поэтому
+    биты новым разрешениям назначаются здесь.
+    """
+    combos = [
+        (resource, action)
+        for resource, _ in Permission.RESOURCE_CHOICES
+        for action, _ in Permission.ACTION_CHOICES
+    ]
+    combos.append(('permission', 'manage'))
+
+    existing = set(Permission.objects.values_list('resource', 'action'))
+    last_bit = Permission.objects.aggregate(Max('bit'))['bit__max']
+    next_bit = 0 if last_bit is None else last_bit + 1
+
+    missing = [combo for combo in combos if combo not in existing]
+    Permission.objects.bulk_create([
+        Permission(resource=resource, action=action,
+                   codename=f'{resource}.{action}', bit=next_bit + i)
+        for i, (resource, action) in enumerate(missing)
+    ])
+    return list(Permission.objects.order_by('bit'))
+
+
+def ensure_roles(count, prefix):
+    """Создаёт недостающие роли с именами '<prefix> <i>'"""
+    names = [f'{prefix} {i}' for i in range(count)]
+    existing = set(Role.objects.filter(name__in=names).values_list('name', flat=True))
+    Role.objects.bulk_create(
+        [Role(name=name) for name in names if name not in existing],
+        batch_size=1000
+    )
+    roles = {role.name: role for role in Role.objects.filter(name__in=names)}
+    return [roles[name] for name in names]
+
+
+def assign_role_permissions(roles, permissions, rng, min_per_role=1, max_per_role=10):
+    """
+    Назначает каждой роли случайный набор разрешений, смещённый
+    в сторону частых действий (ACTION_WEIGHTS). Повторный запуск
+    не создаёт дублей; маски изменённых ролей пересчитываются.
+    """
+    weights = [ACTION_WEIGHTS.get(p.action, 1) for p in permissions]
+    max_per_role = min(max_per_role, len(permissions))
+
+    links = []
+    for role in roles:
+        size = rng.randint(min(min_per_role, max_per_role), max_per_role)
+        chosen = set()
+        while len(chosen) < size:
+            chosen.add(rng.choices(permissions, weights)[0])
+        links.extend(RolePermission(role=role, permission=p) for p in chosen)
+
+    RolePermission.objects.bulk_create(links, batch_size=5000, ignore_conflicts=True)
+    for role in roles:
+        Role.objects.rebuild_permission_mask(role.pk)
+    # bulk_create не вызывает сигналы, поддерживающие счётчики
+    Permission.objects.recount_roles([p.pk for p in permissions])
+
+
+def role_weights(count):
+    """Распределение пользователей по ролям по Ципфу: первые роли - самые массовые"""
+    return [1 / (i + 1) for i in range(count)]
+
+
+def generate_users(total, password_hash, roles, email_prefix, batch_size=5000,
+                   seed=0, progress=None):
+    """
+    Создаёт пользователей <email_prefix>-<i>@example.com пачками через
+    bulk_create с готовым хешем пароля (без хеширования на каждого).
+    Продолжает с места остановки: уже созданные пачки пропускаются,
+    а конфликт по email при повторной вставке игнорируется.
+    progress(done, total, created) вызывается после каждой пачки,
+    created - сколько пользователей создано в этом запуске.
+    """
+    done = User.objects.filter(email__startswith=f'{email_prefix}-').count()
+    start = done - done % batch_size
+    weights = role_weights(len(roles))
+
+    for batch_start in range(start, total, batch_size):
+        batch_end = min(batch_start + batch_size, total)
+        # Свой генератор на пачку - роль пользователя не зависит от точки возобновления
+        rng = random.Random(f'{seed}-{batch_start}')
+        batch_roles = rng.choices(roles, weights, k=batch_end - batch_start) if roles else None
+
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [
+                    User(
+                        email=f'{email_prefix}-{i}@example.com',
+                        password=password_hash,
+                        first_name='Test',
+                        last_name=f'User {i}',
+                        role=batch_roles[i - batch_start] if batch_roles else None,
+                    )
+                    for i in range(batch_start, batch_end)
+                ],
+                ignore_conflicts=True
+            )
+
+        if progress is not None:
+            progress(batch_end, total, batch_end - start)
+
+    Role.objects.recount_users([role.pk for role in roles])
@@ -0,0 +1,111 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from auth_system.models import Role
+from users.models import User
+
+
+class Command(BaseCommand):
+    IDS_PER_QUERY = 10000
+
+    help = (
+        'Назначает роль многим пользователям: по списку id или по условиям '
+        '(текущая роль, активность, домен email). Роль меняется UPDATE-ами '
+        'пачками, каждая пачка - отдельная транзакция.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('role', help='Новая роль: id или название')
+        parser.add_argument('--user-ids', help='id пользователей через запятую')
+        parser.add_argument('--ids-file', help='Файл с id пользователей, по одному в строке')
+        parser.add_argument('--from-role', help='Только пользователи с этой ролью (id или название)')
+        parser.add_argument('--without-role', action='store_true', help='Только пользователи без роли')
+        parser.add_argument('--email-domain', help='Только пользователи с email в этом домене')
+        parser.add_argument('--active-only', action='store_true', help='Только активные пользователи')
+        parser.add_argument(
+            '--chunk-size', type=int,
+            default=getattr(settings, 'RBAC_BULK_ASSIGN_CHUNK_SIZE', 1000),
+            help='Пользователей в одной транзакции'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не меняя')
+
+    def handle(self, *args, **options):
+        role = self.get_role(options['role'])
+        users, ids = self.get_users(options)
+        if users is None:
+            raise CommandError(
+                'Укажите пользователей: --user-ids, --ids-file или условия отбора '
+                '(--from-role, --without-role, --email-domain, --active-only)'
+            )
+
+        # Длинный список id делится на части, чтобы не упираться
+        # в лимит параметров SQL-запроса
+        parts = [users] if ids is None else [
+            users.filter(pk__in=ids[i:i + self.IDS_PER_QUERY])
+            for i in range(0, len(ids), self.IDS_PER_QUERY)
+        ]
+
+        if options['dry_run']:
+            count = sum(part.exclude(role=role).count() for part in parts)
+            self.stdout.write(f'Роль "{role.name}" будет назначена пользователям: {count}')
+            return
+
+        started = time.monotonic()
+
+        def progress(done):
+            elapsed = time.monotonic() - started
+            rate = done / elapsed if elapsed else 0
+            self.stdout.write(f'Обновлено: {done}, {rate:,.0f}/сек')
+            self.stdout.flush()
+
+        updated = 0
+        for part in parts:
+            updated += Role.objects.assign_users(
+                role.pk, part, chunk_size=options['chunk_size'],
+                progress=lambda done: progress(updated + done)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Роль "{role.name}" назначена пользователям: {updated}'
+        ))
+
+    def get_role(self, value):
+        lookup = {'pk': int(value)} if value.isdigit() else {'name': value}
+        role = Role.objects.filter(**lookup).first()
+        if role is None:
+            raise CommandError(f'Роль {value} не найдена')
+        return role
+
+    def get_users(self, options):
+        """
+        (queryset по условиям отбора, отсортированный список id или None);
+        queryset - None, если пользователи не выбраны
+        """
+        ids = []
+        if options['user_ids']:
+            ids += options['user_ids'].split(',')
+        if options['ids_file']:
+            with open(options['ids_file']) as f:
+                ids += f.read().split()
+        try:
+            ids = [int(pk) for pk in ids]
+        except ValueError:
+            raise CommandError('id пользователей должны быть целыми числами')
+
+        users = User.objects.all()
+        selected = bool(options['user_ids'] or options['ids_file'])
+        ids = sorted(set(ids)) if selected else None
+        if options['from_role']:
+            users = users.filter(role=self.get_role(options['from_role']))
+            selected = True
+        if options['without_role']:
+            users = users.filter(role__isnull=True)
+            selected = True
+        if options['email_domain']:
+            users = users.filter(email__iendswith='@' + options['email_domain'].lstrip('@'))
+            selected = True
+        if options['active_only']:
+            users = users.filter(is_active=True)
+            selected = True
+        return (users if selected else None), ids
@@ -0,0 +1,316 @@
+import json
+import platform
+import random
+import statistics
+import time
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from auth_system.cache import permission_cache, permission_bits
+from auth_system.datagen import ensure_permissions
+from auth_system.models import Role, Permission, RolePermission
+from users.models import User
+from users.sessions import expiry_writes, session_cache
+
+
+BENCH_PASSWORD = 'bench-password-123'
+ADMIN_EMAIL = 'bench-admin@example.com'
+
+# Короткие имена движков сессий для --session-engine
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'lru': 'users.sessions',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный бенчмарк эндпоинтов аутентификации и RBAC. '
+        'Создаёт тестовую БД, заполняет её данными, прогоняет запросы '
+        'через тестовый клиент Django и выводит пропускную способность, '
+        'p50/p95/p99 задержки и число SQL-запросов на запрос.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Число пользователей')
+        parser.add_argument('--roles', type=int, default=10, help='Число ролей')
+        parser.add_argument(
+            '--permissions-per-role', type=int, default=10,
+            help='Сколько случайных разрешений назначить каждой роли'
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на сценарий')
+        parser.add_argument('--warmup', type=int, default=20, help='Прогревочных запросов на сценарий')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора случайных чисел')
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Запустить только указанные сценарии (можно несколько раз)'
+        )
+        parser.add_argument(
+            '--async', action='store_true', dest='use_async',
+            help='Гонять async-варианты вьюх (/api/async/...)'
+        )
+        parser.add_argument(
+            '--session-engine', action='append', dest='session_engines',
+            help=(
+                'Прогнать сценарии с этим движком сессий: db, cached_db, lru '
+                '(users.sessions) или путь к модулю; можно несколько раз для сравнения'
+            )
+        )
+        parser.add_argument(
+            '--save-every-request', action='store_true',
+            help='SESSION_SAVE_EVERY_REQUEST=True: каждый запрос продлевает сессию'
+        )
+        parser.add_argument('--output', help='Записать результаты в JSON-файл')
+        parser.add_argument('--json', action='store_true', help='Вывести JSON вместо таблицы')
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую БД')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            dataset = self.seed(options)
+            if options['session_engines']:
+                results = {
+                    engine: self.run_with_session_engine(engine, dataset, options)
+                    for engine in options['session_engines']
+                }
+            else:
+                results = self.run_scenarios(dataset, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'async': options['use_async'],
+                'users': options['users'],
+                'roles': options['roles'],
+                'permissions_per_role': options['permissions_per_role'],
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+                'seed': options['seed'],
+                'save_every_request': options['save_every_request'],
+            },
+        }
+        if options['session_engines']:
+            report['session_engines'] = results
+        else:
+            report['scenarios'] = results
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+                f.write('\n')
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False))
+        elif options['session_engines']:
+            for engine, engine_results in results.items():
+                self.stdout.write(f'\nДвижок сессий: {engine}')
+                self.print_table(engine_results)
+        else:
+            self.print_table(results)
+
+    # Подготовка данных
+
+    def seed(self, options):
+        """Заполняет тестовую БД ролями, разрешениями и пользователями"""
+        rng = random.Random(options['seed'])
+        permission_cache.invalidate()
+        permission_bits.invalidate()
+
+        permissions = ensure_permissions()
+
+        admin_role = Role.objects.create(name='Bench admin')
+        roles = Role.objects.bulk_create([
+            Role(name=f'Bench role {i}') for i in range(options['roles'])
+        ])
+
+        per_role = min(options['permissions_per_role'], len(permissions))
+        links = [RolePermission(role=admin_role, permission=p) for p in permissions]
+        for role in roles:
+            links.extend(
+                RolePermission(role=role, permission=p)
+                for p in rng.sample(permissions, per_role)
+            )
+        RolePermission.objects.bulk_create(links, batch_size=1000)
+        for role in [admin_role, *roles]:
+            Role.objects.rebuild_permission_mask(role.pk)
+
+        # Один хеш на всех пользователей - хешировать каждого слишком долго
+        password_hash = make_password(BENCH_PASSWORD)
+        User.objects.create(
+            email=ADMIN_EMAIL, password=password_hash, role=admin_role,
+            first_name='Bench', last_name='Admin', is_staff=True
+        )
+        User.objects.bulk_create(
+            [
+                User(
+                    email=f'bench-user-{i}@example.com',
+                    password=password_hash,
+                    first_name='Bench',
+                    last_name=f'User {i}',
+                    role=roles[i % len(roles)] if roles else None,
+                )
+                for i in range(options['users'])
+            ],
+            batch_size=1000
+        )
+        Role.objects.recount_users()
+        Permission.objects.recount_roles()
+
+        return {
+            'admin_role': admin_role,
+            'roles': roles,
+            'permissions': permissions,
+            'user_emails': [f'bench-user-{i}@example.com' for i in range(options['users'])],
+            'target_user': User.objects.exclude(email=ADMIN_EMAIL).order_by('pk').first(),
+        }
+
+    # Сценарии
+
+    def scenarios(self, dataset, prefix):
+        """Имя сценария → функция (client, i) -> response"""
+        admin_role = dataset['admin_role']
+        role = dataset['roles'][0] if dataset['roles'] else admin_role
+        permission = dataset['permissions'][0]
+        target_user = dataset['target_user']
+        emails = dataset['user_emails'] or [ADMIN_EMAIL]
+
+        def login(client, i):
+            # Новый клиент: повторный вход в той же сессии отклоняется
+            return Client().post(
+                f'{prefix}/login/',
+                {'email': emails[i % len(emails)], 'password': BENCH_PASSWORD},
+                content_type='application/json'
+            )
+
+        # Добавление и удаление разрешения чередуются, начиная без связи
+        RolePermission.objects.filter(role=role, permission=permission).delete()
+        linked = [False]
+
+        def toggle_role_permission(client, i):
+            url = f'{prefix}/admin/roles/{role.pk}/permissions/'
+            linked[0] = not linked[0]
+            if linked[0]:
+                return client.post(url, {'permission_id': permission.pk}, content_type='application/json')
+            return client.delete(f'{url}{permission.pk}/')
+
+        def update_user_role(client, i):
+            new_role = admin_role if i % 2 else role
+            return client.patch(
+                f'{prefix}/admin/users/{target_user.pk}/role/',
+                {'role_id': new_role.pk},
+                content_type='application/json'
+            )
+
+        scenarios = {
+            'login': login,
+            'profile': lambda client, i: client.get(f'{prefix}/profile/'),
+            'articles': lambda client, i: client.get(f'{prefix}/articles/'),
+            'admin_roles': lambda client, i: client.get(f'{prefix}/admin/roles/'),
+            'admin_role_detail': lambda client, i: client.get(f'{prefix}/admin/roles/{admin_role.pk}/'),
+            'admin_permissions': lambda client, i: client.get(f'{prefix}/admin/permissions/'),
+            'admin_toggle_role_permission': toggle_role_permission,
+        }
+        if target_user is not None:
+            scenarios['admin_update_user_role'] = update_user_role
+        return scenarios
+
+    def run_with_session_engine(self, engine, dataset, options):
+        """Сценарии с другим SESSION_ENGINE; продления users.sessions пишутся в замерах"""
+        self.stderr.write(f'Движок сессий: {engine}')
+        session_cache.clear()
+        with override_settings(
+            SESSION_ENGINE=SESSION_ENGINES.get(engine, engine),
+            SESSION_SAVE_EVERY_REQUEST=options['save_every_request'],
+            SESSION_WRITE_BEHIND_INTERVAL=3600,  # вместо фонового потока - flush в measure
+        ):
+            return self.run_scenarios(dataset, options)
+
+    def run_scenarios(self, dataset, options):
+        prefix = '/api/async' if options['use_async'] else '/api'
+        scenarios = self.scenarios(dataset, prefix)
+        selected = options['scenarios'] or list(scenarios)
+
+        client = Client()
+        client.force_login(User.objects.get(email=ADMIN_EMAIL))
+
+        results = {}
+        for name in selected:
+            if name not in scenarios:
+                self.stderr.write(f'Неизвестный сценарий: {name}')
+                continue
+            self.stderr.write(f'→ {name}')
+            results[name] = self.measure(scenarios[name], client, options)
+        return results
+
+    def measure(self, scenario, client, options):
+        for i in range(options['warmup']):
+            scenario(client, i)
+
+        latencies = []
+        queries = []
+        statuses = {}
+        started = time.perf_counter()
+        for i in range(options['requests']):
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                response = scenario(client, i)
+                latencies.append((time.perf_counter() - t0) * 1000)
+            queries.append(len(ctx))
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        # Отложенные продления сессий (users.sessions) - часть стоимости сценария
+        expiry_writes.flush()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'requests': len(latencies),
+            'statuses': statuses,
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies), 3),
+                'p50': round(percentile(latencies, 50), 3),
+                'p95': round(percentile(latencies, 95), 3),
+                'p99': round(percentile(latencies, 99), 3),
+                'max': round(max(latencies), 3),
+            },
+            'queries_per_request': {
+                'mean': round(statistics.fmean(queries), 2),
+                'max': max(queries),
+            },
+        }
+
+    def print_table(self, results):
+        header = f'{"scenario":<28}{"rps":>9}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>9}  statuses'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, r in results.items():
+            lat = r['latency_ms']
+            self.stdout.write(
+                f'{name:<28}{r["throughput_rps"]:>9}{lat["p50"]:>10}{lat["p95"]:>10}'
+                f'{lat["p99"]:>10}{r["queries_per_request"]["mean"]:>9}  {r["statuses"]}'
+            )
+
+
+def percentile(values, pct):
+    """Перцентиль методом ближайшего ранга"""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
@@ -0,0 +1,71 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+
+from auth_system.datagen import (
+    assign_role_permissions,
+    ensure_permissions,
+    ensure_roles,
+    generate_users,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует большой набор данных RBAC: разрешения, роли со случайными '
+        'наборами прав и пользователей (bulk_create пачками, один хеш пароля '
+        'на всех). Повторный запуск продолжает с места остановки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000, help='Сколько пользователей должно быть')
+        parser.add_argument('--roles', type=int, default=1000, help='Сколько ролей должно быть')
+        parser.add_argument('--min-permissions', type=int, default=1, help='Минимум разрешений на роль')
+        parser.add_argument('--max-permissions', type=int, default=12, help='Максимум разрешений на роль')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки bulk_create')
+        parser.add_argument('--password', default='password123', help='Пароль всех пользователей')
+        parser.add_argument('--email-prefix', default='user', help='Префикс email: <prefix>-<i>@example.com')
+        parser.add_argument('--role-prefix', default='Роль', help='Префикс названий ролей')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора случайных чисел')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        permissions = ensure_permissions()
+        self.stdout.write(f'Разрешений: {len(permissions)}')
+
+        roles = ensure_roles(options['roles'], options['role_prefix'])
+        assign_role_permissions(
+            roles, permissions, rng,
+            min_per_role=options['min_permissions'],
+            max_per_role=options['max_permissions']
+        )
+        self.stdout.write(f'Ролей: {len(roles)}')
+
+        started = time.monotonic()
+
+        def progress(done, total, created):
+            elapsed = time.monotonic() - started
+            rate = created / elapsed if elapsed else 0
+            eta = (total - done) / rate if rate else 0
+            self.stdout.write(
+                f'Пользователей: {done}/{total} ({done * 100 // total}%), '
+                f'{rate:,.0f}/сек, осталось ~{eta:,.0f} сек'
+            )
+            self.stdout.flush()
+
+        generate_users(
+            options['users'],
+            make_password(options['password']),
+            roles,
+            options['email_prefix'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            progress=progress,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:,.1f} сек'
+        ))
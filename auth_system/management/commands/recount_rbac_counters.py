@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auth_system.models import Role, Permission
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики Role.user_count и '
+        'Permission.role_count по реальным данным. С --check только '
+        'сообщает о расхождениях и завершается с ошибкой, если они есть.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить счётчики, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        roles = list(Role.objects.user_count_mismatches().values_list(
+            'name', 'user_count', 'actual_count'
+        ))
+        permissions = list(Permission.objects.role_count_mismatches().values_list(
+            'codename', 'role_count', 'actual_count'
+        ))
+
+        for name, stored, actual in roles:
+            self.stdout.write(f'Роль "{name}": user_count={stored}, на самом деле {actual}')
+        for codename, stored, actual in permissions:
+            self.stdout.write(f'Разрешение {codename}: role_count={stored}, на самом деле {actual}')
+
+        if options['check']:
+            if roles or permissions:
+                raise CommandError(
+                    f'Расхождения: ролей - {len(roles)}, разрешений - {len(permissions)}'
+                )
+            self.stdout.write(self.style.SUCCESS('Счётчики в порядке'))
+            return
+
+        Role.objects.recount_users()
+        Permission.objects.recount_roles()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны (исправлено ролей: {len(roles)}, разрешений: {len(permissions)})'
+        ))
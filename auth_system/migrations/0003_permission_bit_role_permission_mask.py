@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+def assign_bits(apps, schema_editor):
+    """Назначает биты существующим разрешениям и пересчитывает маски ролей"""
+    Permission = apps.get_model("auth_system", "Permission")
+    Role = apps.get_model("auth_system", "Role")
+    RolePermission = apps.get_model("auth_system", "RolePermission")
+
+    for bit, permission in enumerate(Permission.objects.order_by("id")):
+        permission.bit = bit
+        permission.save(update_fields=["bit"])
+
+    masks = {}
+    for role_id, bit in RolePermission.objects.values_list(
+        "role_id", "permission__bit"
+    ):
+        masks[role_id] = masks.get(role_id, 0) | (1 << bit)
+
+    for role_id, mask in masks.items():
+        Role.objects.filter(pk=role_id).update(
+            permission_mask=mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth_system", "0002_alter_rolepermission_role"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="permission",
+            name="bit",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                help_text="Стабильный индекс разрешения в битовой маске роли",
+                null=True,
+                unique=True,
+                verbose_name="Номер бита",
+            ),
+        ),
+        migrations.AddField(
+            model_name="role",
+            name="permission_mask",
+            field=models.BinaryField(
+                default=b"",
+                editable=False,
+                help_text="Бит i выставлен, если роли назначено разрешение с bit=i",
+                verbose_name="Битовая маска разрешений",
+            ),
+        ),
+        migrations.RunPython(assign_bits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth_system", "0003_permission_bit_role_permission_mask"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="role",
+            name="permission_version",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Увеличивается при каждом пересчёте маски разрешений",
+                verbose_name="Версия разрешений",
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+def count_existing(apps, schema_editor):
+    """Заполняет счётчики по существующим пользователям и связям"""
+    Role = apps.get_model("auth_system", "Role")
+    Permission = apps.get_model("auth_system", "Permission")
+
+    for role in Role.objects.annotate(actual=models.Count("users")):
+        Role.objects.filter(pk=role.pk).update(user_count=role.actual)
+
+    for permission in Permission.objects.annotate(actual=models.Count("roles")):
+        Permission.objects.filter(pk=permission.pk).update(role_count=permission.actual)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth_system", "0004_role_permission_version"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="permission",
+            name="role_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Поддерживается сигналами, проверка: manage.py recount_rbac_counters --check",
+                verbose_name="Назначено ролям",
+            ),
+        ),
+        migrations.AddField(
+            model_name="role",
+            name="user_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Поддерживается сигналами, проверка: manage.py recount_rbac_counters --check",
+                verbose_name="Кол-во пользователей",
+            ),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,172 @@
-from django.db import models
+from collections import Counter
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+
+def encode_mask(mask):
+    """Битовая маска (int) → байты для хранения в БД"""
+    return mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+
+
+def decode_mask(data):
+    """Байты из БД (bytes или memoryview) → битовая маска (int)"""
+    if not data:
+        return 0
+    return int.from_bytes(bytes(data), 'little')
+
+
+def _count_subquery(queryset, field):
+    """Подзапрос: число строк queryset, у которых field ссылается на внешний объект"""
+    counts = queryset.filter(**{field: models.OuterRef('pk')}).order_by().values(field).annotate(
+        count=models.Count('pk')
+    ).values('count')
+    return Coalesce(models.Subquery(counts), 0, output_field=models.IntegerField())
+
+
+class RoleQuerySet(models.QuerySet):
+    def with_permission_count(self):
+        """
+        Роли с аннотацией permission_count. Подзапрос коррелированный,
+        поэтому считается только для строк, попавших в выборку (страницу)
+        """
+        return self.annotate(
+            permission_count=_count_subquery(RolePermission.objects.all(), 'role')
+        )
+
+
+class RoleManager(models.Manager.from_queryset(RoleQuerySet)):
+    def with_details(self):
+        """
+        Роли со всем, что нужно RoleDetailSerializer: разрешения
+        подгружаются одним запросом на все роли
+        """
+        return self.prefetch_related(
+            models.Prefetch(
+                'role_permissions',
+                queryset=RolePermission.objects.select_related('permission')
+            )
+        )
+
+    def adjust_user_count(self, role_id, delta):
+        """
+        Изменяет счётчик пользователей роли на delta без чтения строки.
+        Ниже нуля счётчик не опускается: строки, созданные в обход сигналов
+        (bulk_create), дают расхождение, которое находит recount_rbac_counters --check
+        """
+        return self.filter(pk=role_id).update(
+            user_count=Greatest(models.F('user_count') + delta, 0)
+        )
+
+    def recount_users(self, role_ids=None):
+        """Пересчитывает user_count ролей (всех или role_ids) одним UPDATE"""
+        from users.models import User
+
+        roles = self.all() if role_ids is None else self.filter(pk__in=role_ids)
+        return roles.update(user_count=_count_subquery(User.objects.all(), 'role'))
+
+    def assign_users(self, role_id, users, chunk_size=1000, progress=None):
+        """
+        Назначает роль role_id пользователям из queryset users.
+        Пользователи перебираются по id пачками по chunk_size, каждая пачка -
+        отдельная короткая транзакция: SELECT ... FOR UPDATE и один UPDATE без
+        загрузки моделей, поправка user_count и сигнал user_role_changed для её id.
+        progress(done) вызывается после каждой пачки.
+        Возвращает число пользователей, у которых роль поменялась
+        """
+        from users.models import User
+        from .signals import user_role_changed
+
+        pending = users.exclude(role_id=role_id).order_by('pk')
+        done = 0
+        last_pk = None
+        while True:
+            chunk = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+            with transaction.atomic():
+                # Строки пачки блокируются до конца транзакции - счётчики точные
+                rows = list(chunk.select_for_update(of=('self',)).values_list('pk', 'role_id')[:chunk_size])
+                if not rows:
+                    break
+                user_ids = [pk for pk, _ in rows]
+                last_pk = user_ids[-1]
+
+                User.objects.filter(pk__in=user_ids).update(
+                    role_id=role_id, updated_at=timezone.now()
+                )
+
+                moved = Counter(old for _, old in rows if old is not None)
+                for old_role_id, count in moved.items():
+                    self.adjust_user_count(old_role_id, -count)
+                self.adjust_user_count(role_id, len(rows))
+
+                user_role_changed.send(sender=User, user_ids=user_ids, role_id=role_id)
+
+            done += len(rows)
+            if progress is not None:
+                progress(done)
+            if len(rows) < chunk_size:
+                break
+        return done
+
+    def user_count_mismatches(self):
+        """Роли, у которых user_count не совпадает с реальным числом пользователей"""
+        return self.annotate(actual_count=models.Count('users')).exclude(
+            user_count=models.F('actual_count')
+        )
+
+    def change_permissions(self, role_id, add=(), remove=()):
+        """
+        Назначает роли разрешения add и снимает remove (id разрешений,
+        существование проверяет вызывающий). Связи добавляются одной вставкой,
+        снимаются обычным delete() - сигналы удаления получают каждую связь,
+        но маску и Permission.role_count по одной связи не пересчитывают
+        (signals.deferred_link_updates): счётчики пересчитываются здесь одним
+        UPDATE, маску роли и кэш после вызова обновляет
+        signals.role_permissions_changed. Вызывать внутри transaction.atomic.
+        Возвращает (добавленные id, снятые id)
+        """
+        from .signals import deferred_link_updates
+
+        links = RolePermission.objects.filter(role_id=role_id)
+        assigned = set(links.filter(
+            permission_id__in=[*add, *remove]
+        ).values_list('permission_id', flat=True))
+
+        added = [pk for pk in dict.fromkeys(add) if pk not in assigned]
+        removed = [pk for pk in dict.fromkeys(remove) if pk in assigned]
+
+        if added:
+            # Конфликт возможен, если ту же связь параллельно создал другой запрос
+            RolePermission.objects.bulk_create(
+                [RolePermission(role_id=role_id, permission_id=pk) for pk in added],
+                ignore_conflicts=True
+            )
+        if removed:
+            with deferred_link_updates(role_id):
+                links.filter(permission_id__in=removed).delete()
+        if added or removed:
+            # Пересчёт, а не +-1: точен и при параллельных изменениях тех же связей
+            Permission.objects.recount_roles([*added, *removed])
+        return added, removed
+
+    def rebuild_permission_mask(self, role_id):
+        """Пересчитывает битовую маску роли по её связям с разрешениями"""
+        bits = Permission.objects.filter(
+            roles__role_id=role_id,
+            bit__isnull=False
+        ).values_list('bit', flat=True)
+        
+        mask = 0
+        for bit in bits:
+            mask |= 1 << bit
+        
+        # Версия нужна, чтобы отличать устаревшие разрешения в JWT-токенах
+        self.filter(pk=role_id).update(
+            permission_mask=encode_mask(mask),
+            permission_version=models.F('permission_version') + 1
+        )
+        return mask
 
 
 class Role(models.Model):
@@ -27,6 +195,26 @@ class Role(models.Model):
         null=True,
         blank=True
     )
+    permission_mask = models.BinaryField(
+        'Битовая маска разрешений',
+        default=b'',
+        editable=False,
+        help_text='Бит i выставлен, если роли назначено разрешение с bit=i'
+    )
+    permission_version = models.PositiveIntegerField(
+        'Версия разрешений',
+        default=0,
+        editable=False,
+        help_text='Увеличивается при каждом пересчёте маски разрешений'
+    )
+    user_count = models.PositiveIntegerField(
+        'Кол-во пользователей',
+        default=0,
+        editable=False,
+        help_text='Поддерживается сигналами, проверка: manage.py recount_rbac_counters --check'
+    )
+    
+    objects = RoleManager()
     
     class Meta:
         verbose_name = 'Роль'
@@ -36,6 +224,32 @@ class Role(models.Model):
     def __str__(self):
         return self.name
     
+class PermissionManager(models.Manager):
+    def next_bit(self):
+        """Следующий свободный номер бита"""
+        last_bit = self.aggregate(models.Max('bit'))['bit__max']
+        return 0 if last_bit is None else last_bit + 1
+
+    def adjust_role_count(self, permission_id, delta):
+        """Изменяет счётчик ролей разрешения на delta без чтения строки (не ниже нуля)"""
+        return self.filter(pk=permission_id).update(
+            role_count=Greatest(models.F('role_count') + delta, 0)
+        )
+
+    def recount_roles(self, permission_ids=None):
+        """Пересчитывает role_count разрешений (всех или permission_ids) одним UPDATE"""
+        permissions = self.all() if permission_ids is None else self.filter(pk__in=permission_ids)
+        return permissions.update(
+            role_count=_count_subquery(RolePermission.objects.all(), 'permission')
+        )
+
+    def role_count_mismatches(self):
+        """Разрешения, у которых role_count не совпадает с реальным числом ролей"""
+        return self.annotate(actual_count=models.Count('roles')).exclude(
+            role_count=models.F('actual_count')
+        )
+
+
 class Permission(models.Model):
     """
     Разрешение на действие (статья:читать, статья:писать и т.д.)
@@ -84,6 +298,22 @@ class Permission(models.Model):
         null=True,
         blank=True
     )
+    bit = models.PositiveIntegerField(
+        'Номер бита',
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Стабильный индекс разрешения в битовой маске роли'
+    )
+    role_count = models.PositiveIntegerField(
+        'Назначено ролям',
+        default=0,
+        editable=False,
+        help_text='Поддерживается сигналами, проверка: manage.py recount_rbac_counters --check'
+    )
+    
+    objects = PermissionManager()
     
     class Meta:
         verbose_name = 'Разрешение'
@@ -94,11 +324,30 @@ class Permission(models.Model):
     def __str__(self):
         return f'{self.codename} ({self.get_resource_display()}:{self.get_action_display()})'
     
+    # Попыток занять свободный бит при параллельном создании разрешений
+    BIT_ALLOCATION_ATTEMPTS = 5
+
     def save(self, *args, **kwargs):
         # Автоматически генерируем codename если не указан
         if not self.codename:
             self.codename = f'{self.resource}.{self.action}'
-        super().save(*args, **kwargs)
+        if self.bit is not None:
+            return super().save(*args, **kwargs)
+
+        # Назначаем следующий свободный бит один раз при создании. Бит читается
+        # до записи, и параллельное создание может занять его раньше - тогда
+        # запись откатывается до точки сохранения и берётся следующий бит
+        for attempt in range(self.BIT_ALLOCATION_ATTEMPTS):
+            self.bit = Permission.objects.next_bit()
+            try:
+                with transaction.atomic(using=kwargs.get('using')):
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                bit_taken = Permission.objects.filter(bit=self.bit).exists()
+                self.bit = None
+                # Конфликт не по биту (codename, ресурс+действие) - повторять незачем
+                if not bit_taken or attempt == self.BIT_ALLOCATION_ATTEMPTS - 1:
+                    raise
         
 class RolePermission(models.Model):
     """
@@ -126,5 +375,10 @@ class RolePermission(models.Model):
         verbose_name_plural = 'Разрешения ролей'
         unique_together = [['role', 'permission']]  # нельзя назначить одно разрешение роли дважды
     
+    def save(self, *args, **kwargs):
+        # role_count разрешения меняется в post_save - в одной транзакции с записью
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+    
     def __str__(self):
         return f'{self.role.name} → {self.permission.codename}'
\ No newline at end of file
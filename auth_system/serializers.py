@@ -29,17 +29,12 @@ class RoleDetailSerializer(serializers.ModelSerializer):
         many=True, 
         read_only=True
     )
-    user_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Role
         fields = ('id', 'name', 'description', 'permissions', 'user_count', 
                   'created_at', 'updated_at')
-        read_only_fields = ('id', 'created_at', 'updated_at')
-    
-    def get_user_count(self, obj):
-        """Количество пользователей с этой ролью"""
-        return obj.users.count()
+        read_only_fields = ('id', 'user_count', 'created_at', 'updated_at')
 
 
 class RoleSerializer(serializers.ModelSerializer):
@@ -54,6 +49,7 @@ class UserRoleSerializer(serializers.ModelSerializer):
     """Сериализатор для изменения роли пользователя"""
     role_id = serializers.IntegerField(required=True)
     role_name = serializers.CharField(source='role.name', read_only=True)
+    full_name = serializers.CharField(source='get_full_name', read_only=True)
     
     class Meta:
         model = User
@@ -91,4 +87,80 @@ class AddPermissionToRoleSerializer(serializers.Serializer):
                 {"permission_id": "Разрешение с указанным ID не существует"}
             )
         
-        return attrs
\ No newline at end of file
+        return attrs
+
+class BulkRolePermissionsSerializer(serializers.Serializer):
+    """Сериализатор для массового изменения разрешений роли"""
+    add = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+    
+    def validate(self, attrs):
+        add, remove = attrs['add'], attrs['remove']
+        
+        if not add and not remove:
+            raise serializers.ValidationError("Укажите разрешения в add и/или remove")
+        
+        both = set(add) & set(remove)
+        if both:
+            raise serializers.ValidationError(
+                {"remove": f"Разрешения одновременно в add и remove: {sorted(both)}"}
+            )
+        
+        # Существование всех разрешений проверяется одним запросом
+        requested = set(add) | set(remove)
+        found = set(Permission.objects.filter(pk__in=requested).order_by().values_list('pk', flat=True))
+        missing = requested - found
+        if missing:
+            raise serializers.ValidationError(
+                {"permission_ids": f"Разрешения с ID {sorted(missing)} не существуют"}
+            )
+        
+        return attrs
+
+
+class UserFilterSerializer(serializers.Serializer):
+    """Условия отбора пользователей для массовой смены роли"""
+    role_id = serializers.IntegerField(required=False, allow_null=True)  # null - без роли
+    is_active = serializers.BooleanField(required=False)
+    email_domain = serializers.CharField(required=False)
+    
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("Нужно хотя бы одно условие отбора")
+        return attrs
+
+
+class BulkUserRoleSerializer(serializers.Serializer):
+    """Сериализатор для назначения роли многим пользователям"""
+    role_id = serializers.IntegerField(required=True)
+    # Больше пользователей - через filter или manage.py assign_role
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False, max_length=10000
+    )
+    filter = UserFilterSerializer(required=False)
+    
+    def validate(self, attrs):
+        if ('user_ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError("Укажите либо user_ids, либо filter")
+        
+        attrs['role'] = Role.objects.filter(id=attrs['role_id']).first()
+        if attrs['role'] is None:
+            raise serializers.ValidationError(
+                {"role_id": "Роль с указанным ID не существует"}
+            )
+        return attrs
+    
+    def get_users(self):
+        """Queryset выбранных пользователей"""
+        data = self.validated_data
+        if 'user_ids' in data:
+            return User.objects.filter(pk__in=data['user_ids'])
+        
+        conditions = dict(data['filter'])
+        if 'email_domain' in conditions:
+            conditions['email__iendswith'] = '@' + conditions.pop('email_domain').lstrip('@')
+        return User.objects.filter(**conditions)
@@ -0,0 +1,150 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .cache import permission_cache, permission_bits, rbac_generation
+from .models import Role, Permission, RolePermission
+from users.models import User
+from users.revocation import revoked_tokens
+from users.sessions import end_user_sessions
+
+
+# Роль пользователей изменилась: user_ids - их id, role_id - новая роль
+user_role_changed = Signal()
+
+# Роль, изменения связей которой сейчас пересчитывает вызывающий
+_deferred_role = ContextVar('deferred_link_role', default=None)
+
+
+def invalidate_permission_cache(role_id=None):
+    """
+    Сбрасывает кэш разрешений сразу и ещё раз после коммита транзакции,
+    чтобы параллельный запрос не успел закэшировать старые данные.
+    Другие процессы узнают об изменении по rbac_generation
+    """
+    permission_cache.invalidate(role_id)
+    transaction.on_commit(partial(permission_cache.invalidate, role_id))
+    transaction.on_commit(rbac_generation.bump)
+
+
+def role_permissions_changed(role_id):
+    """Пересчитывает битовую маску роли и сбрасывает её кэш"""
+    Role.objects.rebuild_permission_mask(role_id)
+    invalidate_permission_cache(role_id)
+
+
+@contextmanager
+def deferred_link_updates(role_id):
+    """
+    Внутри блока сигналы связей роли role_id не пересчитывают маску роли
+    и Permission.role_count на каждую связь: вызывающий после блока
+    пересчитывает счётчики и вызывает role_permissions_changed сам
+    """
+    token = _deferred_role.set(role_id)
+    try:
+        yield
+    finally:
+        _deferred_role.reset(token)
+
+
+@receiver([post_save, post_delete], sender=RolePermission)
+def role_permission_changed(sender, instance, **kwargs):
+    """Связь роли и разрешения изменилась - пересчитываем маску роли"""
+    if instance.role_id != _deferred_role.get():
+        role_permissions_changed(instance.role_id)
+
+
+# Счётчики Role.user_count и Permission.role_count. Исходное значение
+# внешнего ключа запоминается при загрузке объекта; bulk_create и
+# QuerySet.update сигналов не вызывают - там счётчики пересчитываются явно
+
+def _loaded_value(instance, attname):
+    # Через __dict__, чтобы не загружать отложенное поле лишним запросом
+    return instance.__dict__.get(attname)
+
+
+@receiver(post_init, sender=RolePermission)
+def remember_role_permission(sender, instance, **kwargs):
+    instance._original_permission_id = _loaded_value(instance, 'permission_id')
+
+
+@receiver(post_save, sender=RolePermission)
+def count_saved_role_permission(sender, instance, created, **kwargs):
+    if instance.role_id == _deferred_role.get():
+        return
+    original = None if created else instance._original_permission_id
+    if original != instance.permission_id:
+        if original is not None:
+            Permission.objects.adjust_role_count(original, -1)
+        Permission.objects.adjust_role_count(instance.permission_id, 1)
+    instance._original_permission_id = instance.permission_id
+
+
+@receiver(post_delete, sender=RolePermission)
+def count_deleted_role_permission(sender, instance, **kwargs):
+    if instance.role_id == _deferred_role.get():
+        return
+    Permission.objects.adjust_role_count(instance.permission_id, -1)
+
+
+@receiver(post_init, sender=User)
+def remember_user_role(sender, instance, **kwargs):
+    instance._original_role_id = _loaded_value(instance, 'role_id')
+
+
+@receiver(post_save, sender=User)
+def count_saved_user(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Поправляет счётчики ролей. Если роль существующего пользователя
+    сменилась (API, админка, save() в коде) - отправляет user_role_changed
+    """
+    if update_fields is not None and not {'role', 'role_id'} & set(update_fields):
+        return
+    original = None if created else instance._original_role_id
+    if original != instance.role_id:
+        if original is not None:
+            Role.objects.adjust_user_count(original, -1)
+        if instance.role_id is not None:
+            Role.objects.adjust_user_count(instance.role_id, 1)
+        if not created:
+            user_role_changed.send(sender=User, user_ids=[instance.pk], role_id=instance.role_id)
+    instance._original_role_id = instance.role_id
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, instance, **kwargs):
+    if instance.role_id is not None:
+        Role.objects.adjust_user_count(instance.role_id, -1)
+
+
+@receiver([post_save, post_delete], sender=Role)
+def role_changed(sender, instance, **kwargs):
+    invalidate_permission_cache(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Permission)
+def permission_changed(sender, instance, created=False, **kwargs):
+    """Кодовое имя или набор битов могли поменяться"""
+    permission_bits.invalidate()
+    transaction.on_commit(permission_bits.invalidate)
+    if created:
+        transaction.on_commit(rbac_generation.bump)
+    else:
+        invalidate_permission_cache()
+
+
+@receiver(user_role_changed)
+def users_role_changed(sender, user_ids, role_id, **kwargs):
+    """
+    Кэш разрешений хранится по ролям и от этого не меняется - общее
+    поколение RBAC не трогаем. Access-токены со старой ролью отзываются,
+    сессии пользователей завершаются (END_SESSIONS_ON_ROLE_CHANGE)
+    """
+    revoked_tokens.revoke_user_tokens(user_ids, include_refresh=False)
+    if getattr(settings, 'END_SESSIONS_ON_ROLE_CHANGE', True):
+        end_user_sessions(user_ids)
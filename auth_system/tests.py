@@ -1,3 +1,1204 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models.signals import post_delete
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from utils.testing import (
+    QueryBudgetTestMixin,
+    create_user_with_permissions,
+    warm_permission_cache,
+)
+from users.models import User, UserSession
+from users.revocation import revoked_tokens
+from users.tokens import issue_tokens
+from utils.instrumentation import RecentRequests, RequestMetrics, recent_requests
+from utils.metrics import login_attempts, render, store as metrics_store
+from utils.pagination import EstimatedCountPaginator
+from utils.shared_generation import SharedGeneration, SharedTombstones
+from . import urls
+from .management.commands import benchmark_auth
+from .authz import decide, parse_checks
+from .cache import (
+    RolePermissions,
+    StalePermissions,
+    permission_bits,
+    permission_cache,
+    rbac_generation,
+)
+from .models import (
+    Permission,
+    PermissionManager,
+    Role,
+    RolePermission,
+    decode_mask,
+    encode_mask,
+)
+from .signals import user_role_changed
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Число SQL-запросов вьюх auth_system.views не превышает объявленных бюджетов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user_with_permissions(
+            'admin@example.com', 'password123',
+            ['permission.manage', 'article.read', 'article.create'],
+            is_staff=True
+        )
+        cls.user = create_user_with_permissions('user@example.com', 'password123', ['user.read'])
+        cls.role = cls.user.role
+        cls.permission = Permission.objects.get(codename='article.create')
+
+    def setUp(self):
+        warm_permission_cache()
+        self.client.force_login(self.admin)
+
+    def test_all_views_have_budget(self):
+        self.assertViewsHaveQueryBudget(urls)
+
+    def test_role_list(self):
+        response = self.assertWithinQueryBudget('get', reverse('admin-role-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_role_list_expanded_does_not_grow_with_roles(self):
+        for i in range(5):
+            role = Role.objects.create(name=f'Роль {i}')
+            RolePermission.objects.create(role=role, permission=self.permission)
+        warm_permission_cache()
+
+        response = self.assertWithinQueryBudget(
+            'get', reverse('admin-role-list') + '?expand=permissions'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), Role.objects.count())
+
+    def test_role_detail(self):
+        response = self.assertWithinQueryBudget('get', reverse('admin-role-detail', args=[self.admin.role_id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_permission_list(self):
+        response = self.assertWithinQueryBudget('get', reverse('admin-permission-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_add_permission_to_role(self):
+        response = self.assertWithinQueryBudget(
+            'post', reverse('add-permission-to-role', args=[self.role.pk]),
+            data={'permission_id': self.permission.pk}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_remove_permission_from_role(self):
+        RolePermission.objects.create(role=self.role, permission=self.permission)
+        warm_permission_cache()
+
+        response = self.assertWithinQueryBudget(
+            'delete', reverse('remove-permission-from-role', args=[self.role.pk, self.permission.pk])
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_update_role_permissions(self):
+        RolePermission.objects.create(role=self.role, permission=self.permission)
+        extra = [
+            Permission.objects.create(resource='user', action=action)
+            for action in ('create', 'update', 'delete')
+        ]
+        warm_permission_cache()
+
+        response = self.assertWithinQueryBudget(
+            'post', reverse('bulk-update-role-permissions', args=[self.role.pk]),
+            data={'add': [p.pk for p in extra], 'remove': [self.permission.pk]},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_update_user_role(self):
+        Client().force_login(self.user)  # смена роли завершает его сессию
+        response = self.assertWithinQueryBudget(
+            'post', reverse('bulk-update-user-role'),
+            data={'role_id': self.admin.role_id, 'filter': {'role_id': self.role.pk}},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_update_user_role_budget_grows_with_chunks(self):
+        for i in range(4):
+            User.objects.create_user(f'chunk{i}@example.com', 'password123', role=self.role)
+
+        with self.settings(RBAC_BULK_ASSIGN_CHUNK_SIZE=2):
+            response = self.assertWithinQueryBudget(
+                'post', reverse('bulk-update-user-role'),
+                data={'role_id': self.admin.role_id, 'filter': {'role_id': self.role.pk}},
+                content_type='application/json'
+            )
+        self.assertEqual(response.json()['updated'], 5)
+        self.assertEqual(recent_requests.snapshot(1)[0]['chunks'], 3)
+        self.assertEqual(recent_requests.snapshot(1)[0]['query_budget'], 12 + 2 * 10)
+
+    def test_update_user_role(self):
+        Client().force_login(self.user)
+        response = self.assertWithinQueryBudget(
+            'patch', reverse('update-user-role', args=[self.user.pk]),
+            data={'role_id': self.admin.role_id}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_perf_requests(self):
+        response = self.assertWithinQueryBudget('get', reverse('perf-requests'))
+        self.assertEqual(response.status_code, 200)
+
+
+class RoleChangeQueryBudgetTests(QueryBudgetTestMixin, TransactionTestCase):
+    """
+    Бюджет смены роли на реальном пути: транзакция не вложена в тестовую,
+    у пользователя есть живые токены и сессия
+    """
+
+    def setUp(self):
+        self.admin = create_user_with_permissions(
+            'admin@example.com', 'password123', ['permission.manage'], is_staff=True
+        )
+        self.user = create_user_with_permissions('user@example.com', 'password123', ['user.read'])
+        issue_tokens(self.user)
+        Client().force_login(self.user)
+        warm_permission_cache()
+        self.client.force_login(self.admin)
+
+    def test_update_user_role(self):
+        response = self.assertWithinQueryBudget(
+            'patch', reverse('update-user-role', args=[self.user.pk]),
+            data={'role_id': self.admin.role_id}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(UserSession.objects.filter(user=self.user).exists())
+
+
+class PermissionBitTests(TestCase):
+    """Номера битов разрешений и битовые маски ролей"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.read, cls.update = [
+            Permission.objects.create(resource='article', action=action)
+            for action in ('read', 'update')
+        ]
+        cls.role = Role.objects.create(name='Редактор')
+
+    def test_bits_assigned_once_in_order(self):
+        self.assertEqual(self.update.bit, self.read.bit + 1)
+        self.read.description = 'Чтение статей'
+        self.read.save()
+        self.assertEqual(Permission.objects.get(pk=self.read.pk).bit, self.update.bit - 1)
+
+    def test_bit_taken_concurrently_is_retried(self):
+        # Параллельное создание успело занять прочитанный бит
+        taken = self.update.bit
+        with mock.patch.object(PermissionManager, 'next_bit', side_effect=[taken, taken + 1]):
+            permission = Permission.objects.create(resource='article', action='delete')
+        self.assertEqual(permission.bit, taken + 1)
+
+    def test_other_conflicts_are_not_retried(self):
+        with mock.patch.object(PermissionManager, 'next_bit', return_value=100) as next_bit:
+            with self.assertRaises(IntegrityError):
+                Permission.objects.create(resource='article', action='read')
+        self.assertEqual(next_bit.call_count, 1)
+
+    def test_role_mask_rebuilt_on_link_changes(self):
+        def role_permissions():
+            role = Role.objects.get(pk=self.role.pk)
+            return decode_mask(role.permission_mask), role.permission_version
+
+        RolePermission.objects.create(role=self.role, permission=self.read)
+        link = RolePermission.objects.create(role=self.role, permission=self.update)
+        mask, version = role_permissions()
+        self.assertEqual(mask, (1 << self.read.bit) | (1 << self.update.bit))
+
+        link.delete()
+        self.assertEqual(role_permissions(), (1 << self.read.bit, version + 1))
+
+
+class RolePermissionCacheTests(TestCase):
+    """Процессный кэш разрешений ролей (auth_system.cache.permission_cache)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(name='Редактор')
+        cls.read, cls.update = [
+            Permission.objects.create(resource='article', action=action)
+            for action in ('read', 'update')
+        ]
+        RolePermission.objects.create(role=cls.role, permission=cls.read)
+
+    def setUp(self):
+        permission_cache.invalidate()
+        self.addCleanup(permission_cache.invalidate)
+
+    def test_hit_does_not_query(self):
+        permissions = permission_cache.get(self.role.pk)
+        self.assertEqual(permissions.mask, 1 << self.read.bit)
+        with self.assertNumQueries(0):
+            self.assertEqual(permission_cache.get(self.role.pk), permissions)
+
+    def test_entry_expires_after_ttl(self):
+        with self.settings(RBAC_PERMISSION_CACHE_TTL=0.2):
+            permission_cache.get(self.role.pk)
+            with self.assertNumQueries(0):
+                permission_cache.get(self.role.pk)
+            time.sleep(0.25)
+            with self.assertNumQueries(1):
+                permission_cache.get(self.role.pk)
+
+    def test_invalidated_when_role_permissions_change(self):
+        before = permission_cache.get(self.role.pk)
+        RolePermission.objects.create(role=self.role, permission=self.update)
+
+        after = permission_cache.get(self.role.pk)
+        self.assertEqual(after.mask, (1 << self.read.bit) | (1 << self.update.bit))
+        self.assertGreater(after.version, before.version)
+
+    def test_reset_by_generation_bumped_in_other_process(self):
+        # Другой процесс - своё отображение того же файла поколения
+        other_process = SharedGeneration('rbac', 'RBAC_GENERATION_CHECK_INTERVAL')
+        with self.settings(RBAC_GENERATION_CHECK_INTERVAL=0):
+            permission_cache.get(self.role.pk)
+            # Изменение без сигналов этого процесса
+            Role.objects.filter(pk=self.role.pk).update(
+                permission_mask=encode_mask(1 << self.update.bit)
+            )
+            self.assertEqual(permission_cache.get(self.role.pk).mask, 1 << self.read.bit)
+
+            other_process.bump()
+            self.assertEqual(permission_cache.get(self.role.pk).mask, 1 << self.update.bit)
+
+
+class PermissionCacheSingleFlightTests(TestCase):
+    """Одновременные промахи по одной роли загружают её из БД один раз"""
+
+    THREADS = 8
+    ROLE_ID = 1000000
+
+    def setUp(self):
+        permission_cache.invalidate()
+        self.addCleanup(permission_cache.invalidate)
+        self.loads = []
+
+    def get_concurrently(self, load):
+        """
+        get() роли из THREADS потоков. Загрузка ведущего ждёт, пока к ней
+        присоединятся все потоки, и только потом вызывает load
+        """
+        joined = threading.Semaphore(0)
+        join = permission_cache._join
+
+        def counting_join(*args, **kwargs):
+            flight = join(*args, **kwargs)
+            joined.release()
+            return flight
+
+        def slow_load(role_id):
+            self.loads.append(role_id)
+            for _ in range(self.THREADS):
+                joined.acquire(timeout=5)
+            return load(role_id)
+
+        results = [None] * self.THREADS
+
+        def worker(i):
+            try:
+                results[i] = permission_cache.get(self.ROLE_ID)
+            except Exception as exc:
+                results[i] = exc
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        with mock.patch.object(permission_cache, '_join', counting_join), \
+                mock.patch.object(permission_cache, '_load', slow_load):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=10)
+        return results
+
+    def test_one_load_for_all_waiters(self):
+        permissions = RolePermissions(0b101, 7)
+        results = self.get_concurrently(lambda role_id: permissions)
+
+        self.assertEqual(self.loads, [self.ROLE_ID])
+        self.assertEqual(results, [permissions] * self.THREADS)
+        with self.assertNumQueries(0):
+            self.assertEqual(permission_cache.get(self.ROLE_ID), permissions)
+
+    def test_waiters_get_leader_exception(self):
+        error = RuntimeError('БД недоступна')
+
+        def failing_load(role_id):
+            raise error
+
+        results = self.get_concurrently(failing_load)
+
+        self.assertEqual(self.loads, [self.ROLE_ID])
+        self.assertEqual(results, [error] * self.THREADS)
+        # Неудачная загрузка не остаётся в кэше - следующий промах пробует снова
+        self.assertNotIn(self.ROLE_ID, permission_cache._loading)
+
+
+class PermissionCacheDegradedModeTests(TestCase):
+    """Последние известные разрешения роли при сбое БД (RBAC_CACHE_MAX_STALENESS)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(name='Редактор')
+        cls.read = Permission.objects.create(resource='article', action='read')
+        RolePermission.objects.create(role=cls.role, permission=cls.read)
+
+    def setUp(self):
+        permission_cache.invalidate()
+        self.addCleanup(permission_cache.invalidate)
+        self.addCleanup(permission_cache._known_good.pop, self.role.pk, None)
+        # Разрешения роли прочитаны успешно, потом запись сброшена
+        self.known = permission_cache.get(self.role.pk)
+        permission_cache.invalidate(self.role.pk)
+
+    def database_down(self):
+        return mock.patch.object(
+            permission_cache, '_load', side_effect=OperationalError('database is locked')
+        )
+
+    def test_recent_copy_is_served(self):
+        with self.settings(RBAC_CACHE_MAX_STALENESS=300), self.database_down():
+            permissions = permission_cache.get(self.role.pk)
+
+        self.assertIsInstance(permissions, StalePermissions)
+        self.assertEqual(permissions, self.known)
+        self.assertTrue(permissions.mask & (1 << self.read.bit))
+
+    def test_copy_older_than_limit_is_not_served(self):
+        loaded_at, permissions = permission_cache._known_good[self.role.pk]
+        permission_cache._known_good[self.role.pk] = (loaded_at - 301, permissions)
+
+        with self.settings(RBAC_CACHE_MAX_STALENESS=300), self.database_down():
+            with self.assertRaises(OperationalError):
+                permission_cache.get(self.role.pk)
+
+    def test_error_raised_without_copy(self):
+        permission_cache._known_good.pop(self.role.pk)
+
+        with self.settings(RBAC_CACHE_MAX_STALENESS=300), self.database_down():
+            with self.assertRaises(OperationalError):
+                permission_cache.get(self.role.pk)
+
+    def test_disabled(self):
+        with self.settings(RBAC_CACHE_MAX_STALENESS=0), self.database_down():
+            with self.assertRaises(OperationalError):
+                permission_cache.get(self.role.pk)
+
+
+class RBACCounterTests(TestCase):
+    """Счётчики Role.user_count и Permission.role_count"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = Role.objects.create(name='Читатель')
+        cls.editor = Role.objects.create(name='Редактор')
+        cls.read = Permission.objects.create(resource='article', action='read')
+
+    def user_count(self, role):
+        role.refresh_from_db()
+        return role.user_count
+
+    def test_user_create_delete_and_role_change(self):
+        user = User.objects.create_user('user@example.com', 'password123', role=self.reader)
+        self.assertEqual(self.user_count(self.reader), 1)
+
+        user.role = self.editor
+        user.save()
+        self.assertEqual(self.user_count(self.reader), 0)
+        self.assertEqual(self.user_count(self.editor), 1)
+
+        user.delete()
+        self.assertEqual(self.user_count(self.editor), 0)
+
+    def test_role_permission_create_and_delete(self):
+        link = RolePermission.objects.create(role=self.reader, permission=self.read)
+        self.read.refresh_from_db()
+        self.assertEqual(self.read.role_count, 1)
+
+        link.delete()
+        self.read.refresh_from_db()
+        self.assertEqual(self.read.role_count, 0)
+
+    def test_counter_not_below_zero(self):
+        # bulk_create обходит сигналы - счётчик роли остаётся 0
+        user, = User.objects.bulk_create([User(email='bulk@example.com', role=self.reader)])
+        user = User.objects.get(pk=user.pk)
+
+        user.role = self.editor
+        user.save()
+
+        self.assertEqual(self.user_count(self.reader), 0)
+        self.assertEqual(self.user_count(self.editor), 1)
+
+    def test_recount_check(self):
+        User.objects.bulk_create([User(email='bulk@example.com', role=self.reader)])
+
+        with self.assertRaises(CommandError):
+            call_command('recount_rbac_counters', '--check', stdout=StringIO())
+
+        call_command('recount_rbac_counters', stdout=StringIO())
+        call_command('recount_rbac_counters', '--check', stdout=StringIO())
+        self.assertEqual(self.user_count(self.reader), 1)
+
+
+class RBACCounterTransactionTests(TransactionTestCase):
+    """Запись и поправка счётчика - в одной транзакции (без обёртки TestCase)"""
+
+    def test_failed_counter_update_rolls_back_save(self):
+        reader = Role.objects.create(name='Читатель')
+        editor = Role.objects.create(name='Редактор')
+        user = User.objects.create_user('user@example.com', 'password123', role=reader)
+        user.role = editor
+
+        with mock.patch.object(Role.objects, 'adjust_user_count', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                user.save()
+
+        self.assertEqual(User.objects.get(pk=user.pk).role_id, reader.pk)
+
+
+class BulkRolePermissionsTests(TestCase):
+    """Массовое назначение и снятие разрешений роли"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user_with_permissions(
+            'admin@example.com', 'password123', ['permission.manage'], is_staff=True
+        )
+        cls.role = Role.objects.create(name='Редактор')
+        cls.read, cls.create, cls.delete = [
+            Permission.objects.create(resource='article', action=action)
+            for action in ('read', 'create', 'delete')
+        ]
+        RolePermission.objects.create(role=cls.role, permission=cls.read)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def post(self, data):
+        return self.client.post(
+            reverse('bulk-update-role-permissions', args=[self.role.pk]),
+            data=data, content_type='application/json'
+        )
+
+    def test_returns_diff(self):
+        response = self.post({'add': [self.read.pk, self.create.pk], 'remove': []})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['added'], [self.create.pk])
+        self.assertEqual(response.json()['already_assigned'], [self.read.pk])
+
+        response = self.post({'remove': [self.read.pk, self.delete.pk]})
+        self.assertEqual(response.json()['removed'], [self.read.pk])
+        self.assertEqual(response.json()['not_assigned'], [self.delete.pk])
+
+    def test_updates_links_mask_and_counters(self):
+        self.post({'add': [self.create.pk, self.delete.pk], 'remove': [self.read.pk]})
+
+        self.assertEqual(
+            set(self.role.role_permissions.values_list('permission_id', flat=True)),
+            {self.create.pk, self.delete.pk}
+        )
+        role = Role.objects.get(pk=self.role.pk)
+        self.assertEqual(
+            decode_mask(role.permission_mask),
+            (1 << self.create.bit) | (1 << self.delete.bit)
+        )
+        # Кэш сброшен - отдаёт новую маску
+        self.assertEqual(permission_cache.get(role.pk).mask, decode_mask(role.permission_mask))
+        self.assertFalse(Permission.objects.role_count_mismatches().exists())
+
+    def test_removal_sends_delete_signals_and_rebuilds_mask_once(self):
+        RolePermission.objects.create(role=self.role, permission=self.create)
+        deleted = []
+
+        def on_delete(sender, instance, **kwargs):
+            deleted.append(instance.permission_id)
+
+        post_delete.connect(on_delete, sender=RolePermission)
+        self.addCleanup(post_delete.disconnect, on_delete, sender=RolePermission)
+        rebuild = mock.patch.object(
+            Role.objects, 'rebuild_permission_mask', wraps=Role.objects.rebuild_permission_mask
+        )
+        with rebuild as rebuild_mask:
+            self.post({'add': [self.delete.pk], 'remove': [self.read.pk, self.create.pk]})
+
+        self.assertCountEqual(deleted, [self.read.pk, self.create.pk])
+        rebuild_mask.assert_called_once_with(self.role.pk)
+        self.assertFalse(Permission.objects.role_count_mismatches().exists())
+
+    def test_unknown_permission_changes_nothing(self):
+        response = self.post({'add': [self.create.pk, 999999]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.role.role_permissions.filter(permission=self.create).exists())
+
+    def test_same_permission_in_add_and_remove(self):
+        response = self.post({'add': [self.create.pk], 'remove': [self.create.pk]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_empty_request(self):
+        self.assertEqual(self.post({}).status_code, 400)
+
+
+class BulkUserRoleTests(TestCase):
+    """Массовое назначение роли пользователям"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user_with_permissions(
+            'admin@example.com', 'password123', ['permission.manage'], is_staff=True
+        )
+        cls.old_role = Role.objects.create(name='Стажёр')
+        cls.new_role = Role.objects.create(name='Сотрудник')
+        cls.users = [
+            User.objects.create_user(f'user{i}@corp.example', 'password123', role=cls.old_role)
+            for i in range(5)
+        ]
+        cls.outsider = User.objects.create_user('outsider@other.example', 'password123')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.changes = []
+        user_role_changed.connect(self.on_role_changed)
+        self.addCleanup(user_role_changed.disconnect, self.on_role_changed)
+
+    def on_role_changed(self, sender, user_ids, role_id, **kwargs):
+        self.changes.append((user_ids, role_id))
+
+    def post(self, data):
+        return self.client.post(reverse('bulk-update-user-role'), data=data, content_type='application/json')
+
+    def assertCountersCorrect(self):
+        self.assertFalse(Role.objects.user_count_mismatches().exists())
+
+    def test_by_ids(self):
+        ids = [user.pk for user in self.users[:2]]
+        response = self.post({'role_id': self.new_role.pk, 'user_ids': ids})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(set(self.new_role.users.values_list('pk', flat=True)), set(ids))
+        self.assertEqual(self.changes, [(ids, self.new_role.pk)])
+        self.assertCountersCorrect()
+
+    def test_by_filter_in_chunks(self):
+        with self.settings(RBAC_BULK_ASSIGN_CHUNK_SIZE=2):
+            response = self.post({
+                'role_id': self.new_role.pk,
+                'filter': {'role_id': self.old_role.pk, 'email_domain': 'corp.example'}
+            })
+
+        self.assertEqual(response.json()['updated'], 5)
+        self.assertEqual([len(ids) for ids, _ in self.changes], [2, 2, 1])
+        self.assertEqual(self.new_role.users.count(), 5)
+        self.assertIsNone(User.objects.get(pk=self.outsider.pk).role_id)
+        self.assertCountersCorrect()
+
+    def test_users_without_role(self):
+        response = self.post({'role_id': self.new_role.pk, 'filter': {'role_id': None}})
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(User.objects.get(pk=self.outsider.pk).role_id, self.new_role.pk)
+        self.assertCountersCorrect()
+
+    def test_users_already_in_role_are_skipped(self):
+        response = self.post({'role_id': self.old_role.pk, 'user_ids': [self.users[0].pk]})
+        self.assertEqual(response.json()['updated'], 0)
+        self.assertEqual(self.changes, [])
+
+    def test_keeps_permission_caches(self):
+        # Кэш разрешений хранится по ролям: смена роли пользователей
+        # не сбрасывает его ни здесь, ни в других процессах
+        generation = rbac_generation.value
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post({'role_id': self.new_role.pk, 'user_ids': [self.users[0].pk]})
+        self.assertEqual(rbac_generation.value, generation)
+
+    def test_validation(self):
+        self.assertEqual(self.post({'role_id': self.new_role.pk}).status_code, 400)
+        self.assertEqual(self.post({'role_id': self.new_role.pk, 'filter': {}}).status_code, 400)
+        self.assertEqual(self.post({'role_id': 999999, 'user_ids': [1]}).status_code, 400)
+        self.assertEqual(self.post({
+            'role_id': self.new_role.pk, 'user_ids': [1], 'filter': {'is_active': True}
+        }).status_code, 400)
+
+    def test_management_command(self):
+        call_command(
+            'assign_role', self.new_role.name, '--from-role', str(self.old_role.pk),
+            '--chunk-size', '2', stdout=StringIO()
+        )
+        self.assertEqual(self.new_role.users.count(), 5)
+        self.assertCountersCorrect()
+
+    def test_management_command_dry_run(self):
+        out = StringIO()
+        call_command(
+            'assign_role', str(self.new_role.pk),
+            '--user-ids', ','.join(str(user.pk) for user in self.users), '--dry-run',
+            stdout=out
+        )
+        self.assertIn('5', out.getvalue())
+        self.assertEqual(self.new_role.users.count(), 0)
+
+
+class AuthzCheckTests(QueryBudgetTestMixin, TestCase):
+    """Пакетная проверка доступа POST /api/authz/check"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gateway = create_user_with_permissions(
+            'gateway@example.com', 'password123', ['permission.manage']
+        )
+        cls.editor = create_user_with_permissions(
+            'editor@example.com', 'password123', ['article.read', 'article.update']
+        )
+        cls.blocked = create_user_with_permissions(
+            'blocked@example.com', 'password123', ['article.read'], is_active=False
+        )
+        cls.guest = User.objects.create_user('guest@example.com', 'password123')
+
+    def setUp(self):
+        warm_permission_cache()
+        self.client.force_login(self.gateway)
+
+    def check(self, *checks, url=None):
+        response = self.client.post(
+            url or reverse('authz-check'), data={'checks': list(checks)}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(result['allowed'], result['reason']) for result in response.json()['results']]
+
+    def test_decisions_by_user_id(self):
+        self.assertEqual(self.check(
+            {'user_id': self.editor.pk, 'permission': 'article.update'},
+            {'user_id': self.editor.pk, 'permission': 'permission.manage'},
+            {'user_id': self.editor.pk, 'permission': 'article.nonexistent'},
+            {'user_id': self.blocked.pk, 'permission': 'article.read'},
+            {'user_id': self.guest.pk, 'permission': 'article.read'},
+            {'user_id': 999999, 'permission': 'article.read'},
+        ), [
+            (True, 'granted'),
+            (False, 'missing_permission'),
+            (False, 'unknown_permission'),
+            (False, 'inactive'),
+            (False, 'no_role'),
+            (False, 'unknown_user'),
+        ])
+
+    def test_decisions_by_token(self):
+        access = issue_tokens(self.editor)['access']
+        self.assertEqual(self.check(
+            {'token': access, 'permission': 'article.update'},
+            {'token': access, 'permission': 'permission.manage'},
+            {'token': 'not-a-token', 'permission': 'article.read'},
+        ), [
+            (True, 'granted'),
+            (False, 'missing_permission'),
+            (False, 'invalid_token'),
+        ])
+
+    def test_current_token_claims_need_no_role_lookup(self):
+        with self.settings(RBAC_PERMISSION_CACHE_TTL=0):
+            warm_permission_cache()
+            access = issue_tokens(self.editor)['access']
+            checks = parse_checks({'checks': [
+                {'token': access, 'permission': 'article.update'},
+                {'token': access, 'permission': 'permission.manage'},
+            ]}, 10)
+            with self.assertNumQueries(0):
+                result = decide(checks)
+
+        self.assertEqual(
+            [(r['allowed'], r['reason']) for r in result['results']],
+            [(True, 'granted'), (False, 'missing_permission')]
+        )
+
+    def test_revoked_token(self):
+        access = issue_tokens(self.editor)['access']
+        revoked_tokens.revoke_user_tokens([self.editor.pk])
+
+        self.assertEqual(
+            self.check({'token': access, 'permission': 'article.read'}),
+            [(False, 'revoked_token')]
+        )
+
+    def test_token_with_outdated_permissions_uses_current_role(self):
+        access = issue_tokens(self.editor)['access']
+        RolePermission.objects.filter(role=self.editor.role, permission__codename='article.update').delete()
+
+        self.assertEqual(
+            self.check({'token': access, 'permission': 'article.update'}),
+            [(False, 'missing_permission')]
+        )
+
+    def test_async(self):
+        self.assertEqual(self.check(
+            {'user_id': self.editor.pk, 'permission': 'article.read'},
+            {'token': issue_tokens(self.editor)['access'], 'permission': 'permission.manage'},
+            url=reverse('async-authz-check')
+        ), [(True, 'granted'), (False, 'missing_permission')])
+
+    def test_queries_do_not_grow_with_batch(self):
+        users = [self.editor, self.blocked, self.guest] * 100
+        response = self.assertWithinQueryBudget(
+            'post', reverse('authz-check'),
+            data={'checks': [{'user_id': u.pk, 'permission': 'article.read'} for u in users]},
+            content_type='application/json'
+        )
+        self.assertEqual(len(response.json()['results']), len(users))
+
+    def test_invalid_request(self):
+        url = reverse('authz-check')
+        for body in (
+            {},
+            {'checks': []},
+            {'checks': [{'permission': 'article.read'}]},
+            {'checks': [{'user_id': 1, 'token': 'x', 'permission': 'article.read'}]},
+            {'checks': [{'user_id': '1', 'permission': 'article.read'}]},
+        ):
+            response = self.client.post(url, data=body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+        with self.settings(AUTHZ_CHECK_MAX_BATCH=1):
+            response = self.client.post(url, data={'checks': [
+                {'user_id': 1, 'permission': 'article.read'}
+            ] * 2}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_permission(self):
+        self.client.force_login(self.editor)
+        response = self.client.post(
+            reverse('authz-check'),
+            data={'checks': [{'user_id': self.editor.pk, 'permission': 'article.read'}]},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class AdminChangelistTests(TestCase):
+    """Число SQL-запросов списков в админке не зависит от числа строк на странице"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('root@example.com', 'password123')
+        # Хеш считается один раз - пользователей в тестах создаётся много
+        cls.password = make_password('password123')
+        cls.permissions = [
+            Permission.objects.create(resource='article', action=action)
+            for action in ('read', 'create', 'update', 'delete')
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def add_roles(self, count):
+        for i in range(count):
+            role = Role.objects.create(name=f'Роль {Role.objects.count()}')
+            for permission in self.permissions:
+                RolePermission.objects.create(role=role, permission=permission)
+            User.objects.create(
+                email=f'user{User.objects.count()}@example.com', password=self.password, role=role
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertQueriesDoNotGrow(self, url):
+        self.add_roles(2)
+        few = self.count_queries(url)
+        self.add_roles(10)
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_role_changelist(self):
+        self.assertQueriesDoNotGrow(reverse('admin:auth_system_role_changelist'))
+
+    def test_role_changelist_permission_count(self):
+        self.add_roles(1)
+        response = self.client.get(reverse('admin:auth_system_role_changelist'))
+        self.assertEqual(response.context['cl'].result_list[0].permission_count, len(self.permissions))
+
+    def test_role_permission_changelist(self):
+        self.assertQueriesDoNotGrow(reverse('admin:auth_system_rolepermission_changelist'))
+
+    def test_user_changelist(self):
+        self.assertQueriesDoNotGrow(reverse('admin:users_user_changelist'))
+
+    def test_role_change_form_uses_autocomplete(self):
+        self.add_roles(1)
+        role = Role.objects.first()
+        response = self.client.get(reverse('admin:auth_system_role_change', args=[role.pk]))
+        self.assertContains(response, 'admin-autocomplete')
+
+    def test_paginator_counts_exactly_without_estimate(self):
+        # SQLite оценки не даёт - число строк считается как обычно
+        self.add_roles(3)
+        paginator = EstimatedCountPaginator(RolePermission.objects.order_by('pk'), 5)
+        self.assertEqual(paginator.count, RolePermission.objects.count())
+
+
+class GenerateRBACDataTests(TestCase):
+    """Генератор данных generate_rbac_data: объём, возобновление, счётчики"""
+
+    def generate(self, users, prefix='user'):
+        call_command(
+            'generate_rbac_data', '--users', str(users), '--roles', '4', '--batch-size', '10',
+            '--min-permissions', '2', '--max-permissions', '5', '--email-prefix', prefix,
+            stdout=StringIO()
+        )
+
+    def user_roles(self, prefix):
+        users = User.objects.filter(email__startswith=f'{prefix}-').values_list('email', 'role__name')
+        return {email.split('@')[0].split('-')[1]: role for email, role in users}
+
+    def assertCountersCorrect(self):
+        call_command('recount_rbac_counters', '--check', stdout=StringIO())
+
+    def test_generates_dataset(self):
+        self.generate(25)
+
+        self.assertEqual(User.objects.filter(email__startswith='user-').count(), 25)
+        roles = Role.objects.filter(name__startswith='Роль ')
+        self.assertEqual(roles.count(), 4)
+        self.assertTrue(Permission.objects.filter(codename='permission.manage').exists())
+        for role in roles:
+            self.assertIn(role.role_permissions.count(), range(2, 6))
+            bits = role.role_permissions.values_list('permission__bit', flat=True)
+            self.assertEqual(decode_mask(role.permission_mask), sum(1 << bit for bit in bits))
+        self.assertCountersCorrect()
+
+    def test_rerun_changes_nothing(self):
+        self.generate(25)
+        links = set(RolePermission.objects.values_list('role_id', 'permission_id'))
+
+        self.generate(25)
+
+        self.assertEqual(User.objects.count(), 25)
+        self.assertEqual(Role.objects.count(), 4)
+        self.assertEqual(set(RolePermission.objects.values_list('role_id', 'permission_id')), links)
+        self.assertCountersCorrect()
+
+    def test_resumed_run_matches_uninterrupted(self):
+        self.generate(25, prefix='full')
+        # Прерванный запуск: сначала часть пользователей, потом остальные
+        self.generate(15, prefix='part')
+        self.generate(25, prefix='part')
+
+        self.assertEqual(self.user_roles('part'), self.user_roles('full'))
+        self.assertEqual(len(self.user_roles('part')), 25)
+        self.assertCountersCorrect()
+
+
+class BenchmarkAuthCommandTests(TestCase):
+    """Команда benchmark_auth на маленьком наборе данных в БД тестов"""
+
+    def setUp(self):
+        # Команда сама создаёт тестовую БД - здесь она уже создана
+        for name in ('setup_test_environment', 'teardown_test_environment'):
+            patcher = mock.patch.object(benchmark_auth, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        creation = connection.creation
+        for name in ('create_test_db', 'destroy_test_db'):
+            patcher = mock.patch.object(creation, name, return_value=settings.DATABASES['default']['NAME'])
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(permission_cache.invalidate)
+
+    def run_command(self, *args):
+        stdout = StringIO()
+        call_command(
+            'benchmark_auth', '--users', '4', '--roles', '2', '--permissions-per-role', '2',
+            '--requests', '3', '--warmup', '1', *args, stdout=stdout, stderr=StringIO()
+        )
+        return stdout.getvalue()
+
+    def assertScenarioReport(self, report):
+        self.assertEqual(report['requests'], 3)
+        self.assertEqual(sum(report['statuses'].values()), 3)
+        latency = report['latency_ms']
+        self.assertLessEqual(latency['p50'], latency['p95'])
+        self.assertLessEqual(latency['p95'], latency['p99'])
+        self.assertLessEqual(latency['p99'], latency['max'])
+        self.assertGreater(report['throughput_rps'], 0)
+        self.assertGreaterEqual(report['queries_per_request']['max'], report['queries_per_request']['mean'])
+
+    def test_sync_table(self):
+        output = self.run_command()
+
+        self.assertIn('scenario', output.splitlines()[0])
+        for name in ('login', 'profile', 'articles', 'admin_roles', 'admin_update_user_role'):
+            self.assertIn(name, output)
+
+    def test_async_json(self):
+        report = json.loads(self.run_command('--async', '--json', '--scenario', 'profile', '--scenario', 'articles'))
+
+        self.assertTrue(report['meta']['async'])
+        self.assertEqual(report['meta']['users'], 4)
+        self.assertEqual(set(report['scenarios']), {'profile', 'articles'})
+        for scenario in report['scenarios'].values():
+            self.assertScenarioReport(scenario)
+            self.assertEqual(scenario['statuses'], {'200': 3})
+
+    def test_session_engines_json(self):
+        report = json.loads(self.run_command(
+            '--json', '--scenario', 'profile', '--session-engine', 'db', '--session-engine', 'lru'
+        ))
+
+        self.assertEqual(set(report['session_engines']), {'db', 'lru'})
+        for results in report['session_engines'].values():
+            self.assertScenarioReport(results['profile'])
+
+    def test_percentile(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(benchmark_auth.percentile(values, 50), 50)
+        self.assertEqual(benchmark_auth.percentile(values, 95), 95)
+        self.assertEqual(benchmark_auth.percentile(values, 99), 99)
+        self.assertEqual(benchmark_auth.percentile(values, 100), 100)
+        self.assertEqual(benchmark_auth.percentile([7], 99), 7)
+        self.assertEqual(benchmark_auth.percentile([3, 1, 2], 50), 2)
+
+
+class PerformanceInstrumentationTests(TestCase):
+    """Замеры запросов PerformanceMiddleware и GET /api/admin/perf/requests/"""
+
+    SERVER_TIMING = re.compile(
+        r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="(\d+) queries", perm;dur=[\d.]+, hash;dur=[\d.]+$'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user_with_permissions(
+            'staff@example.com', 'password123', ['article.read'], is_staff=True
+        )
+        cls.user = create_user_with_permissions('user@example.com', 'password123', ['article.read'])
+
+    def setUp(self):
+        warm_permission_cache()
+        recent_requests.clear()
+
+    def test_server_timing_header(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('article-list'))
+
+        match = self.SERVER_TIMING.match(response.headers['Server-Timing'])
+        self.assertIsNotNone(match, response.headers['Server-Timing'])
+        self.assertEqual(int(match.group(1)), len(queries))
+
+        with self.settings(PERF_SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('article-list')).headers)
+
+    def test_cold_cache_not_checked_against_budget(self):
+        self.client.force_login(self.user)
+        permission_cache.invalidate()
+        permission_bits.invalidate()
+        with self.assertNoLogs('utils.instrumentation', 'WARNING'):
+            self.client.get(reverse('article-list'))
+        [cold] = recent_requests.snapshot(1)
+        self.assertGreater(cold['cache_loads'], 0)
+        self.assertGreater(cold['sql_count'], cold['query_budget'])
+
+        self.client.get(reverse('article-list'))
+        [warm] = recent_requests.snapshot(1)
+        self.assertEqual(warm['cache_loads'], 0)
+        self.assertLessEqual(warm['sql_count'], warm['query_budget'])
+
+    def test_recent_requests_limit(self):
+        with self.settings(PERF_RECENT_REQUESTS=3):
+            buffer = RecentRequests()
+            for i in range(5):
+                buffer.append(RequestMetrics('GET', f'/{i}/'))
+        self.assertEqual([item['path'] for item in buffer.snapshot()], ['/4/', '/3/', '/2/'])
+        self.assertEqual(len(buffer.snapshot(1)), 1)
+
+    def test_perf_requests(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse('article-list'))
+
+        response = self.client.get(reverse('perf-requests') + '?limit=1')
+        self.assertEqual(response.status_code, 200)
+        [item] = response.json()
+        self.assertEqual(item['view'], 'article-list')
+        self.assertEqual(item['status'], 200)
+        self.assertEqual(self.client.get(reverse('perf-requests') + '?limit=x').status_code, 400)
+
+    def test_perf_requests_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('perf-requests')).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('perf-requests')).status_code, 401)
+
+
+class MetricsTests(TestCase):
+    """Метрики процессов в METRICS_DIR и GET /metrics"""
+
+    KEY = ('auth_login_attempts_total', ('success',))
+
+    def setUp(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        self.metrics_dir = Path(metrics_dir.name)
+        override = self.settings(METRICS_DIR=self.metrics_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def get(self, **extra):
+        return self.client.get(reverse('metrics'), **extra)
+
+    def test_process_writes_own_file(self):
+        login_attempts.inc(result='success')
+        metrics_store.flush()
+
+        data = json.loads((self.metrics_dir / f'{os.getpid()}.json').read_text(encoding='utf-8'))
+        self.assertIn(list(self.KEY[1]), [labels for name, labels, _ in data if name == self.KEY[0]])
+
+    def test_sums_files_of_all_processes(self):
+        login_attempts.inc(result='success')
+        own = metrics_store.collect()[self.KEY]
+        (self.metrics_dir / '999999.json').write_text(
+            json.dumps([[self.KEY[0], list(self.KEY[1]), 5]]), encoding='utf-8'
+        )
+
+        self.assertEqual(metrics_store.collect()[self.KEY], own + 5)
+        self.assertIn(f'auth_login_attempts_total{{result="success"}} {own + 5}\n', render())
+
+    def test_allowed_addresses(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.get(REMOTE_ADDR='10.0.0.1').status_code, 403)
+        # Без доверенных прокси X-Forwarded-For не учитывается
+        self.assertEqual(self.get(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='127.0.0.1').status_code, 403)
+
+    def test_client_address_behind_proxy(self):
+        with self.settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            # Прокси на том же хосте: REMOTE_ADDR всегда 127.0.0.1
+            self.assertEqual(self.get(HTTP_X_FORWARDED_FOR='203.0.113.5').status_code, 403)
+            self.assertEqual(self.get(HTTP_X_FORWARDED_FOR='127.0.0.1').status_code, 200)
+
+    def test_token(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.get().status_code, 403)
+            self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class SharedGenerationTests(TestCase):
+    """Общее для процессов поколение (utils.shared_generation)"""
+
+    def setUp(self):
+        runtime_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(runtime_dir.cleanup)
+        self.runtime_dir = Path(runtime_dir.name) / 'run'
+        override = self.settings(RUNTIME_DIR=self.runtime_dir, TEST_GENERATION_CHECK_INTERVAL=0)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def generation(self):
+        # Каждый экземпляр - как отдельный процесс: своё отображение файла
+        return SharedGeneration('test', 'TEST_GENERATION_CHECK_INTERVAL')
+
+    def test_creates_file(self):
+        self.assertEqual(self.generation().value, 0)
+        self.assertEqual((self.runtime_dir / 'test.generation').stat().st_size, 8)
+
+    def test_bump_seen_by_other_instance(self):
+        first, second = self.generation(), self.generation()
+        self.assertFalse(second.changed())  # первая проверка только запоминает поколение
+
+        self.assertEqual(first.bump(), 1)
+        self.assertEqual(second.value, 1)
+        self.assertTrue(second.changed())
+        self.assertFalse(second.changed())
+
+    def test_own_bump_is_not_a_change(self):
+        generation = self.generation()
+        generation.changed()
+        generation.bump()
+        self.assertFalse(generation.changed())
+
+    def test_checked_once_per_interval(self):
+        first, second = self.generation(), self.generation()
+        with self.settings(TEST_GENERATION_CHECK_INTERVAL=60):
+            second.changed()
+            first.bump()
+            self.assertFalse(second.changed())
+
+
+class SharedTombstonesTests(TestCase):
+    """Общий для процессов журнал удалённых ключей (utils.shared_generation)"""
+
+    def setUp(self):
+        runtime_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(runtime_dir.cleanup)
+        self.runtime_dir = Path(runtime_dir.name) / 'run'
+        override = self.settings(
+            RUNTIME_DIR=self.runtime_dir, TEST_TOMBSTONE_CHECK_INTERVAL=0, TEST_TOMBSTONE_SLOTS=4
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def tombstones(self):
+        # Каждый экземпляр - как отдельный процесс: своё отображение файла
+        return SharedTombstones('test', 'TEST_TOMBSTONE_CHECK_INTERVAL', 'TEST_TOMBSTONE_SLOTS')
+
+    def test_creates_file(self):
+        self.assertEqual(self.tombstones().count, 0)
+        self.assertEqual((self.runtime_dir / 'test.tombstones').stat().st_size, 8 + 4 * 40)
+
+    def test_keys_seen_by_other_instance(self):
+        first, second = self.tombstones(), self.tombstones()
+        self.assertEqual(second.collect(), [])  # первая проверка только запоминает позицию
+
+        first.add(['a' * 40, 'b'])
+        self.assertEqual(second.collect(), ['a' * 40, 'b'])
+        self.assertEqual(second.collect(), [])
+
+    def test_reads_across_buffer_end(self):
+        first, second = self.tombstones(), self.tombstones()
+        first.add(['a', 'b', 'c'])
+        second.collect()
+
+        first.add(['d', 'e', 'f'])
+        self.assertEqual(second.collect(), ['d', 'e', 'f'])
+
+    def test_overflow(self):
+        first, second = self.tombstones(), self.tombstones()
+        second.collect()
+
+        first.add(['a', 'b', 'c', 'd', 'e'])
+        self.assertIsNone(second.collect())
+        self.assertEqual(second.collect(), [])
+
+    def test_own_keys_are_not_collected(self):
+        tombstones = self.tombstones()
+        tombstones.collect()
+        tombstones.add(['a'])
+        self.assertEqual(tombstones.collect(), [])
+
+    def test_slots_taken_from_existing_file(self):
+        self.tombstones().add(['a'])
+        with self.settings(TEST_TOMBSTONE_SLOTS=16):
+            tombstones = self.tombstones()
+            self.assertEqual(tombstones.count, 1)
+            self.assertEqual(tombstones._slots, 4)
@@ -11,8 +11,13 @@ urlpatterns = [
     
     # Управление разрешениями ролей
     path('roles/<int:pk>/permissions/', views.add_permission_to_role, name='add-permission-to-role'),
+    path('roles/<int:pk>/permissions/bulk/', views.bulk_update_role_permissions, name='bulk-update-role-permissions'),
     path('roles/<int:pk>/permissions/<int:permission_pk>/', views.remove_permission_from_role, name='remove-permission-from-role'),
     
     # Управление ролями пользователей
     path('users/<int:pk>/role/', views.update_user_role, name='update-user-role'),
+    path('users/role/', views.bulk_update_user_role, name='bulk-update-user-role'),
+
+    # Замеры производительности
+    path('perf/requests/', views.perf_requests, name='perf-requests'),
 ]
\ No newline at end of file
@@ -1,32 +1,45 @@
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
+from utils.instrumentation import count_chunk, query_budget, recent_requests, timed
 from utils.permissions import HasPermission
+from .authz import CheckRequestError, decide, parse_checks
 from .models import Role, Permission, RolePermission
+from .signals import role_permissions_changed
 from users.models import User
 from .serializers import (
     RoleSerializer,
     RoleDetailSerializer,
     UserRoleSerializer,
     AddPermissionToRoleSerializer,
+    BulkRolePermissionsSerializer,
+    BulkUserRoleSerializer,
     PermissionSerializer
 )
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([HasPermission('permission.manage')])
 def role_list(request):
     """
     Получить список всех ролей
+    ?expand=permissions - с разрешениями и числом пользователей
     Требуется: permission.manage
     """
-    roles = Role.objects.all()
-    serializer = RoleSerializer(roles, many=True)
+    if request.query_params.get('expand') == 'permissions':
+        serializer = RoleDetailSerializer(Role.objects.with_details(), many=True)
+    else:
+        serializer = RoleSerializer(Role.objects.all(), many=True)
     return Response(serializer.data)
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([HasPermission('permission.manage')])
 def role_detail(request, pk):
@@ -34,11 +47,12 @@ def role_detail(request, pk):
     Получить детали роли с разрешениями
     Требуется: permission.manage
     """
-    role = get_object_or_404(Role, pk=pk)
+    role = get_object_or_404(Role.objects.with_details(), pk=pk)
     serializer = RoleDetailSerializer(role)
     return Response(serializer.data)
 
 
+@query_budget(3)
 @api_view(['GET'])
 @permission_classes([HasPermission('permission.manage')])
 def permission_list(request):
@@ -51,6 +65,7 @@ def permission_list(request):
     return Response(serializer.data)
 
 
+@query_budget(10)
 @api_view(['POST'])
 @permission_classes([HasPermission('permission.manage')])
 def add_permission_to_role(request, pk):
@@ -86,6 +101,7 @@ def add_permission_to_role(request, pk):
     }, status=status.HTTP_201_CREATED)
 
 
+@query_budget(9)
 @api_view(['DELETE'])
 @permission_classes([HasPermission('permission.manage')])
 def remove_permission_from_role(request, pk, permission_pk):
@@ -110,6 +126,42 @@ def remove_permission_from_role(request, pk, permission_pk):
     }, status=status.HTTP_200_OK)
 
 
+@query_budget(13)
+@api_view(['POST'])
+@permission_classes([HasPermission('permission.manage')])
+def bulk_update_role_permissions(request, pk):
+    """
+    Назначить и снять несколько разрешений роли за один запрос:
+    {"add": [id, ...], "remove": [id, ...]}
+    Изменения применяются в одной транзакции, в ответе - что изменилось
+    Требуется: permission.manage
+    """
+    role = get_object_or_404(Role, pk=pk)
+    
+    serializer = BulkRolePermissionsSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    add = serializer.validated_data['add']
+    remove = serializer.validated_data['remove']
+    with transaction.atomic():
+        added, removed = Role.objects.change_permissions(role.pk, add, remove)
+        if added or removed:
+            role_permissions_changed(role.pk)
+    
+    return Response({
+        "role_id": role.pk,
+        "added": added,
+        "removed": removed,
+        # Запрошенные, но ничего не изменившие
+        "already_assigned": [pk for pk in add if pk not in added],
+        "not_assigned": [pk for pk in remove if pk not in removed],
+    }, status=status.HTTP_200_OK)
+
+
+# Сохранение со счётчиками ролей, отзыв токенов и завершение сессий
+# идут в одной транзакции: BEGIN и COMMIT тоже в бюджете
+@query_budget(12)
 @api_view(['PATCH'])
 @permission_classes([HasPermission('permission.manage')])
 def update_user_role(request, pk):
@@ -123,9 +175,85 @@ def update_user_role(request, pk):
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    serializer.save()
+    # Роль не меняется - сохранять нечего, сессии и токены остаются.
+    # При смене роли сигнал user_role_changed отправляет post_save пользователя
+    if serializer.validated_data['role_id'] != user.role_id:
+        serializer.save()
     
     return Response({
         "message": f"Роль пользователя {user.email} обновлена",
         "user": serializer.data
-    }, status=status.HTTP_200_OK)
\ No newline at end of file
+    }, status=status.HTTP_200_OK)
+
+
+@query_budget(3)
+@api_view(['POST'])
+@permission_classes([HasPermission('permission.manage')])
+def authz_check(request):
+    """
+    Решения о доступе для других сервисов, пачкой:
+    {"checks": [{"user_id": 5, "permission": "article.update"},
+                {"token": "<access JWT>", "permission": "article.read"}]}
+    Ответ - решения в том же порядке: {"results": [{"allowed": true,
+    "reason": "granted"}, ...], "degraded": false}
+    Пользователи читаются одним запросом, остальное - из кэшей прав
+    Требуется: permission.manage
+    """
+    try:
+        checks = parse_checks(request.data, getattr(settings, 'AUTHZ_CHECK_MAX_BATCH', 1000))
+    except CheckRequestError as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    with timed('permission'):
+        return Response(decide(checks))
+
+
+# Каждая следующая пачка добавляет 10 запросов
+# (из них 4 - завершение сессий и отзыв токенов пользователей пачки)
+@query_budget(12, per_chunk=10)
+@api_view(['POST'])
+@permission_classes([HasPermission('permission.manage')])
+def bulk_update_user_role(request):
+    """
+    Назначить роль многим пользователям:
+    {"role_id": 2, "user_ids": [1, 2, 3]} или
+    {"role_id": 2, "filter": {"role_id": 1, "is_active": true, "email_domain": "example.com"}}
+    Роль меняется UPDATE-ами пачками по RBAC_BULK_ASSIGN_CHUNK_SIZE
+    Требуется: permission.manage
+    """
+    serializer = BulkUserRoleSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    role = serializer.validated_data['role']
+    updated = Role.objects.assign_users(
+        role.pk, serializer.get_users(),
+        chunk_size=getattr(settings, 'RBAC_BULK_ASSIGN_CHUNK_SIZE', 1000),
+        progress=lambda done: count_chunk()
+    )
+    
+    return Response({
+        "message": f"Роль '{role.name}' назначена пользователям: {updated}",
+        "role_id": role.pk,
+        "updated": updated
+    }, status=status.HTTP_200_OK)
+
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def perf_requests(request):
+    """
+    Замеры последних запросов этого процесса (utils.instrumentation),
+    новые первыми. Параметр ?limit= ограничивает число записей.
+    Требуется: is_staff
+    """
+    try:
+        limit = max(int(request.query_params.get('limit', 100)), 0)
+    except ValueError:
+        return Response(
+            {"detail": "limit должен быть целым числом"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response(recent_requests.snapshot(limit))
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "utils.instrumentation.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -88,13 +90,35 @@ DATABASES = {
     }
 }
 
+# Тесты пишут рабочие файлы (RUNTIME_DIR) во временный каталог
+TEST_RUNNER = "utils.testing.TestRunner"
+
 # REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
+        # для JWT: пользователь берётся из токена без запроса к БД
+        "users.authentication.JWTAuthentication",
         "rest_framework.authentication.SessionAuthentication", # для сессий
     ],
     "DEFAULT_PERMISSION_CLASSES": [],
+    # Сколько доверенных прокси перед приложением: адрес клиента берётся из
+    # X-Forwarded-For (троттлинг, доступ к /metrics). 0 - только REMOTE_ADDR
+    "NUM_PROXIES": 0,
+}
+
+# JWT-токены (выдаются в /api/token/)
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_USER_CLASS": "users.authentication.ClaimsUser",
+    # Проверка по списку отозванных токенов (users.revocation)
+    "AUTH_TOKEN_CLASSES": ("users.tokens.RevocableAccessToken",),
 }
+# Отзыв JWT (выход, деактивация, смена роли) хранится в таблице RevokedToken
+# и в памяти каждого процесса; проверка токена к БД не обращается
+TOKEN_REVOCATION_SYNC_INTERVAL = 10       # сек между чтениями новых отзывов из БД
+TOKEN_REVOCATION_CHECK_INTERVAL = 0.1     # сек между проверками отзывов в других процессах хоста
+TOKEN_REVOCATION_PRUNE_INTERVAL = 3600    # сек между удалениями истёкших записей из таблицы
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -134,3 +158,104 @@ STATIC_URL = "static/"
 
 # Указываем Django использовать нашу кастомную модель User
 AUTH_USER_MODEL = 'users.User'
+
+# Пользователь сессии загружается сразу с ролью (users.backends).
+# ModelBackend остаётся в списке, чтобы сессии, созданные до его замены,
+# не сбрасывались: в сессии хранится путь бэкенда, который её создал
+AUTHENTICATION_BACKENDS = [
+    'users.backends.RoleAwareModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Сессии в БД с процессным LRU-кэшем и отложенной записью продлений (users.sessions).
+# Стандартные движки: "django.contrib.sessions.backends.db" / "...cached_db"
+SESSION_ENGINE = "users.sessions"
+SESSION_CACHE_MAX_ENTRIES = 10000   # сессий в кэше процесса
+SESSION_CACHE_TTL = 60              # сек, через сколько сессия перечитывается из БД
+SESSION_TOMBSTONE_CHECK_INTERVAL = 0.1  # сек между проверками выходов в других процессах
+SESSION_TOMBSTONE_SLOTS = 4096     # выходов в общем журнале; кто отстал больше - сбрасывает кэш целиком
+SESSION_WRITE_BEHIND_INTERVAL = 5   # сек между записями продлений; 0 - писать сразу
+SESSION_WRITE_BEHIND_MAX_PENDING = 10000  # продлений в буфере до досрочной записи
+# Смена роли завершает все сессии пользователя (индекс users.UserSession);
+# деактивация и POST /api/logout/all/ завершают их всегда
+END_SESSIONS_ON_ROLE_CHANGE = True
+
+# Время жизни (сек) процессного кэша разрешений ролей (auth_system.cache)
+RBAC_PERMISSION_CACHE_TTL = 60
+# Сколько (сек) версия разрешений роли, прочитанная из БД, подтверждает маску
+# в access-токене без запросов к БД. Изменения в этом процессе и других процессах
+# хоста сбрасывают её сразу; изменения на других хостах видны через этот срок
+RBAC_CLAIMS_VERSION_TTL = 300
+# Как часто (сек) процесс сверяет общее поколение RBAC (RUNTIME_DIR/rbac.generation),
+# чтобы увидеть изменения, сделанные в других процессах
+RBAC_GENERATION_CHECK_INTERVAL = 0.1
+# Промах по роли грузит из БД один запрос, остальные ждут его результат
+RBAC_CACHE_LOAD_WAIT = 5        # сек ожидания, потом запрос читает БД сам
+RBAC_CACHE_SERVE_STALE = True   # пока идёт загрузка, отдавать запись, устаревшую по TTL
+# Деградированный режим: если БД недоступна или медленная, права проверяются
+# по последним известным разрешениям роли не старше RBAC_CACHE_MAX_STALENESS сек
+# (0 - выключено, ошибка БД уходит клиенту)
+RBAC_CACHE_MAX_STALENESS = 300
+RBAC_CACHE_REFRESH_TIMEOUT = None   # сек на чтение разрешений роли; None - без ограничения
+RBAC_CACHE_DEGRADED_RETRY = 5       # сек до повторной попытки прочитать БД
+# Массовая смена роли (POST /api/admin/users/role/, manage.py assign_role):
+# пользователей в одной пачке-транзакции
+RBAC_BULK_ASSIGN_CHUNK_SIZE = 1000
+# Проверок в одном запросе POST /api/authz/check
+AUTHZ_CHECK_MAX_BATCH = 1000
+
+# Пул хеширования паролей для входа и регистрации (users.hashing)
+PASSWORD_HASHING_WORKERS = 4    # одновременных хеширований
+PASSWORD_HASHING_QUEUE = 16     # задач в очереди, сверх - ответ 503
+PASSWORD_HASHING_TIMEOUT = 10   # сек ожидания результата
+
+# Замеры запросов (utils.instrumentation.PerformanceMiddleware)
+PERF_SERVER_TIMING = True       # отдавать заголовок Server-Timing
+PERF_RECENT_REQUESTS = 500      # размер кольцевого буфера последних запросов
+QUERY_BUDGET_WARNINGS = True    # писать в лог превышения @query_budget вьюх
+
+# Рабочие файлы процессов (не коммитятся)
+RUNTIME_DIR = BASE_DIR / "run"
+
+# Метрики в формате Prometheus (utils.metrics), GET /metrics.
+# Каждый воркер пишет свои значения в METRICS_DIR, /metrics их суммирует.
+# Каталог стоит очищать при деплое, если счётчики нужно обнулить
+METRICS_DIR = RUNTIME_DIR / "metrics"
+METRICS_FLUSH_INTERVAL = 5      # сек между записями файла процесса
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]  # адреса или подсети клиента (с учётом NUM_PROXIES)
+METRICS_TOKEN = None    # если задан, нужен заголовок Authorization: Bearer <токен>
+
+# Кэши Django. login-throttle - файловый, общий для всех процессов хоста.
+# Ограничение входов с ним приблизительное: incr не атомарен, а при
+# переполнении MAX_ENTRIES часть счётчиков удаляется. Для точного лимита
+# и при нескольких хостах - Redis/Memcached
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "login-throttle": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": RUNTIME_DIR / "login-throttle",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+# Защита от перебора паролей (users.throttling): неудачные попытки входа
+# (/api/login/, /api/token/) считаются по email и по IP в скользящем окне;
+# сверх лимита - ответ 429 до поиска пользователя и хеширования пароля
+LOGIN_THROTTLE_CACHE = "login-throttle"
+LOGIN_THROTTLE_WINDOW = 60          # сек
+LOGIN_THROTTLE_EMAIL_LIMIT = 5      # неудачных попыток на email за окно; 0 - без лимита
+LOGIN_THROTTLE_IP_LIMIT = 20        # неудачных попыток с одного IP за окно; 0 - без лимита
+
+# last_login при входе: False - UPDATE строки пользователя в каждом входе (как в Django),
+# True - копить в памяти и писать пачками раз в LAST_LOGIN_WRITE_BEHIND_INTERVAL сек
+# (меньше блокировок записи при всплесках входов; при падении процесса
+# последние значения теряются)
+LAST_LOGIN_WRITE_BEHIND = False
+LAST_LOGIN_WRITE_BEHIND_INTERVAL = 5
+LAST_LOGIN_WRITE_BEHIND_MAX_PENDING = 10000     # значений в буфере до досрочной записи
+
+# Списки в админке (utils.pagination.EstimatedCountPaginator): таблицы,
+# в которых по статистике СУБД строк не меньше порога, не считаются COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10000
@@ -1,9 +1,24 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from auth_system import async_views as authz_async_views, views as authz_views
+from utils.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path('api/', include('users.urls')),
     path('api/', include('mock_app.urls')),
     path('api/admin/', include('auth_system.urls')),
+    
+    # Те же API на нативных async-вьюхах (для запуска под ASGI)
+    path('api/async/', include('users.async_urls')),
+    path('api/async/', include('mock_app.async_urls')),
+    path('api/async/admin/', include('auth_system.async_urls')),
+
+    # Решения о доступе для других сервисов
+    path('api/authz/check', authz_views.authz_check, name='authz-check'),
+    path('api/async/authz/check', authz_async_views.authz_check, name='async-authz-check'),
+
+    # Метрики для Prometheus
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,11 @@
+# Маршруты async-вьюх (подключены под /api/async/ в config/urls.py)
+from django.urls import path
+from . import async_views as views
+
+urlpatterns = [
+    path('articles/', views.article_list, name='async-article-list'),
+    path('articles/create/', views.article_create, name='async-article-create'),
+    path('articles/<int:pk>/', views.article_detail, name='async-article-detail'),
+    path('articles/<int:pk>/update/', views.article_update, name='async-article-update'),
+    path('articles/<int:pk>/delete/', views.article_delete, name='async-article-delete'),
+]
\ No newline at end of file
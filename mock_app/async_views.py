@@ -0,0 +1,106 @@
+# Async-варианты вьюх mock_app.views для запуска под ASGI (config.asgi).
+from users.authentication import aget_model_user
+from utils.async_views import async_api_view, json_response
+from utils.permissions import HasPermission
+from .views import MOCK_ARTICLES
+
+
+def _find_article(pk):
+    return next((a for a in MOCK_ARTICLES if a['id'] == int(pk)), None)
+
+
+def _not_found():
+    return json_response({"error": "Статья не найдена"}, status=404)
+
+
+@async_api_view(['GET'], [HasPermission('article.read')])
+async def article_list(request):
+    """
+    Получить список статей
+    Требуется разрешение: article.read
+    """
+    return json_response({
+        "count": len(MOCK_ARTICLES),
+        "articles": MOCK_ARTICLES
+    })
+
+
+@async_api_view(['POST'], [HasPermission('article.create')])
+async def article_create(request):
+    """
+    Создать новую статью
+    Требуется разрешение: article.create
+    """
+    data = request.data
+
+    if not data.get('title') or not data.get('content'):
+        return json_response(
+            {"error": "Заголовок и содержание обязательны"},
+            status=400
+        )
+
+    user = await aget_model_user(request)
+    new_article = {
+        "id": len(MOCK_ARTICLES) + 1,
+        "title": data.get('title'),
+        "content": data.get('content'),
+        "author": user.get_full_name() or "Аноним",
+        "created_at": "2024-01-20",
+        "updated_at": "2024-01-20"
+    }
+
+    return json_response({
+        "message": "Статья создана (в демо-режиме данные не сохраняются)",
+        "article": new_article
+    }, status=201)
+
+
+@async_api_view(['GET'], [HasPermission('article.read')])
+async def article_detail(request, pk):
+    """
+    Получить детали статьи
+    Требуется разрешение: article.read
+    """
+    article = _find_article(pk)
+    if article is None:
+        return _not_found()
+    return json_response(article)
+
+
+@async_api_view(['PUT', 'PATCH'], [HasPermission('article.update')])
+async def article_update(request, pk):
+    """
+    Обновить статью
+    Требуется разрешение: article.update
+    """
+    article = _find_article(pk)
+    if article is None:
+        return _not_found()
+
+    updated_article = article.copy()
+    if 'title' in request.data:
+        updated_article['title'] = request.data['title']
+    if 'content' in request.data:
+        updated_article['content'] = request.data['content']
+    updated_article['updated_at'] = "2024-01-20"
+
+    return json_response({
+        "message": "Статья обновлена (в демо-режиме данные не сохраняются)",
+        "article": updated_article
+    })
+
+
+@async_api_view(['DELETE'], [HasPermission('article.delete')])
+async def article_delete(request, pk):
+    """
+    Удалить статью
+    Требуется разрешение: article.delete
+    """
+    article = _find_article(pk)
+    if article is None:
+        return _not_found()
+
+    return json_response({
+        "message": f"Статья '{article['title']}' удалена (в демо-режиме данные не удаляются)",
+        "article_id": pk
+    })
@@ -1,3 +1,109 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from auth_system.cache import permission_cache
+from auth_system.models import Permission, RolePermission
+from users.tokens import issue_tokens
+from utils.testing import (
+    QueryBudgetTestMixin,
+    create_user_with_permissions,
+    warm_permission_cache,
+)
+from . import urls
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Число SQL-запросов вьюх mock_app.views не превышает объявленных бюджетов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user_with_permissions(
+            'editor@example.com', 'password123',
+            ['article.read', 'article.create', 'article.update', 'article.delete']
+        )
+
+    def setUp(self):
+        warm_permission_cache()
+        self.client.force_login(self.user)
+
+    def test_all_views_have_budget(self):
+        self.assertViewsHaveQueryBudget(urls)
+
+    def test_article_list(self):
+        response = self.assertWithinQueryBudget('get', reverse('article-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_article_create(self):
+        response = self.assertWithinQueryBudget(
+            'post', reverse('article-create'),
+            data={'title': 'Заголовок', 'content': 'Текст'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_article_detail(self):
+        response = self.assertWithinQueryBudget('get', reverse('article-detail', args=[1]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_article_update(self):
+        response = self.assertWithinQueryBudget(
+            'patch', reverse('article-update', args=[1]),
+            data={'title': 'Новый заголовок'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_article_delete(self):
+        response = self.assertWithinQueryBudget('delete', reverse('article-delete', args=[1]))
+        self.assertEqual(response.status_code, 200)
+
+
+class JWTPermissionClaimsTests(TestCase):
+    """Проверка прав по маске разрешений из access-токена"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user_with_permissions('reader@example.com', 'password123', ['article.read'])
+        cls.create = Permission.objects.create(resource='article', action='create')
+
+    def setUp(self):
+        warm_permission_cache()
+
+    def request(self, method, url, access, **kwargs):
+        return getattr(self.client, method)(url, HTTP_AUTHORIZATION=f'Bearer {access}', **kwargs)
+
+    def test_request_without_queries(self):
+        access = issue_tokens(self.user)['access']
+        with self.assertNumQueries(0):
+            response = self.request('get', reverse('article-list'), access)
+        self.assertEqual(response.status_code, 200)
+
+    def test_current_claims_without_cache_entry(self):
+        # Записи кэша разрешений истекли, версия роли процессу известна
+        with self.settings(RBAC_PERMISSION_CACHE_TTL=0):
+            warm_permission_cache()
+            access = issue_tokens(self.user)['access']
+            with self.assertNumQueries(0):
+                response = self.request('get', reverse('article-list'), access)
+                async_response = self.request('get', reverse('async-article-list'), access)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(async_response.status_code, 200)
+
+    def test_unknown_role_version_read_from_database(self):
+        access = issue_tokens(self.user)['access']
+        permission_cache.invalidate()
+        with self.assertNumQueries(1):
+            response = self.request('get', reverse('article-list'), access)
+        self.assertEqual(response.status_code, 200)
+
+    def test_outdated_claims_use_current_role_permissions(self):
+        access = issue_tokens(self.user)['access']
+
+        # Разрешения роли поменялись после выдачи токена
+        RolePermission.objects.create(role=self.user.role, permission=self.create)
+        RolePermission.objects.filter(role=self.user.role, permission__codename='article.read').delete()
+
+        self.assertEqual(self.request('get', reverse('article-list'), access).status_code, 403)
+        response = self.request(
+            'post', reverse('article-create'), access,
+            data={'title': 'Заголовок', 'content': 'Текст'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
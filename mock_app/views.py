@@ -1,7 +1,9 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
+from utils.instrumentation import query_budget
 from utils.permissions import HasPermission
+from users.authentication import get_model_user
 from django.views.decorators.csrf import csrf_exempt
 
 
@@ -34,6 +36,7 @@ MOCK_ARTICLES = [
 ]
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([HasPermission('article.read')])
 def article_list(request):
@@ -47,6 +50,7 @@ def article_list(request):
     })
 
 
+@query_budget(2)
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([HasPermission('article.create')])
@@ -69,7 +73,7 @@ def article_create(request):
         "id": len(MOCK_ARTICLES) + 1,
         "title": data.get('title'),
         "content": data.get('content'),
-        "author": request.user.get_full_name() or "Аноним",
+        "author": get_model_user(request).get_full_name() or "Аноним",
         "created_at": "2024-01-20",
         "updated_at": "2024-01-20"
     }
@@ -80,6 +84,7 @@ def article_create(request):
     }, status=status.HTTP_201_CREATED)
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([HasPermission('article.read')])
 def article_detail(request, pk):
@@ -96,6 +101,7 @@ def article_detail(request, pk):
             status=status.HTTP_404_NOT_FOUND
         )
 
+@query_budget(2)
 @csrf_exempt
 @api_view(['PUT', 'PATCH'])
 @permission_classes([HasPermission('article.update')])
@@ -125,6 +131,7 @@ def article_update(request, pk):
             status=status.HTTP_404_NOT_FOUND
         )
 
+@query_budget(2)
 @csrf_exempt
 @api_view(['DELETE'])
 @permission_classes([HasPermission('article.delete')])
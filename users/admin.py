@@ -1,21 +1,30 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import User
+from utils.pagination import EstimatedCountPaginator
 
 
 # Настройка отображения модели User в админке
 class CustomUserAdmin(UserAdmin):
     # Поля при просмотре списка пользователей
-    list_display = ('email', 'first_name', 'last_name', 'is_staff', 'is_active')
+    list_display = ('email', 'first_name', 'last_name', 'role', 'is_staff', 'is_active')
+    list_select_related = ('role',)  # роль в той же выборке, без запроса на строку
+    
+    # Пользователей миллионы: COUNT(*) по всей таблице заменяется оценкой СУБД
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     # Поля при просмотре конкретного пользователя
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Personal info', {'fields': ('first_name', 'last_name', 'patronymic')}),
-        ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
+        ('Permissions', {'fields': ('role', 'is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
     )
     
+    # Поиск роли вместо выпадающего списка из всех ролей
+    autocomplete_fields = ('role',)
+    
     # Поля при создании пользователя
     add_fieldsets = (
         (None, {
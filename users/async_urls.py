@@ -0,0 +1,15 @@
+# Маршруты async-вьюх (подключены под /api/async/ в config/urls.py)
+from django.urls import path
+from . import async_views as views
+
+urlpatterns = [
+    path('register/', views.register_view, name='async-register'),
+    path('login/', views.login_view, name='async-login'),
+    path('token/', views.token_obtain_view, name='async-token-obtain'),
+    path('token/refresh/', views.token_refresh_view, name='async-token-refresh'),
+    path('logout/', views.logout_view, name='async-logout'),
+    path('logout/all/', views.logout_all_view, name='async-logout-all'),
+    path('profile/', views.profile_view, name='async-profile'),
+    path('profile/update/', views.update_profile_view, name='async-update-profile'),
+    path('profile/delete/', views.delete_account_view, name='async-delete-account'),
+]
\ No newline at end of file
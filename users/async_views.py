@@ -0,0 +1,188 @@
+# Async-варианты вьюх users.views для запуска под ASGI (config.asgi).
+# Доступны по адресам /api/async/... и ведут себя так же, как синхронные.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import alogin, alogout
+from rest_framework.permissions import IsAuthenticated
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .authentication import aget_model_user
+from .backends import SESSION_BACKEND
+from .models import User
+from .sessions import aend_user_sessions
+from .serializers import (
+    RegisterSerializer,
+    LoginSerializer,
+    UserProfileSerializer,
+    UserUpdateSerializer
+)
+from .revocation import arevoke_user_tokens, revoked_tokens
+from .throttling import login_email, login_throttle
+from .tokens import (
+    RevocableRefreshToken,
+    aadd_permission_claims,
+    aissue_tokens,
+    revoke_logout_tokens,
+)
+from .views import LOGIN_DESCRIPTION
+from utils.async_views import async_api_view, json_response
+from utils.permissions import HasPermission
+
+
+@async_api_view(['GET'], [HasPermission('user.read')])
+async def profile_view(request):
+    """Получить профиль текущего пользователя (требуется user.read)"""
+    serializer = UserProfileSerializer(await aget_model_user(request))
+    return json_response(serializer.data)
+
+
+@async_api_view(['POST'])
+async def register_view(request):
+    """Регистрация нового пользователя"""
+    serializer = RegisterSerializer(data=request.data)
+
+    # Проверка уникальности email обращается к БД синхронно
+    if await sync_to_async(serializer.is_valid)():
+        user = await serializer.asave()
+        return json_response(
+            {
+                "message": "Пользователь успешно зарегистрирован",
+                "user": {
+                    "id": user.id,
+                    "email": user.email,
+                    "full_name": user.get_full_name()
+                }
+            },
+            status=201
+        )
+
+    return json_response(serializer.errors, status=400)
+
+
+@async_api_view(['GET', 'POST'])
+async def login_view(request):
+    """Вход в систему"""
+    if request.method == 'GET':
+        return json_response(LOGIN_DESCRIPTION)
+
+    if request.user.is_authenticated:
+        return json_response({"detail": "Вы уже авторизованы"}, status=400)
+
+    email = login_email(request.data)
+    await login_throttle.acheck(request, email)
+
+    serializer = LoginSerializer(data=request.data)
+
+    if await serializer.ais_valid():
+        user = serializer.validated_data['user']
+        await alogin(request, user, backend=SESSION_BACKEND)
+
+        return json_response({
+            "message": "Вход выполнен успешно",
+            "user": {
+                "id": user.id,
+                "email": user.email,
+                "full_name": user.get_full_name(),
+                "is_active": user.is_active
+            }
+        })
+
+    await login_throttle.afailed(request, email)
+    return json_response(serializer.errors, status=400)
+
+
+@async_api_view(['POST'])
+async def token_obtain_view(request):
+    """Выдача JWT-токенов"""
+    email = login_email(request.data)
+    await login_throttle.acheck(request, email)
+
+    serializer = LoginSerializer(data=request.data)
+
+    if await serializer.ais_valid():
+        return json_response(await aissue_tokens(serializer.validated_data['user']))
+
+    await login_throttle.afailed(request, email)
+    return json_response(serializer.errors, status=400)
+
+
+@async_api_view(['POST'])
+async def token_refresh_view(request):
+    """Обновление access-токена по refresh-токену"""
+    await revoked_tokens.arefresh_if_needed()
+    try:
+        refresh = RevocableRefreshToken(request.data.get('refresh', ''))
+    except TokenError as e:
+        return json_response({"detail": str(e)}, status=401)
+
+    user = await User.objects.filter(
+        pk=refresh[jwt_settings.USER_ID_CLAIM],
+        is_active=True
+    ).afirst()
+    if user is None:
+        return json_response(
+            {"detail": "Пользователь не найден или деактивирован"},
+            status=401
+        )
+
+    access = await aadd_permission_claims(refresh.access_token, user)
+    return json_response({"access": str(access)})
+
+
+@async_api_view(['POST'])
+async def logout_view(request):
+    """Выход из системы"""
+    if request.user.is_authenticated:
+        await sync_to_async(revoke_logout_tokens)(
+            request.user, request.auth, request.data.get('refresh')
+        )
+        await alogout(request)
+        return json_response({"message": "Выход выполнен успешно"})
+
+    return json_response({"detail": "Вы не авторизованы"}, status=400)
+
+
+@async_api_view(['POST'], [IsAuthenticated])
+async def logout_all_view(request):
+    """Выход на всех устройствах"""
+    ended = await aend_user_sessions([request.user.pk])
+    await arevoke_user_tokens([request.user.pk])
+    await alogout(request)
+    return json_response({
+        "message": "Выход выполнен на всех устройствах",
+        "sessions_ended": ended
+    })
+
+
+@async_api_view(['PUT', 'PATCH'], [IsAuthenticated])
+async def update_profile_view(request):
+    """Обновить профиль пользователя"""
+    user = await aget_model_user(request)
+    serializer = UserUpdateSerializer(user, data=request.data, partial=True)
+
+    if serializer.is_valid():
+        for field, value in serializer.validated_data.items():
+            setattr(user, field, value)
+        await user.asave()
+        return json_response({
+            "message": "Профиль обновлён",
+            "user": UserProfileSerializer(user).data
+        })
+
+    return json_response(serializer.errors, status=400)
+
+
+@async_api_view(['DELETE'], [IsAuthenticated])
+async def delete_account_view(request):
+    """Мягкое удаление аккаунта"""
+    user = await aget_model_user(request)
+
+    user.is_active = False
+    await user.asave(update_fields=['is_active', 'updated_at'])
+
+    await alogout(request)
+
+    return json_response({
+        "message": "Аккаунт успешно деактивирован. Вы вышли из системы.",
+        "note": "Ваши данные сохранены, но вы не можете войти снова."
+    })
@@ -0,0 +1,79 @@
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .revocation import revoked_tokens
+
+
+class ClaimsUser(TokenUser):
+    """
+    Пользователь из JWT без обращения к БД: id, роль и разрешения
+    берутся из claims access-токена (см. users.tokens)
+    """
+    
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+    
+    @cached_property
+    def role_id(self):
+        return self.token.get('role_id')
+    
+    @cached_property
+    def permission_claims(self):
+        """(маска, версия) из токена или None, если их там нет"""
+        if 'perm_ver' not in self.token:
+            return None
+        return int(self.token['perm_mask'], 16), self.token['perm_ver']
+
+
+class JWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT без запроса пользователя к БД. Отозванные токены отклоняются
+    (SIMPLE_JWT["AUTH_TOKEN_CLASSES"] - users.tokens.RevocableAccessToken);
+    перед проверкой список отозванных при необходимости
+    синхронизируется с БД - не чаще раза в TOKEN_REVOCATION_SYNC_INTERVAL
+    или после отзыва в другом процессе
+    """
+    
+    def authenticate(self, request):
+        if self.get_header(request) is not None:
+            revoked_tokens.refresh_if_needed()
+        return super().authenticate(request)
+    
+    async def aauthenticate(self, request):
+        if self.get_header(request) is not None:
+            await revoked_tokens.arefresh_if_needed()
+        return super().authenticate(request)
+
+
+def get_model_user(request):
+    """
+    Возвращает модель User текущего запроса.
+    Для JWT-запросов пользователь загружается из БД только здесь.
+    """
+    if not isinstance(request.user, ClaimsUser):
+        return request.user
+    
+    user = User.objects.select_related('role').filter(pk=request.user.id, is_active=True).first()
+    return _ensure_user(user)
+
+
+async def aget_model_user(request):
+    if not isinstance(request.user, ClaimsUser):
+        return request.user
+    
+    user = await User.objects.select_related('role').filter(pk=request.user.id, is_active=True).afirst()
+    return _ensure_user(user)
+
+
+def _ensure_user(user):
+    if user is None:
+        raise AuthenticationFailed(
+            detail="Пользователь не найден или деактивирован",
+            code=401
+        )
+    return user
@@ -0,0 +1,28 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .models import User
+
+
+# Бэкенд сессий, создаваемых входом через API: пароль там проверяет
+# LoginSerializer, а не authenticate(), и login() нужно указать бэкенд явно
+SESSION_BACKEND = 'users.backends.RoleAwareModelBackend'
+
+
+class RoleAwareModelBackend(ModelBackend):
+    """
+    ModelBackend, который загружает пользователя сессии сразу с ролью
+    (select_related), чтобы HasPermission и сериализаторы не делали
+    отдельный запрос за request.user.role
+    """
+    
+    def get_user(self, user_id):
+        user = User.objects.select_related('role').filter(pk=user_id).first()
+        if user is None:
+            return None
+        return user if self.user_can_authenticate(user) else None
+    
+    async def aget_user(self, user_id):
+        user = await User.objects.select_related('role').filter(pk=user_id).afirst()
+        if user is None:
+            return None
+        return user if self.user_can_authenticate(user) else None
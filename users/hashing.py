@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from utils.instrumentation import timed
+from utils.metrics import password_hash_duration
+
+
+class HashingUnavailable(APIException):
+    """Пул хеширования переполнен - клиенту стоит повторить запрос позже"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен, повторите попытку позже'
+    default_code = 'hashing_unavailable'
+    wait = 1  # DRF отдаст его в заголовке Retry-After
+
+
+class PasswordHashingPool:
+    """
+    Ограниченный пул потоков для хеширования паролей.
+    PBKDF2 из hashlib отпускает GIL, поэтому хеширование идёт параллельно,
+    но не больше PASSWORD_HASHING_WORKERS задач одновременно.
+    Сверх PASSWORD_HASHING_QUEUE ожидающих задач запросы сразу получают 503.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._executor is None:
+                workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', 4)
+                queue = getattr(settings, 'PASSWORD_HASHING_QUEUE', 16)
+                self._slots = threading.BoundedSemaphore(workers + queue)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix='password-hashing'
+                )
+
+    def submit(self, fn, *args):
+        """Ставит задачу в пул или бросает HashingUnavailable"""
+        if self._executor is None:
+            self._start()
+
+        if not self._slots.acquire(blocking=False):
+            raise HashingUnavailable()
+        try:
+            future = self._executor.submit(_measured, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        """Выполняет задачу в пуле и ждёт результат"""
+        with timed('hashing'):
+            future = self.submit(fn, *args)
+            try:
+                return future.result(
+                    timeout=getattr(settings, 'PASSWORD_HASHING_TIMEOUT', 10)
+                )
+            except FutureTimeoutError:
+                raise HashingUnavailable()
+
+    async def arun(self, fn, *args):
+        """Выполняет задачу в пуле, не блокируя event loop"""
+        with timed('hashing'):
+            future = self.submit(fn, *args)
+            try:
+                return await asyncio.wait_for(
+                    asyncio.wrap_future(future),
+                    timeout=getattr(settings, 'PASSWORD_HASHING_TIMEOUT', 10)
+                )
+            except asyncio.TimeoutError:
+                raise HashingUnavailable()
+
+
+def _measured(fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        password_hash_duration.observe(
+            time.perf_counter() - started, operation=fn.__name__
+        )
+
+
+hashing_pool = PasswordHashingPool()
+
+
+def make_password(raw_password):
+    """Хеширует пароль в пуле"""
+    return hashing_pool.run(hashers.make_password, raw_password)
+
+
+async def amake_password(raw_password):
+    return await hashing_pool.arun(hashers.make_password, raw_password)
+
+
+def check_password(user, raw_password):
+    """
+    Проверяет пароль пользователя в пуле.
+    В пуле выполняется только чистое хеширование; если хеш устарел
+    (сменился алгоритм или число итераций), он пересчитывается
+    и сохраняется уже в потоке запроса.
+    """
+    needs_update = []
+    is_correct = hashing_pool.run(
+        hashers.check_password, raw_password, user.password, needs_update.append
+    )
+    if is_correct and needs_update:
+        user.password = make_password(raw_password)
+        user.save(update_fields=['password'])
+    return is_correct
+
+
+async def acheck_password(user, raw_password):
+    """Асинхронный check_password"""
+    needs_update = []
+    is_correct = await hashing_pool.arun(
+        hashers.check_password, raw_password, user.password, needs_update.append
+    )
+    if is_correct and needs_update:
+        user.password = await amake_password(raw_password)
+        await user.asave(update_fields=['password'])
+    return is_correct
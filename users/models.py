@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 
@@ -71,6 +71,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
     
+    def save(self, *args, **kwargs):
+        # user_count роли меняется в post_save - в одной транзакции с записью
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+    
     def get_full_name(self):
         """
         Возвращает полное имя
@@ -82,4 +87,52 @@ class User(AbstractBaseUser, PermissionsMixin):
         Мягкое удаление пользователя
         """
         self.is_active = False
-        self.save()
\ No newline at end of file
+        self.save(update_fields=['is_active', 'updated_at'])
+
+class UserSession(models.Model):
+    """
+    Индекс сессий пользователя: ключи его сессий в django_session.
+    Ведётся при входе и выходе, чтобы завершать все сессии пользователя
+    без перебора и декодирования всей таблицы сессий
+    """
+    session_key = models.CharField('Ключ сессии', max_length=40, primary_key=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='sessions',
+        verbose_name='Пользователь'
+    )
+    created_at = models.DateTimeField('Дата входа', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Сессия пользователя'
+        verbose_name_plural = 'Сессии пользователей'
+    
+    def __str__(self):
+        return f'{self.user_id}: {self.session_key}'
+
+
+class RevokedToken(models.Model):
+    """
+    Отозванные JWT (см. users.revocation). Запись с jti отзывает один
+    токен, запись без jti - все access-токены пользователя (и refresh,
+    если include_refresh), выпущенные не позже revoked_at. После
+    expires_at запись не нужна: отозванные ею токены истекли сами
+    """
+    jti = models.CharField('ID токена', max_length=64, null=True, blank=True)
+    include_refresh = models.BooleanField('Включая refresh-токены', default=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='revoked_tokens',
+        verbose_name='Пользователь'
+    )
+    revoked_at = models.DateTimeField('Отозван', default=timezone.now, db_index=True)
+    expires_at = models.DateTimeField('Действует до', db_index=True)
+    
+    class Meta:
+        verbose_name = 'Отозванный токен'
+        verbose_name_plural = 'Отозванные токены'
+    
+    def __str__(self):
+        return self.jti or f'все токены {self.user_id} до {self.revoked_at}'
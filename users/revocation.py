@@ -0,0 +1,193 @@
+# Отзыв JWT без запроса к БД на каждый запрос: отозванные токены
+# хранятся в памяти процесса и подтягиваются из таблицы RevokedToken
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from utils.instrumentation import count_cache_load
+from utils.shared_generation import SharedGeneration
+from .models import RevokedToken
+
+
+# Записи, отозванные чуть раньше прошлой синхронизации, читаются повторно:
+# транзакция могла закоммитить их уже после неё
+SYNC_OVERLAP = 60
+
+
+class TokenRevocationList:
+    """
+    Отозванные токены в памяти процесса:
+    - jti → время истечения токена (отзыв одного токена при выходе);
+    - id пользователя → (отзыв access, отзыв refresh, до какого времени
+      запись нужна): отозваны все его токены с iat не позже времени отзыва
+      (деактивация и выход на всех устройствах - оба типа, смена роли -
+      только access).
+    Проверка токена - два поиска в словарях, без БД. Память ограничена
+    отзывами за время жизни токенов, а не числом выданных токенов:
+    истёкшие записи выбрасываются при синхронизации.
+
+    Отзывы этого процесса видны сразу; отзывы других процессов -
+    после синхронизации с таблицей RevokedToken: на том же хосте по
+    общему поколению revocation_generation, на других - не позже чем
+    через TOKEN_REVOCATION_SYNC_INTERVAL секунд. Синхронизация читает
+    только новые записи (refresh_if_needed / arefresh_if_needed).
+    """
+
+    def __init__(self):
+        self._tokens = {}  # jti -> истечение (epoch)
+        self._users = {}  # user_id -> (отзыв access, отзыв refresh, истечение записи) (epoch)
+        self._synced_at = None  # время начала прошлой синхронизации (epoch)
+        self._next_sync = 0.0  # monotonic
+        self._next_prune = 0.0  # monotonic, когда чистить таблицу
+        self._pruned_at = 0.0  # когда из памяти выброшены истёкшие записи (epoch)
+        self._lock = threading.Lock()
+
+    @property
+    def sync_interval(self):
+        return getattr(settings, 'TOKEN_REVOCATION_SYNC_INTERVAL', 10)
+
+    @property
+    def prune_interval(self):
+        return getattr(settings, 'TOKEN_REVOCATION_PRUNE_INTERVAL', 3600)
+
+    def is_revoked(self, payload):
+        """Отозван ли токен с такими claims"""
+        if payload.get(api_settings.JTI_CLAIM) in self._tokens:
+            return True
+        try:
+            user_id = int(payload[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            return False
+        entry = self._users.get(user_id)
+        if entry is None:
+            return False
+        cutoff = entry[1] if payload.get(api_settings.TOKEN_TYPE_CLAIM) == 'refresh' else entry[0]
+        return payload.get('iat', 0) <= cutoff
+
+    # Отзыв
+
+    def revoke_token(self, token):
+        """Отзывает один токен (access или refresh) до его истечения"""
+        jti = token[api_settings.JTI_CLAIM]
+        expires = token['exp']
+        RevokedToken.objects.create(
+            jti=jti,
+            user_id=token[api_settings.USER_ID_CLAIM],
+            expires_at=datetime.fromtimestamp(expires, tz=dt_timezone.utc)
+        )
+        self._add_token(jti, expires)
+        transaction.on_commit(revocation_generation.bump)
+
+    def revoke_user_tokens(self, user_ids, include_refresh=True):
+        """
+        Отзывает все уже выпущенные токены пользователей. Без include_refresh
+        отзываются только access-токены (при смене роли refresh-токен
+        остаётся: новый access из него выйдет уже с новой ролью)
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        lifetime = api_settings.ACCESS_TOKEN_LIFETIME
+        if include_refresh:
+            lifetime = max(lifetime, api_settings.REFRESH_TOKEN_LIFETIME)
+        revoked_at = timezone.now()
+        expires_at = revoked_at + lifetime
+        RevokedToken.objects.bulk_create(
+            [
+                RevokedToken(
+                    user_id=user_id, include_refresh=include_refresh,
+                    revoked_at=revoked_at, expires_at=expires_at
+                )
+                for user_id in user_ids
+            ],
+            batch_size=1000
+        )
+        for user_id in user_ids:
+            self._add_user(user_id, revoked_at.timestamp(), include_refresh, expires_at.timestamp())
+        transaction.on_commit(revocation_generation.bump)
+
+    # Синхронизация с таблицей
+
+    def needs_sync(self):
+        return (
+            self._synced_at is None
+            or time.monotonic() >= self._next_sync
+            or revocation_generation.changed()
+        )
+
+    def refresh_if_needed(self):
+        if self.needs_sync():
+            self.sync()
+
+    async def arefresh_if_needed(self):
+        if self.needs_sync():
+            await sync_to_async(self.sync)()
+
+    def sync(self):
+        """Читает новые отзывы из таблицы и выбрасывает истёкшие"""
+        started = time.time()
+        count_cache_load()
+        now = timezone.now()
+        rows = RevokedToken.objects.filter(expires_at__gt=now)
+        if self._synced_at is not None:
+            since = self._synced_at - SYNC_OVERLAP
+            rows = rows.filter(revoked_at__gte=datetime.fromtimestamp(since, tz=dt_timezone.utc))
+        for jti, user_id, include_refresh, revoked_at, expires_at in rows.values_list(
+            'jti', 'user_id', 'include_refresh', 'revoked_at', 'expires_at'
+        ):
+            if jti is not None:
+                self._add_token(jti, expires_at.timestamp())
+            else:
+                self._add_user(user_id, revoked_at.timestamp(), include_refresh, expires_at.timestamp())
+
+        # Синхронизации по поколению бывают часто (каждый выход на хосте) -
+        # память чистится не чаще раза в интервал
+        if started - self._pruned_at >= self.sync_interval:
+            self._prune(started)
+        if time.monotonic() >= self._next_prune:
+            if self._synced_at is not None:
+                RevokedToken.objects.filter(expires_at__lte=now).delete()
+            self._next_prune = time.monotonic() + self.prune_interval
+        self._synced_at = started
+        self._next_sync = time.monotonic() + self.sync_interval
+
+    def clear(self):
+        """Забывает всё загруженное: следующая проверка перечитает таблицу"""
+        with self._lock:
+            self._tokens = {}
+            self._users = {}
+            self._synced_at = None
+
+    def _add_token(self, jti, expires):
+        with self._lock:
+            self._tokens[jti] = expires
+
+    def _add_user(self, user_id, revoked, include_refresh, expires):
+        # Отзывы одного пользователя объединяются: берутся самые поздние
+        # моменты отзыва и самое позднее истечение
+        entry = (revoked, revoked if include_refresh else 0.0, expires)
+        with self._lock:
+            previous = self._users.get(user_id)
+            if previous is not None:
+                entry = tuple(map(max, entry, previous))
+            self._users[user_id] = entry
+
+    def _prune(self, now):
+        self._pruned_at = now
+        with self._lock:
+            self._tokens = {jti: exp for jti, exp in self._tokens.items() if exp > now}
+            self._users = {
+                user_id: entry for user_id, entry in self._users.items() if entry[2] > now
+            }
+
+
+revoked_tokens = TokenRevocationList()
+# Отзыв в любом процессе хоста заставляет остальные синхронизироваться
+revocation_generation = SharedGeneration('token-revocation', 'TOKEN_REVOCATION_CHECK_INTERVAL')
+arevoke_user_tokens = sync_to_async(revoked_tokens.revoke_user_tokens)
@@ -2,6 +2,9 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 
+from .hashing import acheck_password, amake_password, check_password, make_password
+from utils.metrics import login_attempts
+
 User = get_user_model()
 
 
@@ -38,15 +41,30 @@ class RegisterSerializer(serializers.ModelSerializer):
         # Убираем password2, т.к. его нет в модели User
         validated_data.pop('password2')
         
-        # Создаём пользователя
-        user = User.objects.create_user(
-            email=validated_data['email'],
-            password=validated_data['password'],
+        # Создаём пользователя (пароль хешируется в пуле, а не в потоке запроса)
+        user = self._build_user(validated_data, make_password(validated_data['password']))
+        user.save()
+        return user
+    
+    async def asave(self):
+        """Асинхронное создание пользователя (после is_valid)"""
+        validated_data = self.validated_data
+        user = self._build_user(
+            validated_data,
+            await amake_password(validated_data['password'])
+        )
+        await user.asave()
+        self.instance = user
+        return user
+    
+    def _build_user(self, validated_data, password_hash):
+        return User(
+            email=User.objects.normalize_email(validated_data['email']),
+            password=password_hash,
             first_name=validated_data.get('first_name', ''),
             last_name=validated_data.get('last_name', ''),
             patronymic=validated_data.get('patronymic', '')
         )
-        return user
     
 class LoginSerializer(serializers.Serializer):
     """Сериализатор для входа в систему"""
@@ -58,22 +76,52 @@ class LoginSerializer(serializers.Serializer):
     )
     
     def validate(self, attrs):
-        email = attrs.get('email')
-        password = attrs.get('password')
+        user = self._check_user(User.objects.filter(email=attrs.get('email')).first())
         
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            raise serializers.ValidationError({"email": "Пользователь с таким email не найден"})
+        if not check_password(user, attrs.get('password')):
+            login_attempts.inc(result='bad_password')
+            raise serializers.ValidationError({"password": "Неверный пароль"})
         
-        if not user.is_active:
-            raise serializers.ValidationError({"email": "Аккаунт деактивирован"})
+        login_attempts.inc(result='success')
+        attrs['user'] = user
+        return attrs
+    
+    async def avalidate(self, attrs):
+        user = self._check_user(await User.objects.filter(email=attrs.get('email')).afirst())
         
-        if not user.check_password(password):
+        if not await acheck_password(user, attrs.get('password')):
+            login_attempts.inc(result='bad_password')
             raise serializers.ValidationError({"password": "Неверный пароль"})
         
+        login_attempts.inc(result='success')
         attrs['user'] = user
         return attrs
+    
+    async def ais_valid(self):
+        """
+        Асинхронный is_valid: поля проверяются как обычно,
+        а пользователь и пароль - через async ORM и пул хеширования
+        """
+        try:
+            attrs = self.to_internal_value(self.initial_data)
+            self._validated_data = await self.avalidate(attrs)
+        except serializers.ValidationError as exc:
+            self._validated_data = {}
+            self._errors = serializers.as_serializer_error(exc)
+        else:
+            self._errors = {}
+        return not self._errors
+    
+    def _check_user(self, user):
+        if user is None:
+            login_attempts.inc(result='unknown_user')
+            raise serializers.ValidationError({"email": "Пользователь с таким email не найден"})
+        
+        if not user.is_active:
+            login_attempts.inc(result='inactive')
+            raise serializers.ValidationError({"email": "Аккаунт деактивирован"})
+        
+        return user
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
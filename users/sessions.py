@@ -0,0 +1,275 @@
+# Движок сессий: SESSION_ENGINE = "users.sessions"
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends import db
+from django.db import transaction
+from django.utils import timezone
+
+from utils.instrumentation import count_cache_load
+from utils.metrics import cache_requests
+from .models import UserSession
+from utils.shared_generation import SharedTombstones
+from utils.write_behind import WriteBehindBuffer, update_by_key
+
+
+class SessionLRU:
+    """
+    Процессный LRU-кэш сессий: ключ → (срок записи в кэше, expire_date,
+    закодированные данные). Не больше SESSION_CACHE_MAX_ENTRIES записей,
+    каждая живёт SESSION_CACHE_TTL секунд, после чего сессия снова
+    читается из БД. Сессии, удалённые другими процессами, убираются
+    по журналу session_tombstones.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'SESSION_CACHE_TTL', 60)
+
+    @property
+    def max_entries(self):
+        return getattr(settings, 'SESSION_CACHE_MAX_ENTRIES', 10000)
+
+    def get(self, session_key):
+        """(expire_date, данные) или None, если записи нет или она устарела"""
+        removed = session_tombstones.collect()
+        if removed is None:
+            # Удалений больше, чем помнит журнал - какие именно, неизвестно
+            self.clear()
+        elif removed:
+            self.discard_many(removed)
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is None:
+                return None
+            cached_until, expire_date, session_data = entry
+            if cached_until <= time.monotonic() or expire_date <= timezone.now():
+                del self._entries[session_key]
+                return None
+            self._entries.move_to_end(session_key)
+        return expire_date, session_data
+
+    def put(self, session_key, expire_date, session_data):
+        with self._lock:
+            self._entries[session_key] = (time.monotonic() + self.ttl, expire_date, session_data)
+            self._entries.move_to_end(session_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, session_key, expire_date):
+        """Продлевает срок сессии в кэше, не меняя данных"""
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is not None:
+                self._entries[session_key] = (entry[0], expire_date, entry[2])
+
+    def discard(self, session_key):
+        with self._lock:
+            self._entries.pop(session_key, None)
+
+    def discard_many(self, session_keys):
+        with self._lock:
+            for session_key in session_keys:
+                self._entries.pop(session_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def write_expiry_dates(pending):
+    """Записывает накопленные продления сессий {ключ: expire_date} пачками"""
+    update_by_key(SessionStore.get_model_class(), 'expire_date', pending, key_field='session_key')
+
+
+session_cache = SessionLRU()
+# Удалённые сессии (выход) других процессов убираются из кэша по этому журналу
+session_tombstones = SharedTombstones(
+    'sessions', 'SESSION_TOMBSTONE_CHECK_INTERVAL', 'SESSION_TOMBSTONE_SLOTS'
+)
+# Продления сессий без изменения данных копятся и пишутся пачками
+expiry_writes = WriteBehindBuffer(
+    'session-expiry', write_expiry_dates,
+    'SESSION_WRITE_BEHIND_INTERVAL', 5,
+    'SESSION_WRITE_BEHIND_MAX_PENDING', 10000
+)
+
+
+def end_user_sessions(user_ids):
+    """
+    Завершает все сессии пользователей по индексу UserSession:
+    O(сессий этих пользователей), без перебора таблицы сессий.
+    Возвращает число завершённых сессий
+    """
+    keys = list(
+        UserSession.objects.filter(user_id__in=user_ids).values_list('session_key', flat=True)
+    )
+    store_class = import_module(settings.SESSION_ENGINE).SessionStore
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        if issubclass(store_class, SessionStore):
+            SessionStore.get_model_class().objects.filter(session_key__in=chunk).delete()
+            for session_key in chunk:
+                session_cache.discard(session_key)
+                expiry_writes.discard(session_key)
+        else:
+            # Другой движок сессий - удаляем его же средствами, по одной
+            for session_key in chunk:
+                store_class().delete(session_key)
+        UserSession.objects.filter(session_key__in=chunk).delete()
+    if keys:
+        transaction.on_commit(partial(session_tombstones.add, keys))
+    return len(keys)
+
+
+aend_user_sessions = sync_to_async(end_user_sessions)
+
+
+class SessionStore(db.SessionStore):
+    """
+    Сессии в БД (как django.contrib.sessions.backends.db) с процессным
+    LRU-кэшем перед ней:
+    - чтение сессии из кэша не обращается к БД;
+    - изменённые данные сразу пишутся в БД и в кэш;
+    - сохранение без изменения данных (продление срока, например при
+      SESSION_SAVE_EVERY_REQUEST) только обновляет expire_date и пишется
+      отложенно, пачками раз в SESSION_WRITE_BEHIND_INTERVAL секунд;
+    - удалённая сессия убирается из кэшей всех процессов через общий
+      журнал session_tombstones.
+    Изменение данных сессии в другом процессе видно не позже чем через
+    SESSION_CACHE_TTL секунд.
+    """
+
+    def load(self):
+        cached = self._from_cache()
+        if cached is not None:
+            return cached
+        count_cache_load()
+        s = self._get_session_from_db()
+        return self._loaded(s)
+
+    async def aload(self):
+        cached = self._from_cache()
+        if cached is not None:
+            return cached
+        count_cache_load()
+        s = await self._aget_session_from_db()
+        return self._loaded(s)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        if not must_create and self._unchanged():
+            self._touch()
+            return
+        super().save(must_create)
+        self._saved()
+
+    async def asave(self, must_create=False):
+        if self.session_key is None:
+            return await self.acreate()
+        if not must_create and self._unchanged():
+            if expiry_writes.enabled:
+                self._touch()
+            else:
+                # Без буфера продление пишется в БД сразу
+                await sync_to_async(self._touch)()
+            return
+        await super().asave(must_create)
+        self._saved()
+
+    def delete(self, session_key=None):
+        session_key = session_key or self.session_key
+        if session_key is None:
+            return
+        self.model.objects.filter(session_key=session_key).delete()
+        self._forget(session_key)
+
+    async def adelete(self, session_key=None):
+        session_key = session_key or self.session_key
+        if session_key is None:
+            return
+        await self.model.objects.filter(session_key=session_key).adelete()
+        # Async ORM работает в автокоммите - ждать коммита не нужно
+        self._forget(session_key, on_commit=False)
+
+    def create_model_instance(self, data):
+        obj = super().create_model_instance(data)
+        self._written = obj
+        return obj
+
+    async def acreate_model_instance(self, data):
+        obj = await super().acreate_model_instance(data)
+        self._written = obj
+        return obj
+
+    @classmethod
+    def clear_expired(cls):
+        expiry_writes.flush()
+        super().clear_expired()
+        # Индекс сессий без самих сессий (истекли или удалены в обход выхода)
+        UserSession.objects.exclude(
+            session_key__in=cls.get_model_class().objects.values('session_key')
+        ).delete()
+
+    # Кэш и отложенная запись
+
+    def _from_cache(self):
+        cached = session_cache.get(self.session_key)
+        if cached is None:
+            cache_requests.inc(cache='sessions', result='miss')
+            return None
+        cache_requests.inc(cache='sessions', result='hit')
+        data = self.decode(cached[1])
+        self._remember_payload(data)
+        return data
+
+    def _loaded(self, s):
+        if s is None:
+            return {}
+        session_cache.put(s.session_key, s.expire_date, s.session_data)
+        data = self.decode(s.session_data)
+        self._remember_payload(data)
+        return data
+
+    def _remember_payload(self, data):
+        # Сериализованные данные на момент загрузки: по ним save() отличает
+        # изменение сессии от простого продления срока
+        self._loaded_payload = self.serializer().dumps(data)
+
+    def _unchanged(self):
+        """Данные сессии те же, что при загрузке - сохранение только продлевает срок"""
+        payload = getattr(self, '_loaded_payload', None)
+        return payload is not None and self.serializer().dumps(self._get_session()) == payload
+
+    def _touch(self):
+        expire_date = self.get_expiry_date()
+        expiry_writes.add(self.session_key, expire_date)
+        session_cache.touch(self.session_key, expire_date)
+
+    def _saved(self):
+        obj = self._written
+        # Отложенное продление старше только что записанного срока
+        expiry_writes.discard(obj.session_key)
+        session_cache.put(obj.session_key, obj.expire_date, obj.session_data)
+        self._remember_payload(self._get_session())
+
+    def _forget(self, session_key, on_commit=True):
+        session_cache.discard(session_key)
+        expiry_writes.discard(session_key)
+        if on_commit:
+            transaction.on_commit(partial(session_tombstones.add, [session_key]))
+        else:
+            session_tombstones.add([session_key])
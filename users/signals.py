@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.contrib.auth import models as auth_models
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from utils.write_behind import WriteBehindBuffer, update_by_key
+from .models import User, UserSession
+from .revocation import revoked_tokens
+from .sessions import end_user_sessions
+
+
+def write_last_logins(pending):
+    """Записывает накопленные last_login {id пользователя: время} пачками"""
+    update_by_key(User, 'last_login', pending)
+
+
+# Время входа при LAST_LOGIN_WRITE_BEHIND копится в памяти и пишется пачками;
+# остаток записывается при остановке процесса
+last_login_writes = WriteBehindBuffer(
+    'last-login', write_last_logins,
+    'LAST_LOGIN_WRITE_BEHIND_INTERVAL', 5,
+    'LAST_LOGIN_WRITE_BEHIND_MAX_PENDING', 10000
+)
+
+# Заменяет django.contrib.auth.models.update_last_login (тот же dispatch_uid)
+user_logged_in.disconnect(dispatch_uid='update_last_login')
+
+
+@receiver(user_logged_in, dispatch_uid='update_last_login')
+def update_last_login(sender, user, **kwargs):
+    """
+    Время входа. По умолчанию - UPDATE строки пользователя сразу, как
+    в Django; при LAST_LOGIN_WRITE_BEHIND - без записи в запросе входа
+    """
+    if not getattr(settings, 'LAST_LOGIN_WRITE_BEHIND', False):
+        auth_models.update_last_login(sender, user, **kwargs)
+        return
+    user.last_login = timezone.now()
+    last_login_writes.add(user.pk, user.last_login)
+
+
+@receiver(user_logged_in)
+def index_session(sender, request, user, **kwargs):
+    """Запоминает сессию входа в индексе сессий пользователя"""
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        UserSession.objects.bulk_create(
+            [UserSession(session_key=session.session_key, user=user)],
+            ignore_conflicts=True
+        )
+
+
+@receiver(user_logged_out)
+def unindex_session(sender, request, user, **kwargs):
+    session = getattr(request, 'session', None)
+    if user is not None and session is not None and session.session_key:
+        UserSession.objects.filter(session_key=session.session_key).delete()
+
+
+# Деактивация пользователя (удаление аккаунта, soft_delete, админка)
+# завершает все его сессии и отзывает все его JWT
+
+@receiver(post_init, sender=User)
+def remember_is_active(sender, instance, **kwargs):
+    # Через __dict__, чтобы не загружать отложенное поле лишним запросом
+    instance._original_is_active = instance.__dict__.get('is_active')
+
+
+@receiver(post_save, sender=User)
+def end_sessions_of_deactivated(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    if not created and instance._original_is_active and not instance.is_active:
+        end_user_sessions([instance.pk])
+        revoked_tokens.revoke_user_tokens([instance.pk])
+    instance._original_is_active = instance.is_active
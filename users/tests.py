@@ -1,3 +1,748 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from utils.testing import (
+    QueryBudgetTestMixin,
+    create_user_with_permissions,
+    warm_permission_cache,
+)
+from utils.shared_generation import SharedTombstones
+from utils.write_behind import WriteBehindBuffer
+from . import urls
+from auth_system.signals import user_role_changed
+from .hashing import hashing_pool
+from .models import RevokedToken, User, UserSession
+from .revocation import revocation_generation, revoked_tokens
+from .sessions import (
+    SessionStore,
+    end_user_sessions,
+    expiry_writes,
+    session_cache,
+    session_tombstones,
+)
+from .signals import last_login_writes
+from .throttling import _wait as throttle_wait
+from .tokens import RevocableAccessToken, issue_tokens
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Число SQL-запросов вьюх users.views не превышает объявленных бюджетов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user_with_permissions(
+            'user@example.com', 'password123', ['user.read'],
+            first_name='Иван', last_name='Иванов'
+        )
+
+    def setUp(self):
+        warm_permission_cache()
+
+    def test_all_views_have_budget(self):
+        self.assertViewsHaveQueryBudget(urls)
+
+    def test_register(self):
+        response = self.assertWithinQueryBudget('post', reverse('register'), data={
+            'email': 'new@example.com',
+            'password': 'Sl0zhnyi-parol',
+            'password2': 'Sl0zhnyi-parol',
+            'first_name': 'Пётр',
+            'last_name': 'Петров',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_login(self):
+        response = self.assertWithinQueryBudget('post', reverse('login'), data={
+            'email': 'user@example.com', 'password': 'password123'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_obtain_and_refresh(self):
+        response = self.assertWithinQueryBudget('post', reverse('token-obtain'), data={
+            'email': 'user@example.com', 'password': 'password123'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.assertWithinQueryBudget('post', reverse('token-refresh'), data={
+            'refresh': response.json()['refresh']
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout(self):
+        self.client.force_login(self.user)
+        response = self.assertWithinQueryBudget('post', reverse('logout'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_with_tokens(self):
+        tokens = issue_tokens(self.user)
+        response = self.assertWithinQueryBudget(
+            'post', reverse('logout'), data={'refresh': tokens['refresh']},
+            content_type='application/json', headers={'Authorization': f'Bearer {tokens["access"]}'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_all(self):
+        Client().force_login(self.user)  # вход на другом устройстве
+        self.client.force_login(self.user)
+        response = self.assertWithinQueryBudget('post', reverse('logout-all'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['sessions_ended'], 2)
+
+    def test_profile(self):
+        self.client.force_login(self.user)
+        response = self.assertWithinQueryBudget('get', reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_update_profile(self):
+        self.client.force_login(self.user)
+        response = self.assertWithinQueryBudget(
+            'patch', reverse('update-profile'),
+            data={'first_name': 'Иван'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_delete_account(self):
+        self.client.force_login(self.user)
+        response = self.assertWithinQueryBudget('delete', reverse('delete-account'))
+        self.assertEqual(response.status_code, 200)
+
+
+class PasswordHashingPoolTests(TestCase):
+    """Пул хеширования паролей (users.hashing): переполнение - ответ 503"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user_with_permissions('user@example.com', 'password123', ['user.read'])
+
+    def setUp(self):
+        warm_permission_cache()
+        hashing_pool._start()
+        # Пул на одну задачу, и она уже занята
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        patcher = mock.patch.object(hashing_pool, '_slots', slots)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, url, data):
+        return self.client.post(reverse(url), data=data, content_type='application/json')
+
+    def assertOverloaded(self, response):
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+    def test_login(self):
+        self.assertOverloaded(self.post('login', {'email': 'user@example.com', 'password': 'password123'}))
+
+    def test_register(self):
+        self.assertOverloaded(self.post('register', {
+            'email': 'new@example.com', 'first_name': 'Иван', 'last_name': 'Иванов',
+            'password': 'Str0ng-pass-42', 'password2': 'Str0ng-pass-42'
+        }))
+        self.assertFalse(User.objects.filter(email='new@example.com').exists())
+
+    def test_async_login(self):
+        self.assertOverloaded(self.post('async-login', {'email': 'user@example.com', 'password': 'password123'}))
+
+
+class AsyncViewTests(TestCase):
+    """Async-вьюхи users.async_views: аутентификация и разбор тела запроса"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user_with_permissions('user@example.com', 'password123', ['user.read'])
+
+    def setUp(self):
+        warm_permission_cache()
+        self.client.force_login(self.user)
+
+    def update_profile(self, method, data, content_type):
+        return getattr(self.client, method)(
+            reverse('async-update-profile'), data=data, content_type=content_type
+        )
+
+    def assertFirstName(self, response, first_name):
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, first_name)
+
+    def test_profile_with_jwt(self):
+        self.client.logout()
+        access = issue_tokens(self.user)['access']
+        response = self.client.get(reverse('async-profile'), HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], self.user.email)
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('async-profile')).status_code, 401)
+
+    def test_json_body(self):
+        self.assertFirstName(self.update_profile('patch', {'first_name': 'Пётр'}, 'application/json'), 'Пётр')
+
+    def test_form_body_for_patch(self):
+        response = self.update_profile(
+            'patch', 'first_name=%D0%9F%D1%91%D1%82%D1%80', 'application/x-www-form-urlencoded'
+        )
+        self.assertFirstName(response, 'Пётр')
+
+    def test_multipart_body_for_put(self):
+        response = self.update_profile(
+            'put', encode_multipart(BOUNDARY, {'first_name': 'Анна'}), MULTIPART_CONTENT
+        )
+        self.assertFirstName(response, 'Анна')
+
+    def test_unsupported_content_type(self):
+        response = self.update_profile('patch', 'first_name=Пётр', 'text/plain')
+        self.assertEqual(response.status_code, 415)
+
+
+class AuthenticationBackendTests(TestCase):
+    """Бэкенды аутентификации сессий (AUTHENTICATION_BACKENDS)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user_with_permissions('user@example.com', 'password123', ['user.read'])
+
+    def setUp(self):
+        warm_permission_cache()
+
+    def test_login_uses_role_aware_backend(self):
+        for url in ('login', 'async-login'):
+            client = Client()
+            response = client.post(
+                reverse(url), data={'email': 'user@example.com', 'password': 'password123'},
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(client.session[BACKEND_SESSION_KEY], 'users.backends.RoleAwareModelBackend')
+
+    def test_sessions_of_model_backend_stay_valid(self):
+        # Сессии, созданные до замены ModelBackend
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+
+
+class SessionStoreTests(TestCase):
+    """Сессии с процессным кэшем и отложенной записью продлений (users.sessions)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user_with_permissions('user@example.com', 'password123', ['user.read'])
+
+    def setUp(self):
+        session_cache.clear()
+        expiry_writes.flush()
+        warm_permission_cache()
+        self.client.force_login(self.user)
+        self.session_key = self.client.session.session_key
+        # Отложенные продления тестов не должны писаться из фонового потока
+        self.addCleanup(expiry_writes.discard, self.session_key)
+
+    def session_queries(self, method, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path)
+        return response, [q['sql'] for q in queries.captured_queries if 'django_session' in q['sql']]
+
+    def test_session_read_from_cache(self):
+        response, queries = self.session_queries('get', reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_session_reloaded_after_cache_ttl(self):
+        session_cache.clear()
+        with self.settings(SESSION_CACHE_TTL=0):
+            for _ in range(2):
+                response, queries = self.session_queries('get', reverse('profile'))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(queries), 1)
+
+    def test_touch_is_written_later_in_one_batch(self):
+        old_expiry = Session.objects.get(pk=self.session_key).expire_date
+        with self.settings(SESSION_SAVE_EVERY_REQUEST=True, SESSION_WRITE_BEHIND_INTERVAL=3600):
+            response, queries = self.session_queries('get', reverse('profile'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+        self.assertIn(self.session_key, expiry_writes._pending)
+
+        with CaptureQueriesContext(connection) as flush_queries:
+            expiry_writes.flush()
+        self.assertEqual(len(flush_queries), 1)
+        self.assertGreater(Session.objects.get(pk=self.session_key).expire_date, old_expiry)
+
+    def test_changed_session_is_written_immediately(self):
+        session = SessionStore(self.session_key)
+        session['theme'] = 'dark'
+        session.save()
+
+        self.assertEqual(SessionStore().decode(Session.objects.get(pk=self.session_key).session_data)['theme'], 'dark')
+        self.assertEqual(SessionStore(self.session_key)['theme'], 'dark')
+
+    def test_logout_removes_session_everywhere(self):
+        count = session_tombstones.count
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('logout'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(session_cache.get(self.session_key))
+        self.assertFalse(Session.objects.filter(pk=self.session_key).exists())
+        self.assertEqual(session_tombstones.count, count + 1)
+
+    def other_process_logout(self, *session_keys):
+        # Отдельный экземпляр журнала - как другой процесс
+        other = SharedTombstones('sessions', 'SESSION_TOMBSTONE_CHECK_INTERVAL', 'SESSION_TOMBSTONE_SLOTS')
+        other.add(session_keys)
+
+    def test_other_process_logout_discards_only_that_session(self):
+        other_client = Client()
+        other_client.force_login(self.user)
+        other_key = other_client.session.session_key
+        self.addCleanup(expiry_writes.discard, other_key)
+
+        with self.settings(SESSION_TOMBSTONE_CHECK_INTERVAL=0):
+            session_tombstones.collect()
+            self.other_process_logout(other_key)
+            self.assertIsNone(session_cache.get(other_key))
+            self.assertIsNotNone(session_cache.get(self.session_key))
+
+    def test_missed_logouts_clear_cache(self):
+        with self.settings(SESSION_TOMBSTONE_CHECK_INTERVAL=0):
+            session_tombstones.collect()
+            self.other_process_logout(*(f'gone{i}' for i in range(session_tombstones._slots + 1)))
+            self.assertIsNone(session_cache.get(self.session_key))
+            self.assertEqual(len(session_cache), 0)
+
+    def test_cache_is_bounded(self):
+        expire_date = timezone.now() + timedelta(days=1)
+        with self.settings(SESSION_CACHE_MAX_ENTRIES=2):
+            for key in ('a', 'b', 'c'):
+                session_cache.put(key, expire_date, '')
+            self.assertEqual(len(session_cache), 2)
+            self.assertIsNone(session_cache.get('a'))
+
+    def test_expired_session_not_served_from_cache(self):
+        session_cache.put('old', timezone.now() - timedelta(seconds=1), '')
+        self.assertIsNone(session_cache.get('old'))
+
+
+class UserSessionIndexTests(TestCase):
+    """Индекс сессий пользователя и завершение всех его сессий"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user_with_permissions('user@example.com', 'password123', ['user.read'])
+        cls.other = create_user_with_permissions('other@example.com', 'password123', ['user.read'])
+        cls.admin = create_user_with_permissions(
+            'admin@example.com', 'password123', ['permission.manage']
+        )
+
+    def setUp(self):
+        warm_permission_cache()
+        self.devices = [Client() for _ in range(3)]
+        for device in self.devices:
+            device.force_login(self.user)
+        self.other_client = Client()
+        self.other_client.force_login(self.other)
+
+    def assertLoggedOut(self, *clients):
+        for client in clients:
+            self.assertEqual(client.get(reverse('profile')).status_code, 401)
+
+    def user_session_keys(self, user):
+        return set(UserSession.objects.filter(user=user).values_list('session_key', flat=True))
+
+    def test_login_and_logout_maintain_index(self):
+        keys = {device.session.session_key for device in self.devices}
+        self.assertEqual(self.user_session_keys(self.user), keys)
+
+        logged_out = self.devices[0].session.session_key
+        self.devices[0].post(reverse('logout'))
+        self.assertEqual(self.user_session_keys(self.user), keys - {logged_out})
+
+    def test_end_user_sessions_touches_only_their_sessions(self):
+        self.assertEqual(end_user_sessions([self.user.pk]), 3)
+        self.assertLoggedOut(*self.devices)
+        self.assertEqual(self.user_session_keys(self.other), {self.other_client.session.session_key})
+
+    def test_logout_all_devices(self):
+        response = self.devices[0].post(reverse('logout-all'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['sessions_ended'], 3)
+        self.assertLoggedOut(*self.devices)
+        self.assertEqual(self.user_session_keys(self.user), set())
+        self.assertEqual(self.other_client.get(reverse('profile')).status_code, 200)
+
+    def test_deactivation_ends_all_sessions(self):
+        response = self.devices[0].delete(reverse('delete-account'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLoggedOut(*self.devices)
+        self.assertFalse(Session.objects.filter(
+            session_key__in=[device.session.session_key for device in self.devices]
+        ).exists())
+
+    def test_soft_delete_ends_all_sessions(self):
+        self.user.soft_delete()
+        self.assertLoggedOut(*self.devices)
+        self.assertEqual(self.other_client.get(reverse('profile')).status_code, 200)
+
+    def test_role_change_ends_sessions(self):
+        admin = Client()
+        admin.force_login(self.admin)
+        response = admin.patch(
+            reverse('update-user-role', args=[self.user.pk]),
+            data={'role_id': self.other.role_id}, content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLoggedOut(*self.devices)
+
+    def test_role_change_by_save_ends_sessions(self):
+        self.user.role = self.other.role
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.assertLoggedOut(*self.devices)
+        self.assertEqual(self.other_client.get(reverse('profile')).status_code, 200)
+
+    def test_role_change_in_admin_ends_sessions(self):
+        admin = Client()
+        admin.force_login(User.objects.create_superuser('root@example.com', 'password123'))
+        response = admin.post(reverse('admin:users_user_change', args=[self.user.pk]), {
+            'email': self.user.email,
+            'first_name': 'Иван',
+            'last_name': 'Иванов',
+            'patronymic': '',
+            'role': self.other.role_id,
+            'is_active': 'on',
+            'date_joined_0': '2024-01-01',
+            'date_joined_1': '00:00:00',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertLoggedOut(*self.devices)
+        self.assertEqual(self.user_session_keys(self.user), set())
+
+    def test_same_role_keeps_sessions(self):
+        admin = Client()
+        admin.force_login(self.admin)
+        updated_at = self.user.updated_at
+        response = admin.patch(
+            reverse('update-user-role', args=[self.user.pk]),
+            data={'role_id': self.user.role_id}, content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['role_id'], self.user.role_id)
+        self.assertEqual(len(self.user_session_keys(self.user)), 3)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.updated_at, updated_at)
+
+    def test_role_change_keeps_sessions_when_disabled(self):
+        with self.settings(END_SESSIONS_ON_ROLE_CHANGE=False):
+            user_role_changed.send(sender=User, user_ids=[self.user.pk], role_id=self.user.role_id)
+        self.assertEqual(len(self.user_session_keys(self.user)), 3)
+
+    def test_clear_expired_prunes_index(self):
+        Session.objects.filter(session_key=self.devices[0].session.session_key).update(
+            expire_date=timezone.now() - timedelta(seconds=1)
+        )
+        SessionStore.clear_expired()
+        self.assertEqual(len(self.user_session_keys(self.user)), 2)
+
+
+class TokenRevocationTests(TestCase):
+    """Отзыв JWT: выход, деактивация, смена роли, синхронизация между процессами"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user_with_permissions('user@example.com', 'password123', ['user.read'])
+        cls.other_role = create_user_with_permissions('other@example.com', 'password123', ['user.read']).role
+
+    def setUp(self):
+        warm_permission_cache()
+        self.tokens = issue_tokens(self.user)
+
+    def get_profile(self, access):
+        return self.client.get(reverse('profile'), headers={'Authorization': f'Bearer {access}'})
+
+    def refresh(self, refresh):
+        return self.client.post(reverse('token-refresh'), data={'refresh': refresh}, content_type='application/json')
+
+    def test_check_does_not_query_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_profile(self.tokens['access'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries.captured_queries if 'revokedtoken' in q['sql']])
+
+    def test_logout_revokes_access_and_refresh(self):
+        response = self.client.post(
+            reverse('logout'), data={'refresh': self.tokens['refresh']}, content_type='application/json',
+            headers={'Authorization': f'Bearer {self.tokens["access"]}'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_profile(self.tokens['access']).status_code, 401)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+        # Другие токены пользователя действуют
+        self.assertEqual(self.get_profile(issue_tokens(self.user)['access']).status_code, 200)
+
+    def test_logout_all_revokes_all_tokens(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('logout-all'))
+
+        self.assertEqual(self.get_profile(self.tokens['access']).status_code, 401)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+        # Токен, выданный после выхода, действует
+        self.assertEqual(self.get_profile(issue_tokens(self.user)['access']).status_code, 200)
+
+    def test_deactivation_revokes_tokens(self):
+        self.user.soft_delete()
+        self.assertEqual(self.get_profile(self.tokens['access']).status_code, 401)
+
+    def test_role_change_revokes_access_but_not_refresh(self):
+        # Сигнал user_role_changed отправляет сохранение пользователя
+        self.user.role = self.other_role
+        self.user.save()
+
+        self.assertEqual(self.get_profile(self.tokens['access']).status_code, 401)
+        response = self.refresh(self.tokens['refresh'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_profile(response.json()['access']).status_code, 200)
+
+    def test_saving_same_role_keeps_tokens(self):
+        self.user.first_name = 'Иван'
+        self.user.save()
+        self.assertEqual(self.get_profile(self.tokens['access']).status_code, 200)
+
+    def test_role_change_in_admin_revokes_access(self):
+        self.client.force_login(User.objects.create_superuser('root@example.com', 'password123'))
+        response = self.client.post(reverse('admin:users_user_change', args=[self.user.pk]), {
+            'email': self.user.email,
+            'first_name': 'Иван',
+            'last_name': 'Иванов',
+            'patronymic': '',
+            'role': self.other_role.pk,
+            'is_active': 'on',
+            'date_joined_0': '2024-01-01',
+            'date_joined_1': '00:00:00',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(User.objects.get(pk=self.user.pk).role_id, self.other_role.pk)
+        self.client.logout()
+        self.assertEqual(self.get_profile(self.tokens['access']).status_code, 401)
+
+    def test_revocation_in_other_process(self):
+        token = RevocableAccessToken(self.tokens['access'])
+        RevokedToken.objects.create(
+            jti=token['jti'], user=self.user,
+            expires_at=timezone.now() + timedelta(minutes=5)
+        )
+        revocation_generation.changed()
+        revocation_generation.bump()
+        revocation_generation._seen -= 1  # как будто отозвал другой процесс
+
+        with self.settings(TOKEN_REVOCATION_CHECK_INTERVAL=0):
+            self.assertEqual(self.get_profile(self.tokens['access']).status_code, 401)
+
+    def test_expired_revocations_pruned(self):
+        revoked_tokens.revoke_user_tokens([self.user.pk])
+        RevokedToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        revoked_tokens._users[self.user.pk] = (time.time(), time.time(), time.time() - 1)
+        revoked_tokens._next_prune = 0
+
+        with self.settings(TOKEN_REVOCATION_SYNC_INTERVAL=0):
+            revoked_tokens.sync()
+        self.assertNotIn(self.user.pk, revoked_tokens._users)
+        self.assertFalse(RevokedToken.objects.exists())
+
+
+class LoginThrottleTests(TestCase):
+    """Ограничение неудачных попыток входа по email и IP (users.throttling)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user_with_permissions('user@example.com', 'password123', ['user.read'])
+
+    def setUp(self):
+        warm_permission_cache()
+        caches['login-throttle'].clear()
+        self.addCleanup(caches['login-throttle'].clear)
+
+    def login(self, email, password, url='login', ip='10.0.0.1'):
+        return self.client.post(
+            reverse(url), data={'email': email, 'password': password},
+            content_type='application/json', REMOTE_ADDR=ip
+        )
+
+    def test_email_limit(self):
+        with self.settings(LOGIN_THROTTLE_EMAIL_LIMIT=3):
+            for _ in range(3):
+                self.assertEqual(self.login('user@example.com', 'wrong').status_code, 400)
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.login('user@example.com', 'password123', ip='10.0.0.2')
+
+        # Отказ до поиска пользователя и проверки пароля, даже с верным паролем
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response.headers)
+        self.assertEqual(len(queries), 0)
+
+    def test_ip_limit_across_emails(self):
+        with self.settings(LOGIN_THROTTLE_IP_LIMIT=3):
+            for i in range(3):
+                self.login(f'nobody{i}@example.com', 'wrong')
+            self.assertEqual(self.login('user@example.com', 'password123').status_code, 429)
+            self.assertEqual(self.login('user@example.com', 'password123', ip='10.0.0.2').status_code, 200)
+
+    def test_ip_behind_proxy(self):
+        with self.settings(
+            LOGIN_THROTTLE_IP_LIMIT=2,
+            REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1},
+        ):
+            for i in range(2):
+                self.client.post(
+                    reverse('login'), data={'email': f'nobody{i}@example.com', 'password': 'wrong'},
+                    content_type='application/json',
+                    REMOTE_ADDR='10.0.0.254', HTTP_X_FORWARDED_FOR='203.0.113.1'
+                )
+
+            def login_from(client_ip):
+                return self.client.post(
+                    reverse('login'), data={'email': 'user@example.com', 'password': 'password123'},
+                    content_type='application/json',
+                    REMOTE_ADDR='10.0.0.254', HTTP_X_FORWARDED_FOR=client_ip
+                )
+
+            # Тот же прокси, но клиенты разные - лимит только у первого
+            self.assertEqual(login_from('203.0.113.1').status_code, 429)
+            self.assertEqual(login_from('203.0.113.2').status_code, 200)
+
+    def test_cache_in_test_runtime_dir(self):
+        location = Path(caches['login-throttle']._dir)
+        self.assertEqual(location.parent, Path(settings.RUNTIME_DIR))
+        self.assertNotEqual(location.parent, settings.BASE_DIR / 'run')
+
+    def test_successful_logins_not_counted(self):
+        with self.settings(LOGIN_THROTTLE_EMAIL_LIMIT=2):
+            for _ in range(3):
+                self.assertEqual(self.login('user@example.com', 'password123', url='token-obtain').status_code, 200)
+
+    def test_token_endpoint_throttled(self):
+        with self.settings(LOGIN_THROTTLE_EMAIL_LIMIT=1):
+            self.login('user@example.com', 'wrong', url='token-obtain')
+            self.assertEqual(self.login('user@example.com', 'password123', url='token-obtain').status_code, 429)
+
+    def test_disabled(self):
+        with self.settings(LOGIN_THROTTLE_EMAIL_LIMIT=0, LOGIN_THROTTLE_IP_LIMIT=0):
+            for _ in range(10):
+                self.assertEqual(self.login('user@example.com', 'wrong').status_code, 400)
+
+    def test_previous_window_counts_partially(self):
+        # 4 попытки в прошлом окне, прошла половина текущего: оценка 2 + 0
+        self.assertEqual(throttle_wait(4, 0, 2, 30, 60), 1)
+        self.assertEqual(throttle_wait(4, 1, 2, 0, 60), 45)
+        # Текущее окно уже за лимитом: ждать до его конца и ещё часть следующего
+        self.assertEqual(throttle_wait(0, 4, 2, 30, 60), 60)
+
+
+class LastLoginWriteBehindTests(TestCase):
+    """Отложенная запись last_login (LAST_LOGIN_WRITE_BEHIND)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            create_user_with_permissions(f'user{i}@example.com', 'password123', ['user.read'])
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        warm_permission_cache()
+        self.addCleanup(last_login_writes._pending.clear)
+
+    def login(self, user):
+        return self.client.post(
+            reverse('login'), data={'email': user.email, 'password': 'password123'},
+            content_type='application/json'
+        )
+
+    def user_updates(self, queries):
+        return [q for q in queries if q['sql'].startswith('UPDATE "users_user"')]
+
+    def test_login_does_not_update_user_row(self):
+        with self.settings(LAST_LOGIN_WRITE_BEHIND=True, LAST_LOGIN_WRITE_BEHIND_INTERVAL=3600):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.login(self.users[0]).status_code, 200)
+
+        self.assertEqual(self.user_updates(queries), [])
+        self.assertIsNone(User.objects.get(pk=self.users[0].pk).last_login)
+        self.assertIn(self.users[0].pk, last_login_writes._pending)
+
+    def test_flush_writes_logins_in_one_query(self):
+        with self.settings(LAST_LOGIN_WRITE_BEHIND=True, LAST_LOGIN_WRITE_BEHIND_INTERVAL=3600):
+            for user in self.users:
+                self.login(user)
+            pending = dict(last_login_writes._pending)
+            with CaptureQueriesContext(connection) as queries:
+                last_login_writes.flush()
+
+        self.assertEqual(len(self.user_updates(queries)), 1)
+        self.assertEqual(
+            dict(User.objects.filter(pk__in=pending).values_list('pk', 'last_login')), pending
+        )
+
+    def test_disabled_updates_immediately(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.login(self.users[0])
+
+        self.assertEqual(len(self.user_updates(queries)), 1)
+        self.assertIsNotNone(User.objects.get(pk=self.users[0].pk).last_login)
+        self.assertNotIn(self.users[0].pk, last_login_writes._pending)
+
+
+class WriteBehindBufferTests(TestCase):
+    """Буфер отложенной записи utils.write_behind"""
+
+    def setUp(self):
+        self.written = []
+        self.buffer = WriteBehindBuffer('test', self.written.append, 'TEST_WRITE_BEHIND_INTERVAL', 3600)
+
+    def test_keeps_last_value_per_key(self):
+        self.buffer.add('a', 1)
+        self.buffer.add('a', 2)
+        self.buffer.add('b', 3)
+        self.buffer.flush()
+        self.assertEqual(self.written, [{'a': 2, 'b': 3}])
+
+    def test_disabled_writes_immediately(self):
+        with self.settings(TEST_WRITE_BEHIND_INTERVAL=0):
+            self.buffer.add('a', 1)
+        self.assertEqual(self.written, [{'a': 1}])
+
+    def test_failed_write_keeps_values(self):
+        def fail(pending):
+            raise RuntimeError
+        buffer = WriteBehindBuffer('test-fail', fail, 'TEST_WRITE_BEHIND_INTERVAL', 3600)
+        buffer.add('a', 1)
+        with self.assertLogs('utils.write_behind', 'ERROR'):
+            buffer.flush()
+        buffer.add('b', 2)
+        self.assertEqual(dict(buffer._pending), {'a': 1, 'b': 2})
+        buffer.discard('a')
+        buffer.discard('b')
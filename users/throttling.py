@@ -0,0 +1,116 @@
+# Защита входа от перебора паролей: после LOGIN_THROTTLE_*_LIMIT неудачных
+# попыток за окно запрос отклоняется (429) до поиска пользователя и хеширования
+import hashlib
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import Throttled
+
+from utils.metrics import client_ip, login_attempts
+
+
+class LoginThrottle:
+    """
+    Счётчики неудачных входов по email и по IP клиента (utils.metrics.client_ip:
+    за доверенными прокси - из X-Forwarded-For) в скользящем окне
+    LOGIN_THROTTLE_WINDOW секунд.
+
+    Окно считается по двум соседним фиксированным окнам: оценка числа
+    попыток = попытки прошлого окна × доля, ещё попадающая в скользящее
+    окно + попытки текущего. Хранится два счётчика на ключ вместо журнала
+    попыток, проверка - один get_many.
+
+    Счётчики лежат в кэше LOGIN_THROTTLE_CACHE. Файловый кэш в RUNTIME_DIR
+    общий для всех процессов хоста, но ограничение с ним приблизительное:
+    incr там - чтение и перезапись файла без блокировки (параллельные
+    неудачные попытки могут посчитаться за одну), а при переполнении
+    MAX_ENTRIES кэш удаляет часть ключей вместе со счётчиками. Для точного
+    лимита и нескольких хостов - Redis/Memcached с атомарным incr.
+    Лимит 0 выключает проверку по этому ключу.
+    """
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'LOGIN_THROTTLE_CACHE', 'default')]
+
+    @property
+    def window(self):
+        return getattr(settings, 'LOGIN_THROTTLE_WINDOW', 60)
+
+    def _scopes(self, request, email):
+        """(ключ, лимит) для email и IP запроса"""
+        scopes = []
+        email_limit = getattr(settings, 'LOGIN_THROTTLE_EMAIL_LIMIT', 5)
+        if email and email_limit:
+            digest = hashlib.sha256(email.encode()).hexdigest()[:32]
+            scopes.append((f'login-throttle:email:{digest}', email_limit))
+        ip = client_ip(request)
+        ip_limit = getattr(settings, 'LOGIN_THROTTLE_IP_LIMIT', 20)
+        if ip and ip_limit:
+            scopes.append((f'login-throttle:ip:{ip}', ip_limit))
+        return scopes
+
+    def check(self, request, email):
+        """Бросает Throttled, если по email или IP исчерпан лимит неудачных попыток"""
+        scopes = self._scopes(request, email)
+        if not scopes:
+            return
+        window = self.window
+        index, elapsed = divmod(time.time(), window)
+        keys = [f'{key}:{int(i)}' for key, _ in scopes for i in (index - 1, index)]
+        counts = self.cache.get_many(keys)
+
+        wait = 0
+        for key, limit in scopes:
+            previous = counts.get(f'{key}:{int(index - 1)}', 0)
+            current = counts.get(f'{key}:{int(index)}', 0)
+            if previous * (1 - elapsed / window) + current >= limit:
+                wait = max(wait, _wait(previous, current, limit, elapsed, window))
+        if wait:
+            login_attempts.inc(result='throttled')
+            raise Throttled(
+                wait=wait,
+                detail=f'Слишком много неудачных попыток входа, повторите через {wait} сек.'
+            )
+
+    def failed(self, request, email):
+        """Учитывает неудачную попытку входа"""
+        window = self.window
+        index = int(time.time() // window)
+        for key, _ in self._scopes(request, email):
+            key = f'{key}:{index}'
+            # Счётчик нужен ещё одно окно - как прошлое окно для следующего
+            self.cache.add(key, 0, timeout=2 * window)
+            try:
+                self.cache.incr(key)
+            except ValueError:  # ключ успел истечь между add и incr
+                self.cache.set(key, 1, timeout=2 * window)
+
+    async def acheck(self, request, email):
+        await sync_to_async(self.check)(request, email)
+
+    async def afailed(self, request, email):
+        await sync_to_async(self.failed)(request, email)
+
+
+def _wait(previous, current, limit, elapsed, window):
+    """Через сколько секунд оценка попыток опустится ниже лимита"""
+    if current < limit:
+        # Ждём, пока вклад прошлого окна уменьшится достаточно
+        fraction = 1 - (limit - current) / previous
+        return max(1, math.ceil(fraction * window - elapsed))
+    # До конца текущего окна, затем пока его вклад не уменьшится
+    fraction = 1 - limit / current if current else 0
+    return max(1, math.ceil(window - elapsed + fraction * window))
+
+
+def login_email(data):
+    """Email из тела запроса входа - до валидации сериализатором"""
+    email = data.get('email') if hasattr(data, 'get') else None
+    return email.strip().lower() if isinstance(email, str) else ''
+
+
+login_throttle = LoginThrottle()
@@ -0,0 +1,97 @@
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from auth_system.cache import permission_cache
+from .revocation import revoked_tokens
+
+
+class RevokedTokenError(TokenError):
+    """Токен подписан верно и не истёк, но отозван"""
+
+
+class RevocationCheckMixin:
+    """Проверка токена по списку отозванных (users.revocation), без БД"""
+
+    def set_iat(self, claim='iat', at_time=None):
+        # Время выпуска с долями секунды: отзыв "всех токенов до момента X"
+        # сравнивает его с X, и токен, выданный сразу после отзыва, жив
+        self.payload[claim] = (at_time or self.current_time).timestamp()
+
+    def verify(self):
+        super().verify()
+        if revoked_tokens.is_revoked(self.payload):
+            raise RevokedTokenError('Токен отозван')
+
+
+class RevocableAccessToken(RevocationCheckMixin, AccessToken):
+    """Access-токен API (SIMPLE_JWT["AUTH_TOKEN_CLASSES"])"""
+
+
+class RevocableRefreshToken(RevocationCheckMixin, RefreshToken):
+    access_token_class = RevocableAccessToken
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        # Иначе access унаследует iat refresh-токена
+        access.set_iat()
+        return access
+
+
+def add_permission_claims(token, user):
+    """
+    Добавляет в access-токен роль пользователя, маску её разрешений
+    и версию маски, по которой HasPermission определяет устаревание
+    """
+    token['role_id'] = user.role_id
+    if user.role_id is not None:
+        _set_permission_claims(token, permission_cache.get(user.role_id))
+    return token
+
+
+async def aadd_permission_claims(token, user):
+    token['role_id'] = user.role_id
+    if user.role_id is not None:
+        _set_permission_claims(token, await permission_cache.aget(user.role_id))
+    return token
+
+
+def _set_permission_claims(token, role_permissions):
+    token['perm_mask'] = format(role_permissions.mask, 'x')
+    token['perm_ver'] = role_permissions.version
+
+
+def issue_tokens(user):
+    """Выпускает пару refresh/access токенов для пользователя"""
+    refresh = RevocableRefreshToken.for_user(user)
+    access = add_permission_claims(refresh.access_token, user)
+    return {
+        "refresh": str(refresh),
+        "access": str(access),
+    }
+
+
+async def aissue_tokens(user):
+    refresh = RevocableRefreshToken.for_user(user)
+    access = await aadd_permission_claims(refresh.access_token, user)
+    return {
+        "refresh": str(refresh),
+        "access": str(access),
+    }
+
+
+def revoke_logout_tokens(user, access, raw_refresh=None):
+    """
+    Выход с JWT: отзывает access-токен запроса и refresh-токен из тела
+    запроса, если он выдан тому же пользователю
+    """
+    if access is not None:
+        revoked_tokens.revoke_token(access)
+    if raw_refresh:
+        try:
+            refresh = RevocableRefreshToken(raw_refresh)
+        except TokenError:
+            return
+        if str(refresh.get(api_settings.USER_ID_CLAIM)) == str(user.pk):
+            revoked_tokens.revoke_token(refresh)
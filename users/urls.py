@@ -4,7 +4,10 @@ from . import views
 urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),      # ← ЭТА СТРОКА
+    path('token/', views.token_obtain_view, name='token-obtain'),
+    path('token/refresh/', views.token_refresh_view, name='token-refresh'),
     path('logout/', views.logout_view, name='logout'),
+    path('logout/all/', views.logout_all_view, name='logout-all'),
     path('profile/', views.profile_view, name='profile'),
     path('profile/update/', views.update_profile_view, name='update-profile'),
     path('profile/delete/', views.delete_account_view, name='delete-account'),
@@ -4,22 +4,53 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import login, logout
 from django.views.decorators.csrf import csrf_exempt
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
+from .authentication import get_model_user
+from .backends import SESSION_BACKEND
+from .models import User
+from .sessions import end_user_sessions
 from .serializers import (
     RegisterSerializer, 
     LoginSerializer, 
     UserProfileSerializer,
     UserUpdateSerializer
 )
+from .revocation import revoked_tokens
+from .throttling import login_email, login_throttle
+from .tokens import (
+    RevocableRefreshToken,
+    add_permission_claims,
+    issue_tokens,
+    revoke_logout_tokens,
+)
+from utils.instrumentation import query_budget
 from utils.permissions import HasPermission 
 
+# Описание формы входа (GET /api/login/)
+LOGIN_DESCRIPTION = {
+    "description": "Эндпоинт для входа в систему",
+    "method": "POST",
+    "required_fields": {
+        "email": "string",
+        "password": "string"
+    },
+    "example": {
+        "email": "user@example.com",
+        "password": "your_password"
+    }
+}
+
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([HasPermission('user.read')])
 def profile_view(request):
     """Получить профиль текущего пользователя (требуется user.read)"""
-    serializer = UserProfileSerializer(request.user)
+    serializer = UserProfileSerializer(get_model_user(request))
     return Response(serializer.data)
 
+@query_budget(2)
 @csrf_exempt
 @api_view(['POST'])
 def register_view(request):
@@ -55,6 +86,7 @@ def register_view(request):
     # Если данные невалидные, возвращаем ошибки
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@query_budget(10)
 @csrf_exempt
 @api_view(['GET','POST'])
 def login_view(request):
@@ -71,18 +103,7 @@ def login_view(request):
     }
     """
     if request.method == 'GET':
-        return Response({
-            "description": "Эндпоинт для входа в систему",
-            "method": "POST",
-            "required_fields": {
-                "email": "string",
-                "password": "string"
-            },
-            "example": {
-                "email": "user@example.com",
-                "password": "your_password"
-            }
-        })
+        return Response(LOGIN_DESCRIPTION)
     # Если пользователь уже авторизован
     if request.user.is_authenticated:
         return Response(
@@ -90,13 +111,17 @@ def login_view(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    # Перебор паролей отсекается до поиска пользователя и хеширования
+    email = login_email(request.data)
+    login_throttle.check(request, email)
+    
     serializer = LoginSerializer(data=request.data)
     
     if serializer.is_valid():
         user = serializer.validated_data['user']
         
         # СОЗДАЁМ СЕССИЮ - это и есть "логин" в Django
-        login(request, user)
+        login(request, user, backend=SESSION_BACKEND)
         
         return Response({
             "message": "Вход выполнен успешно",
@@ -108,15 +133,80 @@ def login_view(request):
             }
         })
     
+    login_throttle.failed(request, email)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@query_budget(1)
+@csrf_exempt
+@api_view(['POST'])
+def token_obtain_view(request):
+    """
+    Выдача JWT-токенов
+    Пример запроса:
+    POST /api/token/
+    {
+        "email": "test@example.com",
+        "password": "StrongPass123"
+    }
+    Access-токен короткоживущий и содержит id пользователя, id роли
+    и версию разрешений роли - права проверяются без запросов к БД.
+    Неудачные попытки ограничены так же, как у входа (users.throttling).
+    """
+    email = login_email(request.data)
+    login_throttle.check(request, email)
+    
+    serializer = LoginSerializer(data=request.data)
+    
+    if serializer.is_valid():
+        return Response(issue_tokens(serializer.validated_data['user']))
+    
+    login_throttle.failed(request, email)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@query_budget(1)
+@csrf_exempt
+@api_view(['POST'])
+def token_refresh_view(request):
+    """
+    Обновление access-токена по refresh-токену
+    Пример запроса:
+    POST /api/token/refresh/
+    {
+        "refresh": "<refresh_token>"
+    }
+    Роль и разрешения перечитываются, поэтому новый токен всегда актуален.
+    Отозванный refresh-токен (выход, деактивация) не принимается.
+    """
+    revoked_tokens.refresh_if_needed()
+    try:
+        refresh = RevocableRefreshToken(request.data.get('refresh', ''))
+    except TokenError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    user = User.objects.filter(
+        pk=refresh[jwt_settings.USER_ID_CLAIM],
+        is_active=True
+    ).first()
+    if user is None:
+        return Response(
+            {"detail": "Пользователь не найден или деактивирован"},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    
+    access = add_permission_claims(refresh.access_token, user)
+    return Response({"access": str(access)})
+
+@query_budget(4)
 @csrf_exempt
 @api_view(['POST'])
 def logout_view(request):
     """
     Выход из системы
+    С JWT отзываются access-токен запроса и refresh-токен,
+    если он передан в теле: {"refresh": "<refresh_token>"}
     """
     if request.user.is_authenticated:
+        revoke_logout_tokens(request.user, request.auth, request.data.get('refresh'))
         # УДАЛЯЕМ СЕССИЮ - это и есть "логаут" в Django
         logout(request)
         return Response({"message": "Выход выполнен успешно"})
@@ -126,13 +216,32 @@ def logout_view(request):
         status=status.HTTP_400_BAD_REQUEST
     )
 
+@query_budget(7)
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_all_view(request):
+    """
+    Выход на всех устройствах: завершает все сессии пользователя,
+    включая текущую, и отзывает все выданные ему JWT
+    """
+    ended = end_user_sessions([request.user.pk])
+    revoked_tokens.revoke_user_tokens([request.user.pk])
+    logout(request)
+    return Response({
+        "message": "Выход выполнен на всех устройствах",
+        "sessions_ended": ended
+    })
+
+@query_budget(3)
 @csrf_exempt
 @api_view(['PUT', 'PATCH'])
 @permission_classes([IsAuthenticated])
 def update_profile_view(request):
     """Обновить профиль пользователя"""
+    user = get_model_user(request)
     serializer = UserUpdateSerializer(
-        request.user, 
+        user, 
         data=request.data, 
         partial=True  # разрешаем частичное обновление (для PATCH)
     )
@@ -141,21 +250,23 @@ def update_profile_view(request):
         serializer.save()
         return Response({
             "message": "Профиль обновлён",
-            "user": UserProfileSerializer(request.user).data
+            "user": UserProfileSerializer(user).data
         })
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@query_budget(8)
 @csrf_exempt
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_account_view(request):
     """Мягкое удаление аккаунта"""
-    user = request.user
+    user = get_model_user(request)
     
-    # 1. Помечаем как неактивного
+    # 1. Помечаем как неактивного (это завершает все сессии пользователя);
+    # пишутся только изменённые поля, а не вся строка
     user.is_active = False
-    user.save()
+    user.save(update_fields=['is_active', 'updated_at'])
     
     # 2. Выходим из системы
     logout(request)
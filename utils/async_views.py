@@ -0,0 +1,140 @@
+import json
+from functools import wraps
+from io import BytesIO
+
+from django.http import Http404, JsonResponse, QueryDict
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.authentication import CSRFCheck
+from rest_framework.permissions import SAFE_METHODS
+
+from users.authentication import JWTAuthentication
+
+
+_jwt_authentication = JWTAuthentication()
+
+
+def json_response(data, status=200, headers=None):
+    """JSON-ответ с кириллицей как есть (как JSONRenderer в DRF)"""
+    return JsonResponse(
+        data,
+        status=status,
+        headers=headers,
+        safe=False,
+        json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def async_api_view(methods, permission_classes=()):
+    """
+    Аналог @api_view + @permission_classes для нативных async-вьюх.
+    Пример использования:
+
+        @async_api_view(['GET'], [HasPermission('article.read')])
+        async def article_list(request):
+            return json_response({...})
+
+    Аутентификация: JWT (без БД) или сессия через request.auser().
+    Права проверяются через ahas_permission, если он есть у класса.
+    Тело JSON/формы доступно в request.data, ошибки DRF (APIException)
+    превращаются в JSON-ответы с тем же статусом.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response(
+                    {"detail": f'Метод "{request.method}" не разрешён.'},
+                    status=405
+                )
+            try:
+                await _authenticate(request)
+                await _check_permissions(request, permission_classes)
+                request.data = _parse_body(request)
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return _exception_response(request, exc)
+            except Http404:
+                return json_response({"detail": "Не найдено."}, status=404)
+
+        # CSRF проверяется в _authenticate только для сессий, как в DRF
+        return csrf_exempt(wrapper)
+    return decorator
+
+
+async def _authenticate(request):
+    result = await _jwt_authentication.aauthenticate(request)
+    if result is not None:
+        request.user, request.auth = result
+        return
+
+    request.user = await request.auser()
+    request.auth = None
+    if request.user.is_authenticated and request.method not in SAFE_METHODS:
+        _enforce_csrf(request)
+
+
+def _enforce_csrf(request):
+    check = CSRFCheck(lambda request: None)
+    check.process_request(request)
+    reason = check.process_view(request, None, (), {})
+    if reason:
+        raise exceptions.PermissionDenied(f'CSRF Failed: {reason}')
+
+
+async def _check_permissions(request, permission_classes):
+    for permission in permission_classes:
+        permission = permission()
+        if hasattr(permission, 'ahas_permission'):
+            allowed = await permission.ahas_permission(request, None)
+        else:
+            allowed = permission.has_permission(request, None)
+
+        if not allowed:
+            if not request.user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            raise exceptions.PermissionDenied(
+                detail=getattr(permission, 'message', None)
+            )
+
+
+def _parse_body(request):
+    """
+    Тело запроса: JSON или форма (urlencoded, multipart) при любом методе,
+    как парсеры DRF по умолчанию. Другой тип содержимого - ответ 415
+    """
+    if request.method in SAFE_METHODS or request.method == 'DELETE':
+        return {}
+    content_type = request.content_type
+    if content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError as exc:
+            raise exceptions.ParseError(f'JSON parse error - {exc}')
+    if content_type in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+        if request.method == 'POST':
+            return request.POST
+        # Django заполняет request.POST только для POST - PUT/PATCH разбираем сами
+        if content_type == 'multipart/form-data':
+            data, _files = request.parse_file_upload(request.META, BytesIO(request.body))
+            return data
+        return QueryDict(request.body, encoding=request.encoding)
+    if not request.body:
+        return {}
+    raise exceptions.UnsupportedMediaType(content_type)
+
+
+def _exception_response(request, exc):
+    headers = {}
+    status = exc.status_code
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        status = 401
+        headers['WWW-Authenticate'] = _jwt_authentication.authenticate_header(request)
+    if getattr(exc, 'wait', None):
+        headers['Retry-After'] = '%d' % exc.wait
+
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {"detail": exc.detail}
+    return json_response(data, status=status, headers=headers)
@@ -0,0 +1,271 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from utils.metrics import http_request_duration, http_requests, query_budget_exceeded
+
+
+logger = logging.getLogger(__name__)
+
+# Метрики текущего запроса. ContextVar копируется в потоки sync_to_async,
+# поэтому запросы к БД из async-вьюх тоже попадают в свой запрос
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Замеры одного запроса: время целиком и по слоям, SQL и размер ответа"""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.view = None
+        self.query_budget = None
+        self.query_budget_per_chunk = 0
+        self.chunks = 0
+        self.cache_loads = 0
+        self.status = None
+        self.started_at = time.time()
+        self.total = 0.0
+        self.timings = {'permission': 0.0, 'hashing': 0.0}
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.response_bytes = None
+
+    def as_dict(self):
+        return {
+            'timestamp': round(self.started_at, 3),
+            'method': self.method,
+            'path': self.path,
+            'view': self.view,
+            'status': self.status,
+            'total_ms': _ms(self.total),
+            'permission_ms': _ms(self.timings['permission']),
+            'hashing_ms': _ms(self.timings['hashing']),
+            'sql_count': self.sql_count,
+            'sql_ms': _ms(self.sql_time),
+            'query_budget': self.effective_query_budget(),
+            'chunks': self.chunks,
+            'cache_loads': self.cache_loads,
+            'response_bytes': self.response_bytes,
+        }
+
+    def effective_query_budget(self):
+        """Бюджет запроса с учётом обработанных пачек (см. query_budget)"""
+        if self.query_budget is None:
+            return None
+        return self.query_budget + self.query_budget_per_chunk * max(self.chunks - 1, 0)
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing"""
+        return ', '.join([
+            f'total;dur={_ms(self.total)}',
+            f'db;dur={_ms(self.sql_time)};desc="{self.sql_count} queries"',
+            f'perm;dur={_ms(self.timings["permission"])}',
+            f'hash;dur={_ms(self.timings["hashing"])}',
+        ])
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def query_budget(max_queries, per_chunk=0):
+    """
+    Объявляет, сколько SQL-запросов вьюха может сделать за запрос
+    (вместе с аутентификацией и проверкой прав при тёплом кэше).
+    Ставится над остальными декораторами:
+
+        @query_budget(2)
+        @api_view(['GET'])
+        @permission_classes([HasPermission('user.read')])
+        def profile_view(request):
+
+    Вьюхи, которые обрабатывают данные пачками, объявляют бюджет одной пачки
+    в max_queries и сколько добавляет каждая следующая в per_chunk,
+    а о каждой пачке сообщают через count_chunk().
+
+    Бюджет проверяется тестами (utils.testing.QueryBudgetTestMixin),
+    а в работе PerformanceMiddleware пишет предупреждение в лог,
+    если QUERY_BUDGET_WARNINGS включён и бюджет превышен.
+    Запросы, которые заполняли кэш (сессии, разрешения ролей, биты
+    разрешений, отзывы токенов - см. count_cache_load()), не проверяются:
+    бюджет рассчитан на тёплые кэши.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        view.query_budget_per_chunk = per_chunk
+        return view
+    return decorator
+
+
+def count_chunk():
+    """Отмечает обработанную пачку для бюджета текущего запроса"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.chunks += 1
+
+
+def count_cache_load():
+    """Отмечает, что текущий запрос читает из БД данные для кэша"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_loads += 1
+
+
+def current_metrics():
+    """Метрики текущего запроса или None вне запроса"""
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """
+    Засекает время блока и добавляет его к метрике name текущего запроса.
+    Вне запроса (команды, shell) ничего не делает.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] = metrics.timings.get(name, 0.0) + time.perf_counter() - started
+
+
+class RecentRequests:
+    """Кольцевой буфер последних запросов (PERF_RECENT_REQUESTS штук)"""
+
+    def __init__(self):
+        self._items = None
+        self._lock = threading.Lock()
+
+    def append(self, metrics):
+        if self._items is None:
+            with self._lock:
+                if self._items is None:
+                    self._items = deque(maxlen=getattr(settings, 'PERF_RECENT_REQUESTS', 500))
+        self._items.append(metrics)
+
+    def snapshot(self, limit=None):
+        """Последние запросы, новые первыми"""
+        items = list(self._items or ())
+        items.reverse()
+        return [m.as_dict() for m in items[:limit]]
+
+    def clear(self):
+        if self._items is not None:
+            self._items.clear()
+
+
+recent_requests = RecentRequests()
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += time.perf_counter() - started
+        metrics.sql_count += 1
+
+
+def _install_sql_wrapper(connection):
+    # Соединение может переоткрываться - обёртку ставим один раз
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install_sql_wrapper(connection)
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет каждый запрос: общее время, время проверки прав (HasPermission),
+    хеширования паролей, число и время SQL-запросов и размер ответа.
+    Результат отдаётся в заголовке Server-Timing (если PERF_SERVER_TIMING)
+    и складывается в recent_requests, откуда его читает
+    GET /api/admin/perf/requests/.
+    Превышение бюджета запросов вьюхи (@query_budget) попадает в лог.
+    Должен стоять первым в MIDDLEWARE, чтобы учитывать всю обработку.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+        connection_created.connect(_on_connection_created, dispatch_uid='perf_sql_wrapper')
+        for connection in connections.all(initialized_only=True):
+            _install_sql_wrapper(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics(request.method, request.path)
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics(request.method, request.path)
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.query_budget = getattr(view_func, 'query_budget', None)
+            metrics.query_budget_per_chunk = getattr(view_func, 'query_budget_per_chunk', 0)
+
+    def _finish(self, request, response, metrics, started):
+        metrics.total = time.perf_counter() - started
+        metrics.status = response.status_code
+        if request.resolver_match is not None:
+            metrics.view = request.resolver_match.view_name
+        if not response.streaming:
+            metrics.response_bytes = len(response.content)
+
+        view = metrics.view or 'unmatched'
+        http_requests.inc(view=view, method=metrics.method, status=metrics.status)
+        http_request_duration.observe(metrics.total, view=view)
+        budget = metrics.effective_query_budget()
+        # На холодном кэше запросов больше, чем заложено в бюджет
+        if budget is not None and not metrics.cache_loads and metrics.sql_count > budget:
+            query_budget_exceeded.inc(view=view)
+            if getattr(settings, 'QUERY_BUDGET_WARNINGS', True):
+                logger.warning(
+                    'Вьюха %s сделала %d SQL-запросов при бюджете %d (%s %s)',
+                    view, metrics.sql_count, budget,
+                    metrics.method, metrics.path
+                )
+
+        if getattr(settings, 'PERF_SERVER_TIMING', True):
+            response['Server-Timing'] = metrics.server_timing()
+        recent_requests.append(metrics)
+        return response
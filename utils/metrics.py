@@ -0,0 +1,282 @@
+import atexit
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.throttling import BaseThrottle
+
+
+class MetricsStore:
+    """
+    Значения метрик процесса: (имя, значения меток) → число для счётчиков
+    или список [корзины..., +Inf, сумма] для гистограмм.
+    Раз в METRICS_FLUSH_INTERVAL секунд и при выходе значения
+    записываются в METRICS_DIR/<pid>.json; /metrics складывает файлы
+    всех процессов, поэтому несколько воркеров на одном хосте
+    дают общую картину.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._last_flush = time.monotonic()
+
+    @property
+    def directory(self):
+        return Path(getattr(settings, 'METRICS_DIR', settings.BASE_DIR / 'run' / 'metrics'))
+
+    @property
+    def path(self):
+        return self.directory / f'{os.getpid()}.json'
+
+    def inc(self, key, amount=1):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.maybe_flush()
+
+    def observe(self, key, index, size, value):
+        with self._lock:
+            buckets = self._values.get(key)
+            if buckets is None:
+                buckets = self._values[key] = [0] * (size + 1)
+            buckets[index] += 1
+            buckets[-1] += value
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            self.flush()
+
+    def flush(self):
+        """Атомарно записывает значения процесса в его файл"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._loaded:
+                self._load_previous()
+            data = [[name, list(labels), value] for (name, labels), value in self._values.items()]
+        if not data:
+            return
+
+        path = self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _load_previous(self):
+        # pid мог достаться от завершившегося процесса: продолжаем его
+        # значения, иначе счётчики в сумме по процессам уменьшились бы
+        self._loaded = True
+        for key, value in _read(self.path):
+            self._values[key] = _add(self._values.get(key), value)
+
+    def reset(self):
+        """Сбрасывает значения (после fork значения родителя не наследуются)"""
+        self._values = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._last_flush = time.monotonic()
+
+    def collect(self):
+        """Сумма значений всех процессов, записавших файлы в METRICS_DIR"""
+        self.flush()
+        merged = {}
+        for path in self.directory.glob('*.json'):
+            for key, value in _read(path):
+                merged[key] = _add(merged.get(key), value)
+        return merged
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return [((name, tuple(labels)), value) for name, labels, value in data]
+
+
+def _add(current, value):
+    if current is None:
+        return list(value) if isinstance(value, list) else value
+    if isinstance(value, list):
+        if len(value) != len(current):
+            # Корзины гистограммы поменялись между версиями - старое не складываем
+            return current
+        return [a + b for a, b in zip(current, value)]
+    return current + value
+
+
+store = MetricsStore()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=store.reset)
+atexit.register(store.flush)
+
+# Объявленные метрики: имя → Counter/Histogram
+registry = {}
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry[name] = self
+
+    def inc(self, amount=1, **labels):
+        store.inc((self.name, tuple(str(labels[n]) for n in self.labelnames)), amount)
+
+    def render(self, labels, value):
+        return [f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}']
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (в секундах)"""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        registry[name] = self
+
+    def observe(self, value, **labels):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        store.observe(
+            (self.name, tuple(str(labels[n]) for n in self.labelnames)),
+            index, len(self.buckets) + 1, value
+        )
+
+    def render(self, labels, value):
+        lines = []
+        cumulative = 0
+        names = self.labelnames + ('le',)
+        for bound, count in zip((*self.buckets, '+Inf'), value):
+            cumulative += count
+            le = bound if bound == '+Inf' else _number(bound)
+            lines.append(f'{self.name}_bucket{_labels(names, (*labels, le))} {cumulative}')
+        lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(value[-1])}')
+        lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+HASHING_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+http_requests = Counter(
+    'http_requests_total', 'Обработанные запросы',
+    ('view', 'method', 'status')
+)
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса',
+    ('view',), LATENCY_BUCKETS
+)
+login_attempts = Counter(
+    'auth_login_attempts_total', 'Попытки входа по результату',
+    ('result',)
+)
+password_hash_duration = Histogram(
+    'auth_password_hash_duration_seconds', 'Время хеширования пароля в пуле',
+    ('operation',), HASHING_BUCKETS
+)
+permission_checks = Counter(
+    'rbac_permission_checks_total', 'Решения HasPermission по разрешениям',
+    ('codename', 'decision')
+)
+cache_requests = Counter(
+    'cache_requests_total', 'Обращения к процессным кэшам',
+    ('cache', 'result')
+)
+query_budget_exceeded = Counter(
+    'query_budget_exceeded_total', 'Запросы, превысившие бюджет SQL-запросов вьюхи',
+    ('view',)
+)
+rbac_refresh_failures = Counter(
+    'rbac_cache_refresh_failures_total', 'Неудачные загрузки разрешений ролей из БД',
+    ('reason',)
+)
+rbac_stale_decisions = Counter(
+    'rbac_stale_decisions_total',
+    'Проверки прав по последним известным разрешениям (деградированный режим)'
+)
+
+
+def render():
+    """Метрики всех процессов в текстовом формате Prometheus"""
+    grouped = {}
+    for (name, labels), value in sorted(store.collect().items()):
+        grouped.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, metric in registry.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for labels, value in grouped.get(name, ()):
+            if len(labels) == len(metric.labelnames):
+                lines.extend(metric.render(labels, value))
+    return '\n'.join(lines) + '\n'
+
+
+def client_ip(request):
+    """
+    Адрес клиента с учётом доверенных прокси (REST_FRAMEWORK["NUM_PROXIES"]),
+    как у троттлинга DRF: за прокси REMOTE_ADDR - адрес самого прокси
+    """
+    return BaseThrottle().get_ident(request)
+
+
+def _client_allowed(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if not hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return False
+    try:
+        address = ipaddress.ip_address(client_ip(request))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    )
+
+
+def metrics_view(request):
+    """
+    GET /metrics - только с адресов из METRICS_ALLOWED_IPS
+    и, если задан METRICS_TOKEN, с заголовком Authorization: Bearer <токен>
+    """
+    if not _client_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using='default'):
+    """
+    Примерное число строк таблицы модели по статистике СУБД
+    (PostgreSQL - pg_class.reltuples, MySQL - information_schema).
+    None, если СУБД оценку не даёт или статистика ещё не собрана.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)'
+    elif connection.vendor == 'mysql':
+        sql = (
+            'SELECT table_rows FROM information_schema.tables '
+            'WHERE table_schema = DATABASE() AND table_name = %s'
+        )
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    # reltuples = -1 у таблиц, по которым ещё не было ANALYZE
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для списков в админке по большим таблицам.
+    Для queryset без фильтров вместо COUNT(*) по всей таблице берёт
+    оценку числа строк из статистики СУБД. Если оценка меньше
+    ADMIN_ESTIMATED_COUNT_THRESHOLD (маленькие таблицы, где COUNT дешёвый
+    и точность заметна) или недоступна (SQLite) - считает как обычно.
+    Отфильтрованные списки (поиск, фильтры) всегда считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where and not query.distinct:
+            estimate = estimated_row_count(self.object_list.model, self.object_list.db)
+            threshold = getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000)
+            if estimate is not None and estimate >= threshold:
+                return estimate
+        return super().count
@@ -1,53 +1,127 @@
 from rest_framework.permissions import BasePermission
 from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
 
+from auth_system.cache import permission_cache, permission_bits
+from utils.instrumentation import timed
+from utils.metrics import permission_checks
+
+
+def get_role_permissions(user):
+    """
+    Разрешения роли пользователя (RolePermissions) в рамках запроса.
+    Объект user живёт один запрос, поэтому результат запоминается на нём:
+    любое число проверок прав за запрос обращается к кэшу один раз.
+    """
+    role_permissions = getattr(user, '_role_permissions', None)
+    if role_permissions is None:
+        role_permissions = permission_cache.get(user.role_id)
+        user._role_permissions = role_permissions
+    return role_permissions
+
+
+async def aget_role_permissions(user):
+    role_permissions = getattr(user, '_role_permissions', None)
+    if role_permissions is None:
+        role_permissions = await permission_cache.aget(user.role_id)
+        user._role_permissions = role_permissions
+    return role_permissions
+
 
 class HasPermission(BasePermission):
     """
     Проверяет, есть ли у пользователя указанное разрешение.
     Пример использования: @permission_classes([HasPermission('user.read')])
+    Для async-вьюх (utils.async_views) используется ahas_permission.
     """
-    
+
     def __init__(self, permission_codename):
         self.permission_codename = permission_codename
-    
+        # (поколение реестра битов, 1 << bit) - кодовое имя переводится
+        # в бит один раз и пересчитывается только при изменении разрешений
+        self._resolved = (None, 0)
+
+    @property
+    def flag(self):
+        """Бит разрешения в маске роли (0, если разрешения нет в БД)"""
+        generation, flag = self._resolved
+        if generation != permission_bits.generation:
+            generation = permission_bits.generation
+            flag = permission_bits.flag_for(self.permission_codename)
+            self._resolved = (generation, flag)
+        return flag
+
+    async def aflag(self):
+        generation, flag = self._resolved
+        if generation != permission_bits.generation:
+            generation = permission_bits.generation
+            flag = await permission_bits.aflag_for(self.permission_codename)
+            self._resolved = (generation, flag)
+        return flag
+
     def has_permission(self, request, view):
+        with timed('permission'):
+            # 1-3. Аутентификация, активность и наличие роли
+            self._check_user(request.user)
+
+            # 4. Маска из токена, если её версия актуальна, иначе маска роли
+            #    (загружается один раз за запрос)
+            role_mask = permission_cache.claims_mask(
+                request.user.role_id, getattr(request.user, 'permission_claims', None)
+            )
+            if role_mask is None:
+                role_mask = get_role_permissions(request.user).mask
+
+            # 5-6. Проверяем, есть ли нужное разрешение
+            return self._check_mask(role_mask, self.flag)
+
+    async def ahas_permission(self, request, view):
+        """То же, что has_permission, но без блокирующих запросов к БД"""
+        with timed('permission'):
+            self._check_user(request.user)
+
+            role_mask = permission_cache.claims_mask(
+                request.user.role_id, getattr(request.user, 'permission_claims', None)
+            )
+            if role_mask is None:
+                role_mask = (await aget_role_permissions(request.user)).mask
+
+            return self._check_mask(role_mask, await self.aflag())
+
+    def _check_user(self, user):
         # 1. Проверяем аутентификацию
-        if not request.user.is_authenticated:
+        if not user.is_authenticated:
             raise AuthenticationFailed(
                 detail="Требуется авторизация",
                 code=401
             )
-        
+
         # 2. Проверяем активен ли пользователь
-        if not request.user.is_active:
+        if not user.is_active:
             raise AuthenticationFailed(
                 detail="Аккаунт деактивирован",
                 code=401
             )
-        
+
         # 3. Если у пользователя нет роли - доступ запрещён
-        if not request.user.role:
+        if user.role_id is None:
             raise PermissionDenied(
                 detail="У пользователя не назначена роль",
                 code=403
             )
-        
-        # 4. Получаем все разрешения роли пользователя
-        user_permissions = request.user.role.role_permissions.values_list(
-            'permission__codename', flat=True
-        )
-        
+
+    def _check_mask(self, role_mask, flag):
         # 5. Проверяем, есть ли нужное разрешение
-        if self.permission_codename in user_permissions:
+        if role_mask & flag:
+            permission_checks.inc(codename=self.permission_codename, decision='allow')
             return True
-        
+        permission_checks.inc(codename=self.permission_codename, decision='deny')
+
         # 6. Если разрешения нет - доступ запрещён
         raise PermissionDenied(
             detail=f"Требуется разрешение: {self.permission_codename}",
             code=403
         )
-    
+
     def __call__(self):
         """Позволяет использовать класс как вызываемый объект"""
-        return self
\ No newline at end of file
+        return self
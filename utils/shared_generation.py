@@ -0,0 +1,212 @@
+import mmap
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+
+def _runtime_path(filename):
+    runtime_dir = getattr(settings, 'RUNTIME_DIR', settings.BASE_DIR / 'run')
+    return Path(runtime_dir) / filename
+
+
+def _map_file(path, size):
+    """
+    Открывает файл (создаёт, если нет) и отображает его в память.
+    Новый файл получает размер size байт, уже созданный другим процессом
+    отображается как есть. Возвращает (fd, mmap)
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    if os.fstat(fd).st_size < 8:
+        os.ftruncate(fd, size)
+    return fd, mmap.mmap(fd, os.fstat(fd).st_size)
+
+
+class SharedGeneration:
+    """
+    Номер поколения, общий для всех процессов на одном хосте.
+    Хранится в 8 байтах файла RUNTIME_DIR/<name>.generation, отображённого
+    в память (mmap): чтение - это сравнение одного целого без системных
+    вызовов и запросов к БД.
+
+    Процесс, изменивший данные, вызывает bump(); остальные периодически
+    вызывают changed() и сбрасывают свои кэши, если поколение сменилось.
+    """
+
+    def __init__(self, name, interval_setting, default_interval=0.1):
+        self.name = name
+        # Имя настройки с периодом проверки (сек) - читается при каждой проверке
+        self._interval_setting = interval_setting
+        self._default_interval = default_interval
+        self._map = None
+        self._fd = None
+        self._seen = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return _runtime_path(f'{self.name}.generation')
+
+    @property
+    def check_interval(self):
+        return getattr(settings, self._interval_setting, self._default_interval)
+
+    def _open(self):
+        with self._lock:
+            if self._map is None:
+                self._fd, self._map = _map_file(self.path, 8)
+        return self._map
+
+    @property
+    def value(self):
+        """Текущее поколение"""
+        mm = self._map if self._map is not None else self._open()
+        return int.from_bytes(mm[:8], 'little')
+
+    def bump(self):
+        """Увеличивает поколение на 1 (атомарно между процессами)"""
+        mm = self._map if self._map is not None else self._open()
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                value = int.from_bytes(mm[:8], 'little') + 1
+                mm[:8] = value.to_bytes(8, 'little')
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+            # Своё изменение процесс уже учёл сам - если между
+            # проверками не было чужих, повторно сбрасывать нечего
+            if self._seen == value - 1:
+                self._seen = value
+        return value
+
+    def changed(self):
+        """
+        True, если с прошлой проверки поколение сменилось.
+        Файл читается не чаще раза в check_interval секунд.
+        Первый вызов только запоминает текущее поколение.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+
+        value = self.value
+        if value == self._seen:
+            return False
+        first = self._seen is None
+        self._seen = value
+        return not first
+
+
+class SharedTombstones:
+    """
+    Журнал удалённых ключей, общий для всех процессов на одном хосте:
+    кольцевой буфер в файле RUNTIME_DIR/<name>.tombstones, отображённом
+    в память. Заголовок - 8 байт с числом записанных ключей, за ним
+    ячейки по KEY_SIZE байт (число ячеек - настройка slots_setting).
+
+    Процесс, удаливший ключи, вызывает add(); остальные периодически
+    вызывают collect() и убирают из своих кэшей только эти ключи.
+    Если процесс отстал больше чем на число ячеек, часть ключей уже
+    перезаписана - collect() возвращает None, и кэш сбрасывается целиком.
+    """
+    KEY_SIZE = 40
+
+    def __init__(self, name, interval_setting, slots_setting,
+                 default_interval=0.1, default_slots=4096):
+        self.name = name
+        self._interval_setting = interval_setting
+        self._default_interval = default_interval
+        self._slots_setting = slots_setting
+        self._default_slots = default_slots
+        self._map = None
+        self._fd = None
+        self._slots = None
+        self._seen = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return _runtime_path(f'{self.name}.tombstones')
+
+    @property
+    def check_interval(self):
+        return getattr(settings, self._interval_setting, self._default_interval)
+
+    def _open(self):
+        with self._lock:
+            if self._map is None:
+                slots = getattr(settings, self._slots_setting, self._default_slots)
+                self._fd, self._map = _map_file(self.path, 8 + slots * self.KEY_SIZE)
+                # Число ячеек - по файлу: его мог создать процесс с другой настройкой
+                self._slots = (len(self._map) - 8) // self.KEY_SIZE
+        return self._map
+
+    @property
+    def count(self):
+        """Сколько ключей записано за всё время"""
+        mm = self._map if self._map is not None else self._open()
+        return int.from_bytes(mm[:8], 'little')
+
+    def add(self, keys):
+        """Записывает удалённые ключи (атомарно между процессами)"""
+        keys = [key.encode()[:self.KEY_SIZE].ljust(self.KEY_SIZE, b'\0') for key in keys]
+        if not keys:
+            return
+        mm = self._map if self._map is not None else self._open()
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                start = int.from_bytes(mm[:8], 'little')
+                for i, key in enumerate(keys):
+                    offset = 8 + (start + i) % self._slots * self.KEY_SIZE
+                    mm[offset:offset + self.KEY_SIZE] = key
+                # Счётчик - после ключей: читатель не увидит пустых ячеек
+                mm[:8] = (start + len(keys)).to_bytes(8, 'little')
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+            # Свои ключи процесс уже убрал сам
+            if self._seen == start:
+                self._seen = start + len(keys)
+
+    def collect(self):
+        """
+        Ключи, удалённые другими процессами с прошлой проверки, или None,
+        если их больше, чем помещается в буфер. Файл читается не чаще раза
+        в check_interval секунд. Первый вызов только запоминает позицию.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return []
+        self._checked_at = now
+
+        mm = self._map if self._map is not None else self._open()
+        count = self.count
+        seen, self._seen = self._seen, count
+        if seen is None or count == seen:
+            return []
+        if count - seen > self._slots:
+            return None
+
+        keys = []
+        for position in range(seen, count):
+            offset = 8 + position % self._slots * self.KEY_SIZE
+            keys.append(mm[offset:offset + self.KEY_SIZE].rstrip(b'\0').decode())
+        # Пока ключи читались, их ячейки могли перезаписать
+        if self.count - seen > self._slots:
+            return None
+        return keys
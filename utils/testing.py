@@ -0,0 +1,106 @@
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
+
+from auth_system.cache import permission_bits, permission_cache
+from auth_system.models import Permission, Role, RolePermission
+from users.models import User
+from users.revocation import revoked_tokens
+from utils.instrumentation import recent_requests
+from utils.metrics import store as metrics_store
+
+
+def create_user_with_permissions(email, password, codenames, **extra_fields):
+    """Пользователь с отдельной ролью, которой назначены разрешения codenames"""
+    role = Role.objects.create(name=f'Роль {email}')
+    for codename in codenames:
+        resource, action = codename.split('.')
+        permission, _ = Permission.objects.get_or_create(resource=resource, action=action)
+        RolePermission.objects.create(role=role, permission=permission)
+    return User.objects.create_user(email, password, role=role, **extra_fields)
+
+
+def warm_permission_cache():
+    """
+    Загружает кэши прав и список отозванных токенов заранее,
+    чтобы их запросы не попадали в замеры
+    """
+    revoked_tokens.clear()
+    revoked_tokens.sync()
+    permission_cache.invalidate()
+    permission_bits.invalidate()
+    permission_bits.flag_for('')
+    for role_id in Role.objects.values_list('pk', flat=True):
+        permission_cache.get(role_id)
+
+
+class QueryBudgetTestMixin:
+    """
+    Проверки бюджетов SQL-запросов, объявленных через
+    utils.instrumentation.query_budget
+    """
+
+    def assertViewsHaveQueryBudget(self, urlconf_module):
+        """У каждой вьюхи из urlpatterns модуля объявлен бюджет"""
+        for pattern in urlconf_module.urlpatterns:
+            self.assertIsNotNone(
+                getattr(pattern.callback, 'query_budget', None),
+                f'У вьюхи {pattern.name} не объявлен @query_budget'
+            )
+
+    def assertWithinQueryBudget(self, method, path, **kwargs):
+        """
+        Выполняет запрос тестовым клиентом и сверяет число SQL-запросов с бюджетом.
+        Бюджет берётся из замеров PerformanceMiddleware - с учётом пачек
+        """
+        match = resolve(path.split('?')[0])
+        self.assertIsNotNone(
+            getattr(match.func, 'query_budget', None),
+            f'У вьюхи {match.view_name} не объявлен @query_budget'
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, **kwargs)
+        budget = recent_requests.snapshot(1)[0]['query_budget']
+
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{match.view_name}: {len(queries)} SQL-запросов при бюджете {budget}:\n'
+            + '\n'.join(query['sql'] for query in queries.captured_queries)
+        )
+        return response
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Запуск тестов (TEST_RUNNER): рабочие файлы процессов - общие поколения,
+    метрики, файловые кэши - пишутся во временный каталог, а не в RUNTIME_DIR
+    проекта
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._runtime_dir = tempfile.TemporaryDirectory(prefix='auth-system-tests-')
+        runtime_dir = Path(self._runtime_dir.name)
+        caches = {alias: dict(config) for alias, config in settings.CACHES.items()}
+        for config in caches.values():
+            if config['BACKEND'].endswith('.FileBasedCache'):
+                config['LOCATION'] = runtime_dir / Path(config['LOCATION']).name
+        self._runtime_settings = override_settings(
+            RUNTIME_DIR=runtime_dir,
+            METRICS_DIR=runtime_dir / 'metrics',
+            CACHES=caches,
+        )
+        self._runtime_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        # Метрики тестов не должны попасть в METRICS_DIR проекта при выходе
+        metrics_store.reset()
+        self._runtime_settings.disable()
+        self._runtime_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
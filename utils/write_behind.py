@@ -0,0 +1,137 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, Value, When
+
+
+logger = logging.getLogger(__name__)
+
+
+def update_by_key(model, field, pending, key_field='pk', batch_size=500):
+    """
+    Записывает значения поля field из {ключ: значение} пачками по batch_size:
+    UPDATE ... SET field = CASE key WHEN ... THEN ... END WHERE key IN (...)
+    """
+    output_field = model._meta.get_field(field)
+    items = list(pending.items())
+    for start in range(0, len(items), batch_size):
+        chunk = items[start:start + batch_size]
+        model._base_manager.filter(**{f'{key_field}__in': [key for key, _ in chunk]}).update(**{
+            field: Case(
+                *[When(**{key_field: key}, then=Value(value)) for key, value in chunk],
+                output_field=output_field
+            )
+        })
+
+
+class WriteBehindBuffer:
+    """
+    Отложенная пакетная запись: add(key, value) только запоминает значение
+    (для одного ключа остаётся последнее), а фоновый поток раз в interval
+    секунд передаёт всё накопленное в flush_func({key: value}) одной пачкой.
+
+    Буфер ограничен max_pending ключами: при переполнении поток будится
+    раньше срока. При выходе процесса (atexit) остаток записывается
+    синхронно; после fork буфер дочернего процесса пуст, а поток
+    запускается заново при первой записи.
+
+    Если interval_setting равен 0, буфер выключен: add() сразу вызывает
+    flush_func в текущем потоке (ошибки записи уходят вызывающему).
+    Ошибка фоновой записи пишется в лог, значения остаются в буфере
+    до следующей попытки.
+    """
+
+    def __init__(self, name, flush_func, interval_setting, default_interval=5,
+                 max_pending_setting=None, default_max_pending=10000):
+        self.name = name
+        self._flush_func = flush_func
+        self._interval_setting = interval_setting
+        self._default_interval = default_interval
+        self._max_pending_setting = max_pending_setting
+        self._default_max_pending = default_max_pending
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @property
+    def interval(self):
+        return getattr(settings, self._interval_setting, self._default_interval)
+
+    @property
+    def max_pending(self):
+        if self._max_pending_setting is None:
+            return self._default_max_pending
+        return getattr(settings, self._max_pending_setting, self._default_max_pending)
+
+    @property
+    def enabled(self):
+        return bool(self.interval)
+
+    def add(self, key, value):
+        """Запоминает значение ключа до следующей записи"""
+        if not self.enabled:
+            self._flush_func({key: value})
+            return
+        with self._lock:
+            self._pending[key] = value
+            overflow = len(self._pending) >= self.max_pending
+            if self._thread is None:
+                self._start()
+        if overflow:
+            self._wakeup.set()
+
+    def discard(self, key):
+        """Забывает ещё не записанное значение ключа"""
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def get(self, key, default=None):
+        """Ещё не записанное значение ключа"""
+        return self._pending.get(key, default)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Записывает всё накопленное сейчас, в текущем потоке"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            self._write(pending)
+
+    def _write(self, pending):
+        try:
+            self._flush_func(pending)
+        except Exception:
+            logger.exception('Не удалось записать буфер %s (%d значений)', self.name, len(pending))
+            # Вернём значения в буфер, не затирая более новые
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending.setdefault(key, value)
+
+    def _start(self):
+        self._thread = threading.Thread(
+            target=self._run, name=f'write-behind-{self.name}', daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()